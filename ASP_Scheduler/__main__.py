@@ -0,0 +1,5 @@
+"""Entry point of `python -m ASP_Scheduler`: run a resumable sweep (see ASP_Scheduler/sweep.py)."""
+from ASP_Scheduler.sweep import main
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""End-to-end throughput benchmark of the scheduler on the offline mock backend.
+
+Generates the full ASP program of every problem in all_problems with the mock bots (see LLM.mock_bots), which replay
+the programs in Results/ with simulated latency and provider errors. This measures the effect of scheduling, caching
+and concurrency changes on one machine, without network access, provider quota or a GPU.
+
+Usage (from the repository root):
+    python -m ASP_Scheduler.benchmark [--k 5] [--max-workers 8] [--stream] [--auto-fix] [--syntax-workers 4] [--trace trace.json] [--pipe mock-async --rate-limit-rate 0.05]
+"""
+import argparse
+import csv
+import json
+import os
+import tempfile
+import time
+
+from LLM import bots
+from ASP_Scheduler import scheduler, build_cache
+from ASP_Scheduler.problem_descriptions import all_problems
+from utils import logger
+from utils import auto_fixer
+from utils import syntax_workers
+from utils import tracing
+import utils.utils as utils
+
+
+def run_problem(name, args):
+    """Generate the full program of one problem and return the wall-clock time in seconds."""
+    start = time.perf_counter()
+    scheduler.full_ASP_program(all_problems[name], pipe=args.pipe, k=args.k, seed=args.seed, max_workers=args.max_workers, stream=args.stream, n_candidates=args.n_candidates, auto_fix=args.auto_fix)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pipe', choices=['mock', 'mock-async'], default='mock', help="'mock-async' goes through the rate limiting and retries of the async bots")
+    parser.add_argument('--problems', nargs='+', default=list(all_problems.keys()), help='problems to generate (default: all)')
+    parser.add_argument('--runs', type=int, default=1, help='number of runs per problem')
+    parser.add_argument('--k', type=int, default=0, help='number of repair attempts per statement block')
+    parser.add_argument('--max-workers', type=int, default=1, help='number of constraints generated concurrently')
+    parser.add_argument('--stream', action='store_true', help='stream the responses and check statement blocks while generating')
+    parser.add_argument('--n-candidates', type=int, default=1, help='number of candidates sampled concurrently per partial program')
+    parser.add_argument('--auto-fix', action='store_true', help='fix mechanical syntax errors deterministically before LLM repairs')
+    parser.add_argument('--syntax-workers', type=int, default=0, help='check statement blocks in a pool of this many processes (0: in-process)')
+    parser.add_argument('--seed', type=int, default=0, help='seed passed to the bots (selects between recorded responses)')
+    parser.add_argument('--time-to-first-token', type=float, default=0.5, help='simulated time to first token in seconds')
+    parser.add_argument('--tokens-per-second', type=float, default=50.0, help='simulated generation speed')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests failing with a 500 response (mock-async only)')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='fraction of requests failing with a 429 response (mock-async only)')
+    parser.add_argument('--retry-after', type=float, default=None, help='Retry-After in seconds sent with 429 responses')
+    parser.add_argument('--requests-per-second', type=float, default=100.0, help="rate limit of the 'mock' provider (mock-async only)")
+    parser.add_argument('--max-in-flight', type=int, default=16, help="concurrent requests to the 'mock' provider (mock-async only)")
+    parser.add_argument('--results-dir', default=None, help='folder with .lp programs to replay (default: Results/)')
+    parser.add_argument('--transcript', default=None, help='JSONL file with {"prompt": ..., "response": ...} lines to replay')
+    parser.add_argument('--response-cache', default=None, help='path of a response cache to enable (see bots.enable_response_cache)')
+    parser.add_argument('--build-cache', default=None, help='path of a build cache of partial programs to enable (see ASP_Scheduler.build_cache)')
+    parser.add_argument('--trace', default=None, help='path of a Chrome trace of the runs (a summary CSV is written next to it)')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+    # The blocking bots (like the sync remote bots they stand in for) do not retry failed requests
+    if args.pipe != 'mock-async' and (args.error_rate or args.rate_limit_rate):
+        parser.error("--error-rate and --rate-limit-rate need --pipe mock-async (only the async bots retry failed requests)")
+
+    backend = dict(problems=all_problems, transcript=args.transcript, time_to_first_token=args.time_to_first_token,
+                   tokens_per_second=args.tokens_per_second, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                   retry_after=args.retry_after)
+    if args.results_dir is not None:
+        backend['results_dir'] = args.results_dir
+    bots.configure_mock_backend(**backend)
+    if args.pipe == 'mock-async':
+        bots.configure_remote_limits('mock', requests_per_second=args.requests_per_second, burst=args.max_in_flight, max_in_flight=args.max_in_flight)
+    if args.response_cache is not None:
+        bots.enable_response_cache(args.response_cache)
+    if args.build_cache is not None:
+        build_cache.enable_build_cache(args.build_cache)
+    if args.syntax_workers:
+        syntax_workers.enable_syntax_worker_pool(workers=args.syntax_workers)
+    if args.trace is not None:
+        tracing.enable_tracing()
+
+    seconds = {}
+    with tempfile.TemporaryDirectory() as metrics_dir:
+        try:
+            for name in args.problems:
+                logger.init_logger(os.path.join(metrics_dir, 'metrics.csv'), problem_ID=name, max_fix_attempts=args.k, model=args.pipe, seed=args.seed)
+                seconds[name] = [run_problem(name, args) for _ in range(args.runs)]
+        finally:
+            # Write the buffered rows and stop the flusher thread before the folder is removed (also if a run failed)
+            if logger.get_logger() is not None:
+                logger.get_logger().close()
+
+        # Statement blocks are only logged when repairs are enabled (k > 0)
+        with open(os.path.join(metrics_dir, 'metrics.csv'), newline='', encoding='utf-8') as file:
+            rows = list(csv.DictReader(file))
+
+    total = sum(sum(times) for times in seconds.values())
+    stats = bots.mock_backend_stats()
+    results = {
+        'settings': vars(args),
+        'seconds': seconds,
+        'total_seconds': total,
+        'mock_backend': stats,
+        # How much simulated LLM time was overlapped by running requests concurrently
+        'concurrency': stats['simulated_seconds'] / total if total else 0.0,
+        'response_cache': bots.response_cache_stats(),
+        'build_cache': build_cache.build_cache_stats(),
+        'statement_blocks': len(rows),
+        'invalid_statement_blocks': sum(1 for row in rows if row['correct_syntax'] == '0'),
+        'repair_attempts': sum(int(row['fix_attempt_count']) for row in rows),
+        'auto_fixer': auto_fixer.auto_fixer_stats() if args.auto_fix else None,
+        'syntax_cache': utils.syntax_cache_stats()['statements'],
+        'syntax_workers': syntax_workers.get_syntax_worker_pool().stats() if args.syntax_workers else None,
+    }
+    syntax_workers.disable_syntax_worker_pool()
+
+    if args.trace is not None:
+        tracing.disable_tracing()
+        tracing.export_chrome_trace(args.trace)
+        tracing.write_summary_csv(os.path.splitext(args.trace)[0] + '_summary.csv')
+        summary = tracing.trace_summary()
+        results['trace'] = {column: sum(row[column] for row in summary) for column in
+                            ['wall_seconds', 'llm_calls', 'llm_seconds', 'estimated_prompt_tokens', 'estimated_completion_tokens', 'syntax_checks',
+                             'syntax_check_seconds', 'auto_fix_seconds', 'repair_attempts', 'repair_seconds', 'sleep_seconds']}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for name, times in seconds.items():
+        print(f'{name}: {", ".join(f"{t:.2f}" for t in times)} s')
+    print()
+    print(f'total       : {total:.2f} s')
+    print(f'requests    : {stats["requests"]} ({stats["replayed"]} replayed, {stats["unmatched"]} repairs/unmatched, '
+          f'{stats["errors"]} errors, {stats["rate_limited"]} rate limited)')
+    print(f'LLM time    : {stats["simulated_seconds"]:.2f} s simulated, concurrency {results["concurrency"]:.2f}x')
+    if rows:
+        print(f'blocks      : {len(rows)} statement blocks, {results["invalid_statement_blocks"]} still invalid, {results["repair_attempts"]} repair attempts')
+    if results['auto_fixer'] is not None:
+        fixed = results['auto_fixer']
+        print(f'auto fixer  : {fixed["fixed_blocks"]} of {fixed["blocks"]} broken blocks fixed without LLM')
+        for name, counts in fixed['fixers'].items():
+            print(f'  {name:<18}: {counts["kept"]}/{counts["tried"]} kept ({counts["hit_rate"]:.0%})')
+    if results['build_cache'] is not None:
+        cached = results['build_cache']
+        print(f'build cache : {cached["hits"]} of {cached["hits"] + cached["misses"]} partial programs reused ({cached["hit_rate"]:.0%})')
+    syntax_cache = results['syntax_cache']
+    print(f'syntax cache: {syntax_cache["hits"]} hits, {syntax_cache["misses"]} misses ({syntax_cache["hit_rate"]:.0%})')
+    if results['syntax_workers'] is not None:
+        pool = results['syntax_workers']
+        print(f'syntax pool : {pool["jobs"]} jobs on {pool["workers"]} workers, {pool["timeouts"]} timeouts, {pool["crashes"]} crashes')
+    if 'trace' in results:
+        trace = results['trace']
+        print(f'trace       : {trace["llm_calls"]} LLM calls {trace["llm_seconds"]:.2f} s (~{trace["estimated_prompt_tokens"]} prompt, '
+              f'~{trace["estimated_completion_tokens"]} completion tokens), {trace["syntax_checks"]} syntax checks {trace["syntax_check_seconds"]:.2f} s, '
+              f'auto fix {trace["auto_fix_seconds"]:.2f} s, {trace["repair_attempts"]} repairs {trace["repair_seconds"]:.2f} s, sleep {trace["sleep_seconds"]:.2f} s')
+    if results['response_cache'] is not None:
+        print(f'cache       : {results["response_cache"]["hits"]} hits, {results["response_cache"]["misses"]} misses')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+''' Build cache of partial programs, for incremental regeneration of full ASP programs.
+
+Every partial program (instance template, generator, each hard and soft constraint) is stored under a hash of
+everything it is generated from: the system prompt after substituting its variables (so the contents of the prompt file
+and the instance template, generator and problem description it includes), the repair prompt, the description sent as
+user prompt, the model and the sampling and repair settings. When one input changes, only the partial programs whose
+inputs changed are generated again, plus their dependents: a new generator changes the system prompt of every
+constraint, so all constraints are generated again, while editing one constraint description costs one generation.
+Partial programs that still have syntax errors after the repairs are not reused: they are generated again on the next build.
+
+Usage:
+    from ASP_Scheduler import build_cache
+    build_cache.enable_build_cache('llm_cache/partial_programs.sqlite')
+    scheduler.full_ASP_program(problem, pipe=pipe, k=2, seed=0)   # generates every partial program
+    scheduler.full_ASP_program(problem, pipe=pipe, k=2, seed=0)   # reuses every partial program (no LLM calls)
+'''
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Part of every key; increase it when a change of the scheduler changes the partial programs generated from the same inputs
+BUILD_CACHE_VERSION = 1
+
+# Opt-in build cache used by the scheduler (see enable_build_cache)
+_build_cache = None
+
+# Whether the last lookup of each thread was a hit (see was_cached)
+_local = threading.local()
+
+
+class Build_Cache():
+    ''' Persistent cache of partial programs stored in SQLite, keyed on the hash of their inputs (see make_key).
+
+    Safe to use from several threads (one connection per thread) and several processes (SQLite WAL mode with a busy timeout).
+
+    Args:
+        path (str, optional): Path of the SQLite file (parent folders are created). Defaults to 'llm_cache/partial_programs.sqlite'.
+    '''
+
+    def __init__(self, path='llm_cache/partial_programs.sqlite'):
+        self.path = os.path.abspath(path)
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+
+        connection = self._connection()
+        with connection:
+            connection.execute('''CREATE TABLE IF NOT EXISTS partial_programs (
+                key TEXT PRIMARY KEY,
+                generation_type TEXT,
+                program TEXT NOT NULL,
+                syntax_errors INTEGER,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )''')
+
+    def _connection(self):
+        # Each thread gets its own connection, as SQLite connections can not be shared between threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def make_key(**inputs):
+        ''' Return the key of a partial program generated from the given inputs.
+
+        Args:
+            **inputs: Everything the partial program is generated from (JSON serializable).
+
+        Returns:
+            str: The SHA-256 hex digest of the inputs and BUILD_CACHE_VERSION.
+        '''
+        payload = json.dumps({'version': BUILD_CACHE_VERSION, 'inputs': inputs}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        ''' Return the cached partial program for a key, or None if it is not cached (or was stored with syntax errors). '''
+        connection = self._connection()
+        row = connection.execute('SELECT program FROM partial_programs WHERE key = ? AND COALESCE(syntax_errors, 0) = 0', (key,)).fetchone()
+
+        with self._stats_lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if row is None:
+            return None
+
+        with connection:
+            connection.execute('UPDATE partial_programs SET last_access = ? WHERE key = ?', (time.time(), key))
+        return row[0]
+
+    def put(self, key, program, generation_type=None, syntax_errors=None):
+        ''' Store a partial program under a key. '''
+        now = time.time()
+        connection = self._connection()
+        with connection:
+            connection.execute('INSERT OR REPLACE INTO partial_programs (key, generation_type, program, syntax_errors, created, last_access) VALUES (?, ?, ?, ?, ?, ?)',
+                               (key, generation_type, program, syntax_errors, now, now))
+
+    def clear(self, generation_type=None):
+        ''' Remove all cached partial programs, or only those of one generation type (e.g. 'soft constraints'). '''
+        connection = self._connection()
+        with connection:
+            if generation_type is None:
+                connection.execute('DELETE FROM partial_programs')
+            else:
+                connection.execute('DELETE FROM partial_programs WHERE generation_type = ?', (generation_type,))
+
+    def stats(self):
+        ''' Return the hit/miss counters of this process together with the number of cached partial programs. '''
+        connection = self._connection()
+        entries = connection.execute('SELECT COUNT(*) FROM partial_programs').fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+        }
+
+
+def enable_build_cache(path='llm_cache/partial_programs.sqlite'):
+    ''' Reuse partial programs of earlier generations with the same inputs (see the module docstring).
+
+    Only use this while iterating on descriptions and prompts: with a cache, generating the same problem again returns
+    the same program, also without a fixed seed. Reused partial programs are not logged again by utils.logger.
+
+    Args:
+        path (str, optional): Path of the SQLite cache file. Defaults to 'llm_cache/partial_programs.sqlite'.
+
+    Returns:
+        Build_Cache: The cache, e.g. to report its stats().
+    '''
+    global _build_cache
+    _build_cache = Build_Cache(path)
+    return _build_cache
+
+
+def disable_build_cache():
+    ''' Generate every partial program again. The cache file is kept. '''
+    global _build_cache
+    _build_cache = None
+
+
+def get_build_cache():
+    return _build_cache
+
+
+def build_cache_stats():
+    ''' Return the hit/miss stats of the build cache, or None if it is not enabled. '''
+    return _build_cache.stats() if _build_cache is not None else None
+
+
+def pipe_id(pipe):
+    ''' Identifier of the model behind a pipe argument of the scheduler, used in the keys.
+
+    Args:
+        pipe: None (HF API), the name of a remote or mock backend, or a local (batched) pipeline.
+
+    Returns:
+        str: The backend name, or the name or path of the local model.
+    '''
+    if pipe is None:
+        return 'hf'
+    if isinstance(pipe, str):
+        return pipe
+    model = getattr(pipe, 'model', None)
+    name = getattr(model, 'name_or_path', None) or getattr(getattr(model, 'config', None), '_name_or_path', None)
+    return f'local:{name}' if name else f'local:{type(pipe).__name__}'
+
+
+def lookup(key):
+    ''' Return the cached partial program for a key (None if it is not cached, the key is None or the cache is disabled). '''
+    program = _build_cache.get(key) if _build_cache is not None and key is not None else None
+    _local.cached = program is not None
+    return program
+
+
+def store(key, program, generation_type=None, syntax_errors=None):
+    ''' Store a partial program in the build cache, if it is enabled (and the key is not None).
+
+    The scheduler only stores partial programs without syntax errors; get skips any entry with syntax_errors > 0.
+    '''
+    if _build_cache is not None and key is not None:
+        _build_cache.put(key, program, generation_type=generation_type, syntax_errors=syntax_errors)
+
+
+def was_cached():
+    ''' Whether the last partial program looked up in this thread came from the build cache. '''
+    return getattr(_local, 'cached', False)
@@ -0,0 +1,168 @@
+''' Compiled system prompt templates.
+
+All files in ASP_Scheduler/system_prompts/ are read and compiled once: the text is split at its <<variable>>
+placeholders into static segments, so rendering a prompt is one join instead of a str.replace per variable (and a regex
+pass for the placeholders that are left). A file is read and compiled again when its modification time changes, so
+prompts can be edited while a notebook is running.
+
+The prompt files put their static text (instructions and examples) first and the variable text (problem description,
+instance template, generator) last. Prompts rendered for the same problem then share the longest possible prefix, which
+is what the prompt caches of remote providers and the prefix KV caches of local bots (see bots.enable_prefix_cache) reuse.
+
+Usage:
+    from ASP_Scheduler import prompt_templates
+    system_prompt = prompt_templates.render('system_prompts/generator.txt', {'instance_template': instance_template})
+'''
+import glob
+import os
+import re
+import threading
+import time
+
+BASE_DIR = os.path.dirname(__file__)
+
+PLACEHOLDER = re.compile(r'<<([^<>]*)>>')
+
+# Seconds between checks of the modification time of a template file (0 checks on every use)
+RELOAD_CHECK_INTERVAL = 1.0
+
+
+class Prompt_Template():
+    ''' A prompt compiled into static segments and the positions of its placeholders.
+
+    Args:
+        text (str): The prompt text with <<variable>> placeholders.
+        path (str, optional): The file the prompt was read from.
+    '''
+
+    def __init__(self, text, path=None):
+        self.text = text
+        self.path = path
+        # Static segments with a slot (None) for every placeholder: render fills the slots and joins the parts once
+        self.parts = []
+        self.slots = []
+        position = 0
+        for match in PLACEHOLDER.finditer(text):
+            self.parts.append(text[position:match.start()])
+            self.slots.append((len(self.parts), match.group(1)))
+            self.parts.append(None)
+            position = match.end()
+        self.parts.append(text[position:])
+
+    @property
+    def variables(self):
+        ''' Names of the placeholders, in the order they appear. '''
+        return [name for _, name in self.slots]
+
+    @property
+    def static_prefix(self):
+        ''' The text before the first placeholder, shared by all prompts rendered from this template. '''
+        return self.parts[0]
+
+    def render(self, variables, missing=None):
+        ''' Fill in the placeholders.
+
+        Args:
+            variables (dict): The text of each variable.
+            missing (str, optional): Text for placeholders without a variable. Defaults to None (keep the placeholder).
+
+        Returns:
+            str: The rendered prompt.
+        '''
+        parts = self.parts.copy()
+        for index, name in self.slots:
+            if name in variables:
+                parts[index] = variables[name]
+            else:
+                parts[index] = f'<<{name}>>' if missing is None else missing
+        return ''.join(parts)
+
+
+class Template_Registry():
+    ''' Compiled templates of the prompt files, loaded on first use and reloaded when a file changes.
+
+    Args:
+        base_dir (str, optional): Folder relative paths are resolved against. Defaults to the ASP_Scheduler folder.
+        directory (str, optional): Folder (relative to base_dir) whose .txt files are all loaded on first use. Defaults to 'system_prompts'.
+        check_interval (float, optional): Seconds between modification time checks of a file. Defaults to RELOAD_CHECK_INTERVAL.
+    '''
+
+    def __init__(self, base_dir=BASE_DIR, directory='system_prompts', check_interval=RELOAD_CHECK_INTERVAL):
+        self.base_dir = base_dir
+        self.directory = directory
+        self.check_interval = check_interval
+        # Absolute path -> (template, (mtime_ns, size), time of the last check)
+        self._templates = {}
+        self._lock = threading.Lock()
+        self._preloaded = False
+
+    def _load(self, path):
+        with open(path, 'r', encoding='utf-8') as file:
+            stat = os.fstat(file.fileno())
+            text = file.read()
+        entry = (Prompt_Template(text, path=path), (stat.st_mtime_ns, stat.st_size), time.monotonic())
+        self._templates[path] = entry
+        return entry
+
+    def preload(self):
+        ''' Load and compile all .txt files of the template directory. '''
+        with self._lock:
+            for path in sorted(glob.glob(os.path.join(self.base_dir, self.directory, '*.txt'))):
+                self._load(os.path.abspath(path))
+            self._preloaded = True
+
+    def get(self, path):
+        ''' Return the compiled template of a prompt file (a path relative to base_dir, or an absolute path). '''
+        if not self._preloaded:
+            self.preload()
+        path = os.path.abspath(os.path.join(self.base_dir, path))
+        entry = self._templates.get(path)
+        now = time.monotonic()
+        if entry is not None and now - entry[2] < self.check_interval:
+            return entry[0]
+
+        with self._lock:
+            entry = self._templates.get(path)
+            if entry is None:
+                return self._load(path)[0]
+            stat = os.stat(path)
+            if (stat.st_mtime_ns, stat.st_size) != entry[1]:
+                return self._load(path)[0]
+            self._templates[path] = (entry[0], entry[1], now)
+            return entry[0]
+
+    def render(self, path, variables, missing=None):
+        ''' Render a prompt file with variables (see Prompt_Template.render). '''
+        return self.get(path).render(variables, missing=missing)
+
+    def clear(self):
+        ''' Drop all compiled templates; they are loaded again on the next use. '''
+        with self._lock:
+            self._templates = {}
+            self._preloaded = False
+
+
+_registry = Template_Registry()
+
+
+def get_registry():
+    return _registry
+
+
+def get_template(path):
+    ''' Return the compiled template of a prompt file (relative to the ASP_Scheduler folder). '''
+    return _registry.get(path)
+
+
+def render(path, variables, missing=None):
+    ''' Render a prompt file (relative to the ASP_Scheduler folder) with variables.
+
+    Args:
+        path (str): The path of the prompt file, e.g. 'system_prompts/generator.txt'.
+        variables (dict): The text of each variable.
+        missing (str, optional): Text for placeholders without a variable. Defaults to None (keep the placeholder).
+
+    Returns:
+        str: The rendered prompt.
+    '''
+    return _registry.render(path, variables, missing=missing)
@@ -1,13 +1,27 @@
 from sched import scheduler
 from LLM import bots
+import contextvars
 import time
 import os
-import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import utils.utils as utils
 from utils import logger
+from utils import auto_fixer
+from utils import syntax_workers
+from utils import tracing
+from ASP_Scheduler import build_cache
+from ASP_Scheduler import prompt_templates
 
 BASE_DIR = os.path.dirname(__file__)
 
+# Token budget for the conversation of one repair session (after the system prompt). Older repair turns of a session
+# are summarized and removed when the budget is exceeded, so the latency of a repair stays flat.
+REPAIR_HISTORY_TOKEN_BUDGET = 1024
+
+# Number of statement blocks that are checked (and repaired) concurrently while a streamed response is being generated
+STREAM_CHECK_WORKERS = 4
+
 def read_system_prompt(file_path):
     ''' Read a system prompt from a file.
 
@@ -17,22 +31,162 @@ def read_system_prompt(file_path):
     Returns:
         str: The system prompt as a string.
     '''
-    file_path = os.path.join(BASE_DIR, file_path)
-    with open(file_path, 'r') as file:
-        system_prompt = file.read()
-    return system_prompt
+    # The prompt files are read once and cached (see prompt_templates)
+    return prompt_templates.get_template(file_path).text
 
 
 def sleep_if_using_remote_clients(pipe, seconds=10):
     """Sleep for `seconds` only if the provided pipe indicates a remote client.
 
     Remote clients are represented by `pipe is None` (use HF API) or the
-    string `'deepseek'` (the Deepseek provider).
+    string `'deepseek'` (the Deepseek provider). The async remote clients
+    (`'async'` and `'async-deepseek'`) throttle themselves per provider and
+    only back off when the provider pushes back, so they never sleep here.
     """
     if pipe is None or pipe == 'deepseek':
-        time.sleep(seconds)
+        with tracing.span('sleep', seconds=seconds):
+            time.sleep(seconds)
+
+def get_constraint(constraint_description, constraint_type, problem_description, instance_template, generator, pipe=None, printer=False, k=0, temperature=None, top_p=None, seed=None, max_new_tokens=512, stream=False, n_candidates=1, auto_fix=False):
+    ''' Get a single hard or soft constraint based on its description. Uses different prompts based on the type of constraint.
+
+    Args:
+        constraint_description (str): The description of the constraint.
+        constraint_type (str): Either 'hard' or 'soft'.
+        problem_description (str): The overall problem description.
+        instance_template (str): The instance template generated from the instance description.
+        generator (str): The generator generated from the generator description.
+        pipe (optional): The pipeline to use for the LLM. Defaults to None.
+        printer (bool, optional): Whether to print intermediate results. Defaults to False.
+        k (int, optional): The number of retries to get a syntactically correct response. Defaults to 0 (no retries).
+        stream (bool, optional): Whether to stream the response and check statement blocks while generating. Defaults to False.
+        n_candidates (int, optional): The number of candidate responses to sample concurrently. Defaults to 1.
+        auto_fix (bool, optional): Whether to try deterministic fixes (see utils.auto_fixer) before repairing a statement block with the LLM. Defaults to False.
+
+    Returns:
+        tuple: (constraint_description, constraint), where the description has its type annotation removed.
+    '''
+    # Use the correct constraint prompt based on the type of constraint
+    if 'type: count' in constraint_description.lower():
+        # Remove type: count from the prompt
+        constraint_description = constraint_description.replace('type: count', '')
+        system_prompt_path = f'system_prompts/count_{constraint_type}_constraints.txt'
+    elif 'type: sum' in constraint_description.lower():
+        # Remove type: sum from the prompt
+        constraint_description = constraint_description.replace('type: sum', '')
+        system_prompt_path = f'system_prompts/sum_{constraint_type}_constraints.txt'
+    else:
+        system_prompt_path = f'system_prompts/regular_{constraint_type}_constraints.txt'
+
+    constraint = get_partial_program(
+        system_prompt_path=system_prompt_path,
+        prompt=constraint_description,
+        system_prompt_variables={
+            'problem_description': problem_description,
+            'instance_template': instance_template,
+            'generator': generator
+        },
+        pipe=pipe,
+        k=k,
+        printer=printer,
+        temperature=temperature,
+        top_p=top_p,
+        seed=seed,
+        max_new_tokens=max_new_tokens,
+        stream=stream,
+        n_candidates=n_candidates,
+        auto_fix=auto_fix
+    )
+    # Reused constraints did not send any requests
+    if not build_cache.was_cached():
+        sleep_if_using_remote_clients(pipe)
+
+    return constraint_description, constraint
+
+def submit_constraints(executor, constraint_descriptions, constraint_type, problem_description, instance_template, generator, **kwargs):
+    ''' Submit the generation of every constraint in a list to an executor.
+
+    All constraints only depend on the problem description, instance template and generator, so they can be generated
+    independently of each other (including their repair loops).
+
+    Args:
+        executor (concurrent.futures.Executor): The executor to submit the generation jobs to.
+        constraint_descriptions (list): A list of descriptions for each constraint.
+        constraint_type (str): Either 'hard' or 'soft'.
+        problem_description (str): The overall problem description.
+        instance_template (str): The instance template generated from the instance description.
+        generator (str): The generator generated from the generator description.
+        **kwargs: Remaining keyword arguments for get_constraint (pipe, printer, k, sampling params).
+
+    Returns:
+        list: A list of futures, in the same order as the constraint descriptions.
+    '''
+    # Every job runs in a copy of the caller's context, so it logs to the caller's metrics run (see utils.logger)
+    return [
+        executor.submit(contextvars.copy_context().run, get_constraint, constraint_description, constraint_type, problem_description, instance_template, generator, **kwargs)
+        for constraint_description in constraint_descriptions
+    ]
+
+def collect_constraints(futures, printer=False):
+    ''' Wait for submitted constraint generations and reassemble the results in their original order.
+
+    Args:
+        futures (list): A list of futures as returned by submit_constraints.
+        printer (bool, optional): Whether to print intermediate results. Defaults to False.
+
+    Returns:
+        list: A list of constraints as strings.
+    '''
+    constraints = []
+    for future in futures:
+        constraint_description, constraint = future.result()
+        constraints.append(constraint)
+
+        print(constraint_description + '\n' + constraints[-1]+ '\n') if printer else None
+
+    return constraints
 
-def get_hard_constraints(hard_constraint_descriptions, problem_description, instance_template, generator, pipe=None, printer=False, k=0, temperature=None, top_p=None, seed=None, max_new_tokens=512):
+def get_constraints(constraint_descriptions, constraint_type, problem_description, instance_template, generator, pipe=None, printer=False, k=0, temperature=None, top_p=None, seed=None, max_new_tokens=512, max_workers=1, stream=False, n_candidates=1, auto_fix=False):
+    ''' Get hard or soft constraints based on their descriptions. Uses different prompts based on the type of constraint.
+
+    Args:
+        constraint_descriptions (list): A list of descriptions for each constraint.
+        constraint_type (str): Either 'hard' or 'soft'.
+        problem_description (str): The overall problem description.
+        instance_template (str): The instance template generated from the instance description.
+        generator (str): The generator generated from the generator description.
+        pipe (optional): The pipeline to use for the LLM. Defaults to None.
+        printer (bool, optional): Whether to print intermediate results. Defaults to False.
+        k (int, optional): The number of retries to get a syntactically correct response. Defaults to 0 (no retries).
+        max_workers (int, optional): The number of constraints to generate concurrently. Defaults to 1 (one at a time).
+        stream (bool, optional): Whether to stream the responses and check statement blocks while generating. Defaults to False.
+        n_candidates (int, optional): The number of candidate responses to sample concurrently per partial program. Defaults to 1.
+        auto_fix (bool, optional): Whether to try deterministic fixes (see utils.auto_fixer) before repairing a statement block with the LLM. Defaults to False.
+
+    Returns:
+        list: A list of constraints as strings.
+    '''
+    # If there are no constraints we return None
+    if constraint_descriptions is None:
+        return None
+
+    kwargs = dict(pipe=pipe, printer=printer, k=k, temperature=temperature, top_p=top_p, seed=seed, max_new_tokens=max_new_tokens, stream=stream, n_candidates=n_candidates, auto_fix=auto_fix)
+
+    if max_workers > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = submit_constraints(executor, constraint_descriptions, constraint_type, problem_description, instance_template, generator, **kwargs)
+            return collect_constraints(futures, printer=printer)
+
+    constraints = []
+    for constraint_description in constraint_descriptions:
+        constraint_description, constraint = get_constraint(constraint_description, constraint_type, problem_description, instance_template, generator, **kwargs)
+        constraints.append(constraint)
+
+        print(constraint_description + '\n' + constraints[-1]+ '\n') if printer else None
+
+    return constraints
+
+def get_hard_constraints(hard_constraint_descriptions, problem_description, instance_template, generator, pipe=None, printer=False, k=0, temperature=None, top_p=None, seed=None, max_new_tokens=512, max_workers=1, stream=False, n_candidates=1, auto_fix=False):
     ''' Get hard constraints based on their descriptions. Uses different prompts based on the type of constraint.
 
     Args:
@@ -43,88 +197,20 @@ def get_hard_constraints(hard_constraint_descriptions, problem_description, inst
         pipe (optional): The pipeline to use for the LLM. Defaults to None.
         printer (bool, optional): Whether to print intermediate results. Defaults to False.
         k (int, optional): The number of retries to get a syntactically correct response. Defaults to 0 (no retries).
+        max_workers (int, optional): The number of constraints to generate concurrently. Defaults to 1 (one at a time).
+        stream (bool, optional): Whether to stream the responses and check statement blocks while generating. Defaults to False.
+        n_candidates (int, optional): The number of candidate responses to sample concurrently per partial program. Defaults to 1.
+        auto_fix (bool, optional): Whether to try deterministic fixes (see utils.auto_fixer) before repairing a statement block with the LLM. Defaults to False.
 
     Returns:
         list: A list of hard constraints as strings.
     '''
-    # If there are no hard constraints we return None
-    if hard_constraint_descriptions is None:
-        return None
-    
-    hard_constraints = []
-    print('\n\nHard Constraints\n') if printer else None
-
-    # For every hard constraint description
-    for constraint_description in hard_constraint_descriptions:
-        # Use the correct hard constraint prompt based on the type of constraint
-        if 'type: count' in constraint_description.lower():
-            # Remove type: count from the prompt
-            constraint_description = constraint_description.replace('type: count', '')
-            hard_constraint = get_partial_program(
-                system_prompt_path='system_prompts/count_hard_constraints.txt',
-                prompt=constraint_description,
-                system_prompt_variables={
-                    'problem_description': problem_description,
-                    'instance_template': instance_template,
-                    'generator': generator
-                },
-                pipe=pipe,
-                k=k,
-                printer=printer,
-                temperature=temperature,
-                top_p=top_p,
-                seed=seed,
-                max_new_tokens=max_new_tokens
-            )
-            sleep_if_using_remote_clients(pipe)
-        elif 'type: sum' in constraint_description.lower():
-            # Remove type: sum from the prompt
-            constraint_description = constraint_description.replace('type: sum', '')
-            hard_constraint = get_partial_program(
-                system_prompt_path='system_prompts/sum_hard_constraints.txt',
-                prompt=constraint_description,
-                system_prompt_variables={
-                    'problem_description': problem_description,
-                    'instance_template': instance_template,
-                    'generator': generator
-                },
-                pipe=pipe,
-                k=k,
-                printer=printer,
-                temperature=temperature,
-                top_p=top_p,
-                seed=seed,
-                max_new_tokens=max_new_tokens
-            )
-            sleep_if_using_remote_clients(pipe)
-        else:
-            hard_constraint = get_partial_program(
-                system_prompt_path='system_prompts/regular_hard_constraints.txt',
-                prompt=constraint_description,
-                system_prompt_variables={
-                    'problem_description': problem_description,
-                    'instance_template': instance_template,
-                    'generator': generator
-                },
-                pipe=pipe,
-                k=k,
-                printer=printer,
-                temperature=temperature,
-                top_p=top_p,
-                seed=seed,
-                max_new_tokens=max_new_tokens
-            )
-            sleep_if_using_remote_clients(pipe)
-        
-        # Append the generated hard constraint to the list
-        hard_constraints.append(hard_constraint)
+    print('\n\nHard Constraints\n') if printer and hard_constraint_descriptions is not None else None
 
-        print(constraint_description + '\n' + hard_constraints[-1]+ '\n') if printer else None
-    
-    return hard_constraints
+    return get_constraints(hard_constraint_descriptions, 'hard', problem_description, instance_template, generator, pipe=pipe, printer=printer, k=k, temperature=temperature, top_p=top_p, seed=seed, max_new_tokens=max_new_tokens, max_workers=max_workers, stream=stream, n_candidates=n_candidates, auto_fix=auto_fix)
 
 # Get Soft Constraints
-def get_soft_constraints(soft_constraint_descriptions, problem_description, instance_template, generator, pipe=None, printer=False, k=0, temperature=None, top_p=None, seed=None, max_new_tokens=512):
+def get_soft_constraints(soft_constraint_descriptions, problem_description, instance_template, generator, pipe=None, printer=False, k=0, temperature=None, top_p=None, seed=None, max_new_tokens=512, max_workers=1, stream=False, n_candidates=1, auto_fix=False):
     ''' Get soft constraints based on their descriptions. Uses different prompts based on the type of constraint.
 
     Args:
@@ -135,85 +221,17 @@ def get_soft_constraints(soft_constraint_descriptions, problem_description, inst
         pipe (optional): The pipeline to use for the LLM. Defaults to None.
         printer (bool, optional): Whether to print intermediate results. Defaults to False.
         k (int, optional): The number of retries to get a syntactically correct response. Defaults to 0 (no retries).
+        max_workers (int, optional): The number of constraints to generate concurrently. Defaults to 1 (one at a time).
+        stream (bool, optional): Whether to stream the responses and check statement blocks while generating. Defaults to False.
+        n_candidates (int, optional): The number of candidate responses to sample concurrently per partial program. Defaults to 1.
+        auto_fix (bool, optional): Whether to try deterministic fixes (see utils.auto_fixer) before repairing a statement block with the LLM. Defaults to False.
 
     Returns:
         list: A list of soft constraints as strings.
     '''
-    # If there are no soft constraints we return None
-    if soft_constraint_descriptions is None:
-        return None
-    
-    soft_constraints = []
-    print('\nSoft Constraints:\n') if printer else None
-
-    # For every hard constraint description
-    for constraint_description in soft_constraint_descriptions:
-        # Use the correct soft constraint prompt based on the type of constraint
-        if 'type: count' in constraint_description.lower():
-            # Remove type: count from the prompt
-            constraint_description = constraint_description.replace('type: count', '')
-            soft_constraint = get_partial_program(
-                system_prompt_path='system_prompts/count_soft_constraints.txt',
-                prompt=constraint_description,
-                system_prompt_variables={
-                    'problem_description': problem_description,
-                    'instance_template': instance_template,
-                    'generator': generator
-                },
-                pipe=pipe,
-                k=k,
-                printer=printer,
-                temperature=temperature,
-                top_p=top_p,
-                seed=seed,
-                max_new_tokens=max_new_tokens
-            )
-            sleep_if_using_remote_clients(pipe)
-        elif 'type: sum' in constraint_description.lower():
-            # Remove type: sum from the prompt
-            constraint_description = constraint_description.replace('type: sum', '')
-            soft_constraint = get_partial_program(
-                system_prompt_path='system_prompts/sum_soft_constraints.txt',
-                prompt=constraint_description,
-                system_prompt_variables={
-                    'problem_description': problem_description,
-                    'instance_template': instance_template,
-                    'generator': generator
-                },
-                pipe=pipe,
-                k=k,
-                printer=printer,
-                temperature=temperature,
-                top_p=top_p,
-                seed=seed,
-                max_new_tokens=max_new_tokens
-            )
-            sleep_if_using_remote_clients(pipe)
-        else:
-            soft_constraint = get_partial_program(
-                system_prompt_path='system_prompts/regular_soft_constraints.txt',
-                prompt=constraint_description,
-                system_prompt_variables={
-                    'problem_description': problem_description,
-                    'instance_template': instance_template,
-                    'generator': generator
-                },
-                pipe=pipe,
-                k=k,
-                printer=printer,
-                temperature=temperature,
-                top_p=top_p,
-                seed=seed,
-                max_new_tokens=max_new_tokens
-            )
-            sleep_if_using_remote_clients(pipe)
-
-        # Append the generated soft constraint to the list
-        soft_constraints.append(soft_constraint)
+    print('\nSoft Constraints:\n') if printer and soft_constraint_descriptions is not None else None
 
-        print(constraint_description + '\n' + soft_constraints[-1]+ '\n') if printer else None
-    
-    return soft_constraints
+    return get_constraints(soft_constraint_descriptions, 'soft', problem_description, instance_template, generator, pipe=pipe, printer=printer, k=k, temperature=temperature, top_p=top_p, seed=seed, max_new_tokens=max_new_tokens, max_workers=max_workers, stream=stream, n_candidates=n_candidates, auto_fix=auto_fix)
 
 def extract_constraints(descriptions, constraints):
     ''' Extract ASP constraints from the LLM output, removing markdown and comments. Also add the description as a comment before each constraint.
@@ -293,39 +311,93 @@ def extract_descriptions(problem):
     return problem_description, instance_description, generator_description, hard_constraint_descriptions, soft_constraint_descriptions
 
 
-def check_and_repair_statement_blocks(statement_blocks, prompt, syntax_corrector_bot, k, generation_type, printer=False):
-    '''Check syntax for each statement block and attempt to repair using the provided syntax_corrector_bot.
+def check_statement_syntax(stmt):
+    ''' Check the syntax of one statement block (see syntax_workers.check_statement_block), traced as a syntax_check span.
+
+    Args:
+        stmt (str): The ASP statement block.
+
+    Returns:
+        str: The syntax error message (empty if the block is valid).
+    '''
+    with tracing.span('syntax_check', blocks=1):
+        return syntax_workers.check_statement_block(stmt)
+
+def check_statement_blocks_syntax(statement_blocks):
+    ''' Check the syntax of a list of statement blocks (see syntax_workers.check_statement_blocks), traced as a syntax_check span.
 
     Args:
         statement_blocks (list): List of ASP statement block strings.
+
+    Returns:
+        list: One syntax error message per statement block (empty if the block is valid).
+    '''
+    with tracing.span('syntax_check', blocks=len(statement_blocks)):
+        return syntax_workers.check_statement_blocks(statement_blocks)
+
+def auto_fix_statement(stmt, syntax_error):
+    ''' Fix mechanical syntax errors of a statement block (see utils.auto_fixer), traced as an auto_fix span.
+
+    Args:
+        stmt (str): The ASP statement block.
+        syntax_error (str): Its syntax error message.
+
+    Returns:
+        tuple: (updated_statement_block, remaining_syntax_error)
+    '''
+    with tracing.span('auto_fix') as span:
+        stmt, syntax_error = auto_fixer.auto_fix(stmt, syntax_error)
+        span.set(fixed=not syntax_error)
+        return stmt, syntax_error
+
+def check_and_repair_statement_block(stmt, prompt, syntax_corrector_bot, k, generation_type, printer=False, auto_fix=False, syntax_error=None):
+    '''Check the syntax of one statement block and attempt to repair it using the provided syntax_corrector_bot.
+
+    The statement block gets its own repair session: a fork of the syntax_corrector_bot that shares its system prompt,
+    but starts with an empty conversation. Repairs of one block therefore never send the history of another.
+    With auto_fix, mechanical errors (markdown, prose lines, a missing '.', ...) are first fixed deterministically
+    (see utils.auto_fixer), and also in every response of the repair session; only the remaining errors cost LLM calls.
+
+    Args:
+        stmt (str): The ASP statement block.
         prompt (str): The original user prompt describing intended semantics (used in repair prompts).
-        syntax_corrector_bot (object): Bot to use for repair.
-        k (int): Number of retries per statement block.
+        syntax_corrector_bot (object): Bot to use for repair (only its system prompt and settings are used).
+        k (int): Number of retries for the statement block.
         printer (bool): Whether to print debug information.
+        auto_fix (bool): Whether to try deterministic fixes before (and during) the LLM repairs.
+        syntax_error (str, optional): The syntax error of the statement block, if it was already checked.
 
     Returns:
-        tuple: (updated_statement_blocks, total_errors)
+        tuple: (updated_statement_block, fix_success)
     '''
-    total_errors = 0
+    if syntax_error is None:
+        syntax_error = check_statement_syntax(stmt)
+    retries = k  # Number of syntax repair retries left
 
-    for idx, stmt in enumerate(statement_blocks):
-        syntax_error = utils.check_syntax_of_one_string(stmt)
-        retries = k  # Number of syntax repair retries left
+    if syntax_error and auto_fix:
+        stmt, syntax_error = auto_fix_statement(stmt, syntax_error)
+
+        if printer and not syntax_error:
+            print(f'Syntax error fixed without LLM:\n{stmt}\n')
 
-        if syntax_error:
-            # Try to repair the syntax k times
-            if printer:
-                print("================================================================================")
-                print(f'Initial response with syntax error:\n{stmt}\n\nError: {syntax_error}\n')
-                print(f" Starting syntax repair attempts...")
-                print("================================================================================")
+    if syntax_error:
+        # Try to repair the syntax k times
+        if printer:
+            print("================================================================================")
+            print(f'Initial response with syntax error:\n{stmt}\n\nError: {syntax_error}\n')
+            print(f" Starting syntax repair attempts...")
+            print("================================================================================")
 
-            while retries > 0 and syntax_error and syntax_corrector_bot is not None:
-                retries -= 1
+        # Start a fresh repair session for this statement block
+        repair_session = syntax_corrector_bot.fork() if syntax_corrector_bot is not None else None
 
+        while retries > 0 and syntax_error and repair_session is not None:
+            retries -= 1
+
+            with tracing.span('repair_attempt', attempt=k - retries):
                 # Create a prompt for repairing the syntax
                 repair_prompt = f"Intended semantics:\n{prompt}\n\nErroneous ASP code:\n{stmt}\n\nClingo error message:\n{syntax_error}"
-                stmt = syntax_corrector_bot.prompt(repair_prompt)
+                stmt = repair_session.prompt(repair_prompt)
 
                 if printer:
                     print("--------------------------------------------------------------------------------")
@@ -335,14 +407,16 @@ def check_and_repair_statement_blocks(statement_blocks, prompt, syntax_corrector
                 while len(utils.split_ASP_code_into_statement_blocks(stmt)) > 1 and retries > 0:
                     retries -= 1
                     repair_prompt = "The previous response contained multiple statements, which is not allowed. Please provide only one corrected ASP code without any extra explanations."
-                    stmt = syntax_corrector_bot.prompt(repair_prompt)
+                    stmt = repair_session.prompt(repair_prompt)
 
                     if printer:
                         print("--------------------------------------------------------------------------------")
                         print(f'Multiple statement blocks returned by LLM - Correction attempt {k - retries}:\n{stmt}\n')
 
                 # Check the syntax again
-                syntax_error = utils.check_syntax_of_one_string(stmt)
+                syntax_error = check_statement_syntax(stmt)
+                if syntax_error and auto_fix:
+                    stmt, syntax_error = auto_fix_statement(stmt, syntax_error)
 
                 if printer:
                     print("--------------------------------------------------------------------------------")
@@ -351,24 +425,172 @@ def check_and_repair_statement_blocks(statement_blocks, prompt, syntax_corrector
                     else:
                         print(f'Syntax corrected successfully!\n')
 
+    fix_success = not syntax_error
+
+    # Log metrics to logfile, one log line for each statement block.
+    # ONLY log if the block is a program statement (not a comment or empty) - for correct metrics.
+    if utils.check_if_block_is_program_statement(stmt):
+        # generation_type is now required by the logger API and is provided by the caller
+        logger.log(generation_type, fix_attempt_count=k - retries, correct_syntax=fix_success)
+
+    return stmt, fix_success
+
+def check_and_repair_statement_blocks(statement_blocks, prompt, syntax_corrector_bot, k, generation_type, printer=False, auto_fix=False):
+    '''Check syntax for each statement block and attempt to repair using the provided syntax_corrector_bot.
+
+    Every broken statement block gets its own repair session (see check_and_repair_statement_block).
+
+    Args:
+        statement_blocks (list): List of ASP statement block strings.
+        prompt (str): The original user prompt describing intended semantics (used in repair prompts).
+        syntax_corrector_bot (object): Bot to use for repair (only its system prompt and settings are used).
+        k (int): Number of retries per statement block.
+        printer (bool): Whether to print debug information.
+        auto_fix (bool): Whether to try deterministic fixes before (and during) the LLM repairs.
+
+    Returns:
+        tuple: (updated_statement_blocks, total_errors)
+    '''
+    total_errors = 0
+
+    # Check all statement blocks with one parse, only broken blocks are parsed again during their repairs
+    syntax_errors = check_statement_blocks_syntax(statement_blocks)
+
+    for idx, stmt in enumerate(statement_blocks):
         # Replace the original statement with the (possibly) corrected one
-        statement_blocks[idx] = stmt
+        statement_blocks[idx], fix_success = check_and_repair_statement_block(stmt, prompt, syntax_corrector_bot, k, generation_type, printer=printer, auto_fix=auto_fix, syntax_error=syntax_errors[idx])
 
         # Collect metrics (per statement block)
-        fix_success = not syntax_error
         if not fix_success:
             total_errors += 1
-        # attempts_made = k - retries  # kept locally if later needed
-
-        # Log metrics to logfile, one log line for each statement block.
-        # ONLY log if the block is a program statement (not a comment or empty) - for correct metrics.
-        if utils.check_if_block_is_program_statement(stmt):
-            # generation_type is now required by the logger API and is provided by the caller
-            logger.log(generation_type, fix_attempt_count=k - retries, correct_syntax=fix_success)
 
     return statement_blocks, total_errors
 
-def get_partial_program(system_prompt_path, prompt, system_prompt_variables={}, pipe=None, k=0, printer=False, temperature=None, top_p=None, seed=None, max_new_tokens=512):
+def stream_and_check_statement_blocks(asp_generator_bot, prompt, check_block, printer=False):
+    '''Stream the response to a prompt and check (and repair) each statement block as soon as it is complete.
+
+    Statement blocks are split off the stream as soon as their terminating '.' arrives and handed to `check_block` on a
+    small thread pool, so syntax checks and repair requests run while the model is still generating. Generation is
+    stopped early at a closing code fence or when the model drifts into prose.
+
+    Args:
+        asp_generator_bot (object): The bot generating the partial program.
+        prompt (str): The user prompt to send to the bot.
+        check_block (callable): Function taking a statement block and returning (updated_statement_block, fix_success).
+        printer (bool): Whether to print debug information.
+
+    Returns:
+        tuple: (initial_response, updated_statement_blocks, total_errors)
+    '''
+    splitter = utils.Streaming_Statement_Splitter()
+    futures = []
+
+    with ThreadPoolExecutor(max_workers=STREAM_CHECK_WORKERS) as executor:
+        stream = asp_generator_bot.stream_prompt(prompt)
+        try:
+            for chunk in stream:
+                for stmt in splitter.feed(chunk):
+                    futures.append(executor.submit(contextvars.copy_context().run, check_block, stmt))
+
+                if splitter.stop_reason is not None:
+                    print(f'Stopped generation early: {splitter.stop_reason}') if printer else None
+                    break
+        finally:
+            # Stops the generation if we did not read the whole stream
+            stream.close()
+
+        for stmt in splitter.close():
+            futures.append(executor.submit(contextvars.copy_context().run, check_block, stmt))
+
+        # Reassemble the statement blocks in their original order
+        results = [future.result() for future in futures]
+
+    statement_blocks = [stmt for stmt, fix_success in results]
+    total_errors = sum(1 for stmt, fix_success in results if not fix_success)
+
+    return '\n'.join(splitter.lines), statement_blocks, total_errors
+
+def sample_candidates(system_prompt, prompt, pipe, n_candidates, temperature=None, top_p=None, seed=None, max_new_tokens=512, printer=False):
+    '''Sample several candidate responses concurrently and return the first one without syntax errors.
+
+    Every candidate is generated by its own bot with its own seed (seed, seed + 1, ...) and streamed, so its statement
+    blocks are syntax checked as they arrive. As soon as one candidate is complete and fully valid, the generation of
+    the others is stopped. If no candidate is valid, the one with the fewest syntax errors is returned, so it can go
+    through the repair loop.
+
+    Args:
+        system_prompt (str): The system prompt, with its variables already replaced.
+        prompt (str): The user prompt to send to the LLM.
+        pipe (optional): The pipeline to use for the LLM.
+        n_candidates (int): The number of candidates to sample.
+        printer (bool, optional): Whether to print intermediate results. Defaults to False.
+
+    Returns:
+        str: The chosen response (without code fences and trailing prose).
+    '''
+    base_seed = seed if seed is not None else 0
+    done = threading.Event()
+
+    def sample(candidate):
+        bot = bots.load_bot(system_prompt, pipe, max_new_tokens=max_new_tokens, temperature=temperature, top_p=top_p, seed=base_seed + candidate)
+        splitter = utils.Streaming_Statement_Splitter()
+        errors = 0
+
+        stream = bot.stream_prompt(prompt)
+        try:
+            for chunk in stream:
+                if done.is_set():
+                    # Another candidate was valid; closing the stream stops this generation
+                    return None
+                for stmt in splitter.feed(chunk):
+                    if check_statement_syntax(stmt):
+                        errors += 1
+                if splitter.stop_reason is not None:
+                    break
+        finally:
+            stream.close()
+
+        for stmt in splitter.close():
+            if check_statement_syntax(stmt):
+                errors += 1
+        if errors == 0:
+            done.set()
+        return errors, '\n'.join(splitter.lines)
+
+    executor = ThreadPoolExecutor(max_workers=n_candidates)
+    futures = {executor.submit(contextvars.copy_context().run, sample, candidate): candidate for candidate in range(n_candidates)}
+    results = {}
+    failures = []
+    try:
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                failures.append(e)
+                continue
+            if result is None:
+                continue
+
+            results[futures[future]] = result
+            errors, response = result
+            if errors == 0:
+                print(f'Candidate {futures[future] + 1} of {n_candidates} is valid') if printer else None
+                return response
+    finally:
+        # Do not wait for the cancelled candidates, they stop on their next chunk
+        done.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if not results:
+        raise failures[0]
+
+    # No valid candidate: continue with the one with the fewest syntax errors
+    candidate = min(results, key=lambda candidate: (results[candidate][0], candidate))
+    print(f'No valid candidate, continuing with candidate {candidate + 1} ({results[candidate][0]} syntax errors)') if printer else None
+    return results[candidate][1]
+
+@tracing.traced('get_partial_program')
+def get_partial_program(system_prompt_path, prompt, system_prompt_variables={}, pipe=None, k=0, printer=False, temperature=None, top_p=None, seed=None, max_new_tokens=512, stream=False, n_candidates=1, auto_fix=False):
     ''' Generate a partial ASP program based on a system prompt and variables.
 
     Args:
@@ -378,6 +600,11 @@ def get_partial_program(system_prompt_path, prompt, system_prompt_variables={},
         pipe (optional): The pipeline to use for the LLM. Defaults to None.
         k (int, optional): The number of retries to get a syntactically correct response. Defaults to 0 (no retries).
         printer (bool, optional): Whether to print intermediate results. Defaults to False.
+        stream (bool, optional): Whether to stream the response and check (and repair) each statement block while the
+            model is still generating. Defaults to False.
+        n_candidates (int, optional): The number of candidate responses to sample concurrently (see sample_candidates).
+            The first fully valid candidate is used; the repair loop only runs if no candidate is valid. Defaults to 1.
+        auto_fix (bool, optional): Whether to try deterministic fixes (see utils.auto_fixer) before repairing a statement block with the LLM. Defaults to False.
 
     Returns:
         str: The generated partial ASP program as a string.
@@ -385,37 +612,14 @@ def get_partial_program(system_prompt_path, prompt, system_prompt_variables={},
     # Total errors for metrics
     total_errors = 0
 
-    # Read the system prompt and replace variables
-    system_prompt = read_system_prompt(system_prompt_path)
-    
-    # Replace variables in the system prompt
-    for key, value in system_prompt_variables.items():
-        system_prompt = system_prompt.replace(f'<<{key}>>', value)
-
-    # Load the bot and get the response
-    asp_generator_bot = bots.load_bot(system_prompt, pipe, max_new_tokens=max_new_tokens, temperature=temperature, top_p=top_p, seed=seed)
-    initial_response = [asp_generator_bot.prompt(prompt)]
-
-    # Remove any lines that start with triple backticks (```) - code-fence markers that some LLMs include around code blocks.
-    initial_response = [utils.remove_backtick_lines(initial_response[0])]
-
-    # Split the response into separate statement blocks, so each can be syntax checked individually
-    statement_blocks = utils.split_ASP_code_into_statement_blocks(initial_response)
+    # Render the system prompt with its variables (the compiled prompt files are cached, see prompt_templates)
+    system_prompt = prompt_templates.render(system_prompt_path, system_prompt_variables)
 
-    # Create a repair prompt if k > 0
+    # Create a repair prompt if k > 0, replacing variables that are not given with None
+    repair_prompt = None
     if k > 0:
-        repair_prompt = read_system_prompt('system_prompts/syntax_corrector.txt')
+        repair_prompt = prompt_templates.render('system_prompts/syntax_corrector.txt', system_prompt_variables, missing='None')
 
-        # Replace variables in the system prompt
-        for key, value in system_prompt_variables.items():
-            repair_prompt = repair_prompt.replace(f'<<{key}>>', value)
-
-        # Replace remaining variables with None using regex
-        repair_prompt = re.sub(r'<<[^<>]*>>', 'None', repair_prompt)
-
-        # Create a new bot for repairing the syntax
-        syntax_corrector_bot = bots.load_bot(repair_prompt, pipe, max_new_tokens=max_new_tokens, temperature=temperature, top_p=top_p, seed=seed)
-    
     # Determine generation_type for logging based on the system prompt file used. A bit hacky but works for now.
     if 'instance' in system_prompt_path:
         gen_type = 'instance'
@@ -427,28 +631,86 @@ def get_partial_program(system_prompt_path, prompt, system_prompt_variables={},
         gen_type = 'soft constraints'
     else:
         gen_type = 'unknown'
-
-    # Check syntax of each statement block individually and attempt to fix error
+    tracing.current_span().set(generation_type=gen_type)
+
+    # Reuse the partial program if it was already generated from the same inputs (see build_cache). The system prompts
+    # include the partial programs this one depends on, so it is generated again when one of those changed.
+    build_key = None
+    if build_cache.get_build_cache() is not None:
+        build_key = build_cache.Build_Cache.make_key(
+            system_prompt=system_prompt, repair_prompt=repair_prompt, prompt=prompt, model=build_cache.pipe_id(pipe),
+            sampling_params={'temperature': temperature, 'top_p': top_p, 'seed': seed, 'max_new_tokens': max_new_tokens},
+            k=k, stream=stream, n_candidates=n_candidates, auto_fix=auto_fix, asp_grammar=bots.ASP_GRAMMAR_ENABLED)
+    cached_program = build_cache.lookup(build_key)
+    if cached_program is not None:
+        tracing.current_span().set(cached=True)
+        print(f'Reusing the cached {gen_type} partial program:\n{cached_program}\n') if printer else None
+        return cached_program
+
+    # Create a new bot for repairing the syntax
+    syntax_corrector_bot = None
     if k > 0:
-        # Use the previously created syntax_corrector_bot to repair statement blocks
-        statement_blocks, total_errors = check_and_repair_statement_blocks(
-            statement_blocks=statement_blocks,
-            prompt=prompt,
-            syntax_corrector_bot=syntax_corrector_bot,
-            k=k,
-            generation_type=gen_type,
-            printer=printer
-        )
+        syntax_corrector_bot = bots.load_bot(repair_prompt, pipe, max_new_tokens=max_new_tokens, temperature=temperature, top_p=top_p, seed=seed)
+        syntax_corrector_bot.max_history_tokens = REPAIR_HISTORY_TOKEN_BUDGET
+
+    if n_candidates > 1:
+        # Sample several candidates and continue with the best one; it is checked (and repaired) below
+        initial_response = [sample_candidates(system_prompt, prompt, pipe, n_candidates, temperature=temperature, top_p=top_p, seed=seed, max_new_tokens=max_new_tokens, printer=printer)]
+        statement_blocks = utils.split_ASP_code_into_statement_blocks(initial_response)
     else:
-        # When no repairs are requested, still run a basic syntax check to count errors
-        for idx, stmt in enumerate(statement_blocks):
-            syntax_error = utils.check_syntax_of_one_string(stmt)
-            if syntax_error:
-                total_errors += 1
+        # Load the bot and get the response
+        asp_generator_bot = bots.load_bot(system_prompt, pipe, max_new_tokens=max_new_tokens, temperature=temperature, top_p=top_p, seed=seed)
+
+        if stream:
+            def check_block(stmt):
+                if k > 0:
+                    return check_and_repair_statement_block(stmt, prompt, syntax_corrector_bot, k, gen_type, printer=printer, auto_fix=auto_fix)
+                # When no repairs are requested, still run a basic syntax check to count errors
+                syntax_error = check_statement_syntax(stmt)
+                if syntax_error and auto_fix:
+                    stmt, syntax_error = auto_fix_statement(stmt, syntax_error)
+                return stmt, not syntax_error
+
+            # Statement blocks are checked (and repaired) while the response is streamed in
+            initial_response, statement_blocks, total_errors = stream_and_check_statement_blocks(asp_generator_bot, prompt, check_block, printer=printer)
+            initial_response = [initial_response]
+        else:
+            initial_response = [asp_generator_bot.prompt(prompt)]
+
+            # Remove any lines that start with triple backticks (```) - code-fence markers that some LLMs include around code blocks.
+            initial_response = [utils.remove_backtick_lines(initial_response[0])]
+
+            # Split the response into separate statement blocks, so each can be syntax checked individually
+            statement_blocks = utils.split_ASP_code_into_statement_blocks(initial_response)
+
+    if not stream or n_candidates > 1:
+        # Check syntax of each statement block individually and attempt to fix error
+        if k > 0:
+            # Use the previously created syntax_corrector_bot to repair statement blocks
+            statement_blocks, total_errors = check_and_repair_statement_blocks(
+                statement_blocks=statement_blocks,
+                prompt=prompt,
+                syntax_corrector_bot=syntax_corrector_bot,
+                k=k,
+                generation_type=gen_type,
+                printer=printer,
+                auto_fix=auto_fix
+            )
+        else:
+            # When no repairs are requested, still run a basic syntax check to count errors
+            syntax_errors = check_statement_blocks_syntax(statement_blocks)
+            for idx, (stmt, syntax_error) in enumerate(zip(statement_blocks, syntax_errors)):
+                if syntax_error and auto_fix:
+                    statement_blocks[idx], syntax_error = auto_fix_statement(stmt, syntax_error)
+                if syntax_error:
+                    total_errors += 1
 
     # All statement blocks have been (attempted to be) fixed, combine them back into one program
     resulting_program_part = '\n'.join(statement_blocks)
     joined_initial_response = '\n'.join(initial_response)
+    # Only cache programs without syntax errors, so a failed generation is tried again on the next build
+    if total_errors == 0:
+        build_cache.store(build_key, resulting_program_part, generation_type=gen_type, syntax_errors=total_errors)
 
     if printer:
         if(resulting_program_part != joined_initial_response):
@@ -467,14 +729,23 @@ def get_partial_program(system_prompt_path, prompt, system_prompt_variables={},
         
     return(resulting_program_part)
 
-def full_ASP_program(problem, printer=False, pipe=None, k=0, temperature=None, top_p=None, seed=None, max_new_tokens=512):
+@tracing.traced('full_ASP_program')
+def full_ASP_program(problem, printer=False, pipe=None, k=0, temperature=None, top_p=None, seed=None, max_new_tokens=512, max_workers=1, stream=False, n_candidates=1, auto_fix=False):
     ''' Generate a full ASP program based on the problem description.
 
+    The instance template and generator are generated first, as every later part depends on them. All hard and soft
+    constraints only depend on those, so with max_workers > 1 they are generated concurrently (including their repair
+    loops) and reassembled in their original order.
+
     Args:
         problem (dict): A dictionary containing the problem descriptions.
         printer (bool, optional): Whether to print intermediate results. Defaults to False.
         pipe (optional): The pipeline to use for the LLM. Defaults to None.
         k (int, optional): The number of retries to get a syntactically correct response. Defaults to 0 (no retries).
+        max_workers (int, optional): The number of constraints to generate concurrently. Defaults to 1 (one at a time).
+        stream (bool, optional): Whether to stream the responses and check statement blocks while generating. Defaults to False.
+        n_candidates (int, optional): The number of candidate responses to sample concurrently per partial program. Defaults to 1.
+        auto_fix (bool, optional): Whether to try deterministic fixes (see utils.auto_fixer) before repairing a statement block with the LLM. Defaults to False.
 
     Returns:
         str: The full ASP program as a string.
@@ -495,7 +766,10 @@ def full_ASP_program(problem, printer=False, pipe=None, k=0, temperature=None, t
         temperature=temperature,
         top_p=top_p,
         seed=seed,
-        max_new_tokens=max_new_tokens
+        max_new_tokens=max_new_tokens,
+        stream=stream,
+        n_candidates=n_candidates,
+        auto_fix=auto_fix
     )
     print('Instance Template:\n' + instance_template) if printer else None
     
@@ -513,15 +787,31 @@ def full_ASP_program(problem, printer=False, pipe=None, k=0, temperature=None, t
         temperature=temperature,
         top_p=top_p,
         seed=seed,
-        max_new_tokens=max_new_tokens
+        max_new_tokens=max_new_tokens,
+        stream=stream,
+        n_candidates=n_candidates,
+        auto_fix=auto_fix
     )
     print('\n\nGenerator\n' + generator) if printer else None
 
-    # Generate hard constraints based on hard constraint descriptions, problem description, instance template and generator
-    hard_constraints = get_hard_constraints(hard_constraint_descriptions, problem_description, instance_template, generator, pipe=pipe, printer=printer, k=k)
+    constraint_kwargs = dict(pipe=pipe, printer=printer, k=k, temperature=temperature, top_p=top_p, seed=seed, max_new_tokens=max_new_tokens, stream=stream, n_candidates=n_candidates, auto_fix=auto_fix)
+
+    if max_workers > 1:
+        # Fan out all hard and soft constraints at once, now that the generator is ready
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            hard_futures = submit_constraints(executor, hard_constraint_descriptions, 'hard', problem_description, instance_template, generator, **constraint_kwargs)
+            soft_futures = submit_constraints(executor, soft_constraint_descriptions, 'soft', problem_description, instance_template, generator, **constraint_kwargs)
+
+            print('\n\nHard Constraints\n') if printer else None
+            hard_constraints = collect_constraints(hard_futures, printer=printer)
+            print('\nSoft Constraints:\n') if printer else None
+            soft_constraints = collect_constraints(soft_futures, printer=printer)
+    else:
+        # Generate hard constraints based on hard constraint descriptions, problem description, instance template and generator
+        hard_constraints = get_hard_constraints(hard_constraint_descriptions, problem_description, instance_template, generator, **constraint_kwargs)
 
-    # Generate soft constraints based on soft constraint descriptions, problem description, instance template and generator
-    soft_constraints = get_soft_constraints(soft_constraint_descriptions, problem_description, instance_template, generator, pipe=pipe, printer=printer, k=k)
+        # Generate soft constraints based on soft constraint descriptions, problem description, instance template and generator
+        soft_constraints = get_soft_constraints(soft_constraint_descriptions, problem_description, instance_template, generator, **constraint_kwargs)
 
     # Create a string that contains all hard and soft constraints with descriptions as comments
     hard_constraints_str = extract_constraints(hard_constraint_descriptions, hard_constraints)
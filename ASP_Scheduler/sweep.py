@@ -0,0 +1,347 @@
+"""Headless, resumable sweeps of full_ASP_program runs.
+
+A sweep is the product of problems x models x k x temperature x top_p x seeds x runs. Every job generates one full
+program in a worker process and writes the .lp file and its metrics CSV atomically (to a temporary file that is renamed),
+followed by a done marker. A restarted sweep skips the jobs with a done marker, so a crash or a kill only loses the jobs
+that were running. Failed jobs are recorded with their traceback and run again on the next start.
+
+Layout of the output directory:
+    <settings>/<problem>_<model>_k=<k>.lp               programs, one folder per temperature/top_p/seed/run
+    metrics.csv                                         metrics of all finished jobs (rebuilt after every sweep)
+    .sweep/metrics/<job>.csv                            metrics per job
+    .sweep/done/<job>.json, .sweep/failed/<job>.json    done markers and failures
+
+The sweep spec is a JSON file; command line options override its values:
+    {
+        "problems": ["nurse_scheduling", "sports scheduling"],          (or "all")
+        "models": ["deepseek", {"name": "Qwen2.5-7B-Instruct", "checkpoint": "Qwen/Qwen2.5-7B-Instruct"}],
+        "k": [0, 5], "temperature": [0.01], "top_p": [0], "seeds": [0, 1, 2], "runs": 1,
+        "max_new_tokens": 512, "max_workers": 1, "stream": false, "n_candidates": 1, "auto_fix": false,
+        "output_dir": "Results/sweep", "workers": 4
+    }
+Models are pipe names ('hf' for the HF API, 'deepseek', 'async', 'async-deepseek', 'mock', 'mock-async') or local
+checkpoints (loaded once per worker process; use one worker per GPU).
+
+Usage (from the repository root):
+    python -m ASP_Scheduler sweep.json [--workers 4] [--dry-run]
+    python -m ASP_Scheduler --problems all --models mock --k 0 5 --seeds 0 1 --output-dir Results/sweep
+"""
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import signal
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait
+
+from ASP_Scheduler.problem_descriptions import all_problems
+
+# Settings of a sweep that are not given in the spec or on the command line
+DEFAULT_SPEC = {
+    'problems': 'all',
+    'models': ['hf'],
+    'k': [5],
+    'temperature': [None],
+    'top_p': [None],
+    'seeds': [None],
+    'runs': 1,
+    'max_new_tokens': 512,
+    'max_workers': 1,
+    'stream': False,
+    'n_candidates': 1,
+    'auto_fix': False,
+    'output_dir': 'Results/sweep',
+    'metrics': None,
+    'workers': 1,
+    'local_dir': './local_models',
+    'mock_backend': {},
+}
+
+STATE_DIR = '.sweep'
+
+# Pipelines of local models, loaded once per worker process
+_pipes = {}
+
+
+def normalize_model(model):
+    """Return the settings of a model of the spec (a pipe name or a dict) as a dict with name, pipe and checkpoint."""
+    if isinstance(model, str):
+        model = {'pipe': model} if '/' not in model else {'checkpoint': model}
+    model = dict(model)
+    if model.get('checkpoint'):
+        model.setdefault('name', model['checkpoint'].split('/')[-1])
+        model.setdefault('quantization', None)
+        model['pipe'] = None
+    else:
+        model.setdefault('pipe', 'hf')
+        # Same names as the scheduler notebook: the HF API runs Meta-Llama-3-8B-Instruct
+        model.setdefault('name', model['pipe'] if model['pipe'] != 'hf' else 'Meta-Llama-3-8B-Instruct')
+        model['checkpoint'] = None
+    return model
+
+
+def job_id(job):
+    """Unique, file name safe identifier of a job."""
+    text = f"{job['problem']}_{job['model']['name']}_k={job['k']}_T={job['temperature']}_top_p={job['top_p']}_seed={job['seed']}_run={job['run']}"
+    return re.sub(r'[^A-Za-z0-9=.+-]+', '-', text)
+
+
+def expand_jobs(spec):
+    """All jobs of a sweep, in a fixed order."""
+    problems = list(all_problems) if spec['problems'] == 'all' else list(spec['problems'])
+    unknown = [problem for problem in problems if problem not in all_problems]
+    if unknown:
+        raise ValueError(f"Unknown problems: {', '.join(unknown)} (known: {', '.join(all_problems)})")
+
+    jobs = []
+    for problem, model, k, temperature, top_p, seed, run in itertools.product(
+            problems, [normalize_model(model) for model in spec['models']], spec['k'], spec['temperature'],
+            spec['top_p'], spec['seeds'], range(spec['runs'])):
+        job = {'problem': problem, 'model': model, 'k': k, 'temperature': temperature, 'top_p': top_p, 'seed': seed, 'run': run}
+        job['id'] = job_id(job)
+        jobs.append(job)
+    return jobs
+
+
+def write_atomic(path, text):
+    """Write a file via a temporary file in the same folder, so readers (and resumed sweeps) never see a partial file."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as file:
+        file.write(text)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+
+def _init_worker(mock_backend):
+    # Ctrl-C stops the sweep in the main process, which lets the running jobs finish (see run_sweep)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from LLM import bots
+    if mock_backend is not None:
+        bots.configure_mock_backend(problems=all_problems, **mock_backend)
+
+
+def _get_pipe(model, local_dir):
+    """The pipe argument of full_ASP_program for a model; local models are loaded once per process."""
+    if model['checkpoint'] is None:
+        return None if model['pipe'] == 'hf' else model['pipe']
+    key = (model['checkpoint'], model['quantization'])
+    if key not in _pipes:
+        from LLM import bots
+        _pipes[key] = bots.load_pipe(model_checkpoint=model['checkpoint'], local_dir=local_dir, quantization_config=model['quantization'])
+    return _pipes[key]
+
+
+def run_job(job, spec):
+    """
+    Generate the full program of one job and write its .lp file, metrics and done marker.
+
+    Returns:
+        dict: The done marker (program path, metrics path, seconds, statement blocks and invalid blocks).
+    """
+    from ASP_Scheduler import scheduler
+    from utils import logger
+
+    start = time.perf_counter()
+    model = job['model']
+    output_dir = spec['output_dir']
+    state_dir = os.path.join(output_dir, STATE_DIR)
+    pipe = _get_pipe(model, spec['local_dir'])
+
+    # Model identifiers as written by the scheduler notebook
+    if model['checkpoint'] is not None:
+        model_id = f"{model['checkpoint']} (LOCAL, QUANTIZATION: {model['quantization']})"
+        model_string = model['name'] if model['quantization'] is None else f"{model['name']} (quant {model['quantization']})"
+    else:
+        model_id = f"{model['name']} (REMOTE)" if model['pipe'] != 'hf' else model['name']
+        model_string = model['name']
+    # Underscores separate the parts of the file name (see utils.syntax_analyzer)
+    model_string = model_string.replace('_', '-')
+
+    metrics_path = os.path.join(state_dir, 'metrics', f"{job['id']}.csv")
+    temporary_metrics_path = f'{metrics_path}.{os.getpid()}.tmp'
+    if os.path.exists(temporary_metrics_path):
+        os.remove(temporary_metrics_path)
+    metrics_logger = logger.Metrics_Logger(temporary_metrics_path)
+    try:
+        with metrics_logger.run(job['problem'], job['k'], model=model_id, temperature=job['temperature'], top_p=job['top_p'], seed=job['seed']):
+            full_program = scheduler.full_ASP_program(
+                all_problems[job['problem']],
+                pipe=pipe,
+                k=job['k'],
+                temperature=job['temperature'],
+                top_p=job['top_p'],
+                seed=job['seed'],
+                max_new_tokens=spec['max_new_tokens'],
+                max_workers=spec['max_workers'],
+                stream=spec['stream'],
+                n_candidates=spec['n_candidates'],
+                auto_fix=spec['auto_fix'])
+    finally:
+        metrics_logger.close()
+
+    settings = re.sub(r'[^A-Za-z0-9=.+-]+', '-', f"T={job['temperature']}_top_p={job['top_p']}_seed={job['seed']}_run={job['run']}")
+    # One file name per job (without a time stamp), so a job that is run again after a kill overwrites its program
+    program_path = os.path.join(output_dir, settings, f"{job['problem']}_{model_string}_k={job['k']}.lp")
+    write_atomic(program_path, full_program)
+    os.replace(temporary_metrics_path, metrics_path)
+
+    with open(metrics_path, newline='', encoding='utf-8') as file:
+        rows = list(csv.DictReader(file))
+    marker = {
+        'job': job,
+        'program': os.path.relpath(program_path, output_dir),
+        'metrics': os.path.relpath(metrics_path, output_dir),
+        'seconds': time.perf_counter() - start,
+        'statement_blocks': len(rows),
+        'invalid_statement_blocks': sum(1 for row in rows if row['correct_syntax'] == '0'),
+    }
+    write_atomic(os.path.join(state_dir, 'done', f"{job['id']}.json"), json.dumps(marker, indent=2))
+    return marker
+
+
+def is_done(job, spec):
+    return os.path.exists(os.path.join(spec['output_dir'], STATE_DIR, 'done', f"{job['id']}.json"))
+
+
+def merge_metrics(jobs, spec):
+    """Rebuild the metrics CSV of the sweep from the metrics of all finished jobs, in job order. Returns the number of rows."""
+    from utils import logger
+
+    path = spec['metrics'] or os.path.join(spec['output_dir'], 'metrics.csv')
+    lines = [','.join(logger.HEADER)]
+    for job in jobs:
+        metrics_path = os.path.join(spec['output_dir'], STATE_DIR, 'metrics', f"{job['id']}.csv")
+        if is_done(job, spec) and os.path.exists(metrics_path):
+            with open(metrics_path, encoding='utf-8') as file:
+                lines += file.read().splitlines()[1:]
+    write_atomic(path, '\n'.join(lines) + '\n')
+    return len(lines) - 1
+
+
+def run_sweep(spec, dry_run=False):
+    """
+    Run all jobs of a sweep that are not done yet.
+
+    Args:
+        spec (dict): The sweep settings (see DEFAULT_SPEC).
+        dry_run (bool, optional): Only print the pending jobs. Defaults to False.
+
+    Returns:
+        tuple: (finished, failed) numbers of jobs of this start.
+    """
+    jobs = expand_jobs(spec)
+    pending = [job for job in jobs if not is_done(job, spec)]
+    print(f'{len(jobs)} jobs, {len(jobs) - len(pending)} done, {len(pending)} to run with {spec["workers"]} workers')
+    if dry_run:
+        for job in pending:
+            print(f'  {job["id"]}')
+        return 0, 0
+
+    # Leftovers of jobs stopped by an earlier interrupt
+    metrics_dir = os.path.join(spec['output_dir'], STATE_DIR, 'metrics')
+    if os.path.isdir(metrics_dir):
+        for name in os.listdir(metrics_dir):
+            if name.endswith('.tmp'):
+                os.remove(os.path.join(metrics_dir, name))
+
+    # Mock models replay recorded responses; configure the backend in every worker
+    uses_mock = any(job['model']['pipe'] in ('mock', 'mock-async') for job in pending)
+    failed_dir = os.path.join(spec['output_dir'], STATE_DIR, 'failed')
+    finished = failed = 0
+    recorded = set()
+    start = time.perf_counter()
+
+    def record(future):
+        nonlocal finished, failed
+        recorded.add(future)
+        job = futures[future]
+        failed_path = os.path.join(failed_dir, f"{job['id']}.json")
+        try:
+            marker = future.result()
+        except Exception as e:
+            failed += 1
+            write_atomic(failed_path, json.dumps({'job': job, 'error': repr(e), 'traceback': traceback.format_exc()}, indent=2))
+            print(f'[{finished + failed}/{len(pending)}] FAILED {job["id"]}: {e!r}')
+            return
+
+        finished += 1
+        if os.path.exists(failed_path):
+            os.remove(failed_path)
+        print(f'[{finished + failed}/{len(pending)}] done {job["id"]} in {marker["seconds"]:.1f} s '
+              f'({marker["invalid_statement_blocks"]} of {marker["statement_blocks"]} statement blocks invalid)')
+
+    # Spawned workers do not inherit threads (loggers, thread pools) or CUDA state of this process
+    executor = ProcessPoolExecutor(max_workers=spec['workers'], mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_worker, initargs=(spec['mock_backend'] if uses_mock else None,))
+    futures = {}
+    try:
+        for job in pending:
+            futures[executor.submit(run_job, job, spec)] = job
+        for future in as_completed(futures):
+            record(future)
+    except KeyboardInterrupt:
+        # The started jobs still write their results; the others run when the sweep is started again
+        print('Interrupted: waiting for the started jobs to finish (interrupt again to stop them)')
+        started = [future for future in futures if future not in recorded and not future.cancel()]
+        try:
+            for future in as_completed(started):
+                record(future)
+        except KeyboardInterrupt:
+            # ProcessPoolExecutor has no public way to stop running calls (before Python 3.14)
+            for process in list(executor._processes.values()):
+                process.terminate()
+            raise
+        print(f'{len(pending) - finished - failed} jobs not started; start the sweep again to run them')
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    rows = merge_metrics(jobs, spec)
+    print(f'{finished} jobs finished, {failed} failed in {time.perf_counter() - start:.1f} s; {rows} metrics rows in the sweep')
+    return finished, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a resumable sweep of full ASP program generations.')
+    parser.add_argument('spec', nargs='?', default=None, help='JSON file with the sweep settings')
+    parser.add_argument('--problems', nargs='+', default=None, help="problems to generate ('all' for all problems)")
+    parser.add_argument('--models', nargs='+', default=None, help="pipe names ('hf', 'deepseek', 'async', 'mock', ...) or local checkpoints")
+    parser.add_argument('--k', type=int, nargs='+', default=None, help='numbers of repair attempts per statement block')
+    parser.add_argument('--temperature', type=float, nargs='+', default=None, help='sampling temperatures')
+    parser.add_argument('--top-p', type=float, nargs='+', default=None, help='top_p values')
+    parser.add_argument('--seeds', type=int, nargs='+', default=None, help='seeds (-1 for no fixed seed)')
+    parser.add_argument('--runs', type=int, default=None, help='runs per setting')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--output-dir', default=None, help='folder of the programs, metrics and sweep state')
+    parser.add_argument('--metrics', default=None, help='path of the merged metrics CSV (default: <output-dir>/metrics.csv)')
+    parser.add_argument('--dry-run', action='store_true', help='only list the jobs that would run')
+    args = parser.parse_args(argv)
+
+    spec = dict(DEFAULT_SPEC)
+    if args.spec is not None:
+        with open(args.spec, 'r', encoding='utf-8') as file:
+            settings = json.load(file)
+        unknown = set(settings) - set(DEFAULT_SPEC)
+        if unknown:
+            raise ValueError(f"Unknown sweep settings: {', '.join(sorted(unknown))}")
+        spec.update(settings)
+    overrides = {'problems': args.problems, 'models': args.models, 'k': args.k, 'temperature': args.temperature,
+                 'top_p': args.top_p, 'seeds': args.seeds, 'runs': args.runs, 'workers': args.workers,
+                 'output_dir': args.output_dir, 'metrics': args.metrics}
+    spec.update({name: value for name, value in overrides.items() if value is not None})
+    if spec['problems'] == ['all']:
+        spec['problems'] = 'all'
+    # As in the scheduler notebook, seed -1 means no fixed seed
+    spec['seeds'] = [None if seed == -1 else seed for seed in spec['seeds']]
+
+    finished, failed = run_sweep(spec, dry_run=args.dry_run)
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
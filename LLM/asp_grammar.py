@@ -0,0 +1,279 @@
+# Grammar-constrained decoding for ASP (clingo's surface syntax), for local transformers models.
+# ASP_Prefix_State is a character-level automaton that decides whether a text can still be extended to a valid
+# sequence of ASP statements (facts, rules, constraints, aggregates, directives and comments). The logits processor
+# uses it to mask out tokens that would make the generated text invalid, e.g. prose like "Here is the corrected code:",
+# code fences, unbalanced brackets and an end of generation in the middle of a statement.
+import torch
+from transformers import LogitsProcessor
+
+CODE, STRING, COMMENT_START, LINE_COMMENT, BLOCK_COMMENT, BLOCK_COMMENT_END = range(6)
+
+OPEN_BRACKETS = {'(': ')', '{': '}', '[': ']'}
+CLOSE_BRACKETS = {')', '}', ']'}
+# Operators and separators of clingo (':-', ':~', '!=', '<=', '..', '\' (modulo), '@' (script calls), ...)
+OPERATOR_CHARACTERS = set(':-,;=<>!+*/\\|&^~?$@')
+WORD_CHARACTERS = set('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_\'')
+# '#' keywords that are terms (or aggregate functions), all other '#' keywords are directives like #show or #minimize
+TERM_KEYWORDS = {'#count', '#sum', '#sum+', '#min', '#max', '#true', '#false', '#inf', '#sup'}
+
+
+# State of the automaton after a prefix of the generated text. feed() returns False when the text can not be part of
+# a valid program anymore; the state is then left undefined, so feed a copy() when only testing a continuation.
+class ASP_Prefix_State():
+    __slots__ = ('mode', 'stack', 'in_statement', 'pending_dot', 'last', 'space', 'word', 'operator', 'weak')
+
+    def __init__(self):
+        self.mode = CODE
+        self.stack = ''
+        self.in_statement = False
+        # A '.' at the top level ends the statement, unless it is followed by a second '.' (a range like 1..n)
+        self.pending_dot = False
+        # Kind of the last token of the statement: None, 'term', 'bound' (a '}'), 'not', 'directive' or 'operator'
+        self.last = None
+        # Whether there was whitespace after the last token
+        self.space = False
+        # The identifier or keyword being read
+        self.word = ''
+        # The last operator character, to recognize ':~'
+        self.operator = ''
+        # Weak constraints (:~ body. [weight@level, terms]) continue after their '.': 0 no weak constraint, 1 in its
+        # body, 2 expecting its weight, 3 in its weight
+        self.weak = 0
+
+    def copy(self):
+        state = ASP_Prefix_State.__new__(ASP_Prefix_State)
+        for name in ASP_Prefix_State.__slots__:
+            setattr(state, name, getattr(self, name))
+        return state
+
+    def can_end(self):
+        """Whether the generation may end here: at a statement boundary, with all brackets closed."""
+        if self.mode not in (CODE, COMMENT_START, LINE_COMMENT) or self.stack:
+            return False
+        return self.pending_dot or not self.in_statement
+
+    def feed(self, text):
+        """Advance the state over a text. Returns False if the text can not be part of a valid program."""
+        for character in text:
+            if not self.feed_character(character):
+                return False
+        return True
+
+    def end_word(self):
+        if not self.word:
+            return
+        if self.word == 'not':
+            self.last = 'not'
+        elif self.word.startswith('#') and self.word not in TERM_KEYWORDS:
+            self.last = 'directive'
+        else:
+            self.last = 'term'
+        self.word = ''
+
+    def start_term(self):
+        # Two terms can not follow each other without an operator: "a b" is prose, not ASP (except after 'not' and
+        # directives such as #show)
+        if self.last == 'term' and self.space:
+            return False
+        if self.weak == 2:
+            self.weak = 0
+        self.space = False
+        self.in_statement = True
+        return True
+
+    def feed_character(self, character):
+        mode = self.mode
+
+        if mode == STRING:
+            if self.word == '\\':
+                self.word = ''
+            elif character == '\\':
+                self.word = '\\'
+            elif character == '"':
+                self.mode = CODE
+                self.word = ''
+                self.last = 'term'
+            elif character == '\n':
+                return False
+            return True
+
+        if mode == COMMENT_START:
+            self.mode = BLOCK_COMMENT if character == '*' else LINE_COMMENT
+            if character == '\n':
+                self.mode = CODE
+            return True
+
+        if mode == LINE_COMMENT:
+            if character == '\n':
+                self.mode = CODE
+            return True
+
+        if mode == BLOCK_COMMENT or mode == BLOCK_COMMENT_END:
+            if mode == BLOCK_COMMENT_END and character == '%':
+                self.mode = CODE
+            else:
+                self.mode = BLOCK_COMMENT_END if character == '*' else BLOCK_COMMENT
+            return True
+
+        # Code
+        if self.pending_dot:
+            self.pending_dot = False
+            if character == '.':
+                # A range (1..n), not the end of the statement
+                self.last = 'operator'
+                self.space = False
+                return True
+            # The previous '.' ended the statement
+            self.in_statement = False
+            self.last = None
+            self.space = False
+            if self.weak == 1:
+                self.weak = 2
+
+        if character in WORD_CHARACTERS or (character == '#' and not self.word) or (character == '+' and self.word == '#sum'):
+            if not self.word:
+                if not self.start_term():
+                    return False
+            self.word += character
+            return True
+
+        self.end_word()
+
+        if character in ' \t\r\n':
+            if self.last is not None:
+                self.space = True
+            return True
+
+        if character == '%':
+            self.mode = COMMENT_START
+            return True
+
+        if character == '"':
+            if not self.start_term():
+                return False
+            self.mode = STRING
+            return True
+
+        if character in OPEN_BRACKETS:
+            if self.weak == 2:
+                self.weak = 3 if character == '[' else 0
+            self.stack += character
+            self.in_statement = True
+            self.last = 'operator'
+            self.space = False
+            return True
+
+        if character in CLOSE_BRACKETS:
+            if not self.stack or OPEN_BRACKETS[self.stack[-1]] != character:
+                return False
+            self.stack = self.stack[:-1]
+            # The upper bound of a choice rule may follow its '}', as in 1 { a; b } 2
+            self.last = 'bound' if character == '}' else 'term'
+            self.space = False
+            if self.weak == 3 and not self.stack:
+                # The weight of a weak constraint ends the statement
+                self.weak = 0
+                self.in_statement = False
+                self.last = None
+            return True
+
+        if character == '.':
+            if self.stack:
+                self.last = 'operator'
+            elif not self.in_statement:
+                return False
+            else:
+                self.pending_dot = True
+            self.space = False
+            return True
+
+        if character in OPERATOR_CHARACTERS:
+            if self.weak == 2:
+                self.weak = 0
+            if character == '~' and self.operator == ':' and self.last == 'operator' and not self.space:
+                self.weak = 1
+            self.operator = character
+            self.in_statement = True
+            self.last = 'operator'
+            self.space = False
+            return True
+
+        # Anything else (code fences, non-ASCII characters, ...) is not ASP
+        return False
+
+
+def is_viable_prefix(text):
+    """Return whether a text can still be extended to a valid sequence of ASP statements."""
+    return ASP_Prefix_State().feed(text)
+
+
+# Logits processor restricting generation to ASP. Of the top_k most likely next tokens, only those keeping the text a
+# viable ASP prefix are allowed; the end of sequence token is only allowed at a statement boundary. When none of the
+# top_k tokens is viable, the step is left unconstrained instead of forcing an unlikely token.
+class ASP_Grammar_Logits_Processor(LogitsProcessor):
+    def __init__(self, tokenizer, eos_token_ids=None, top_k=20):
+        self.tokenizer = tokenizer
+        self.top_k = top_k
+        if eos_token_ids is None:
+            eos_token_ids = tokenizer.eos_token_id
+        if isinstance(eos_token_ids, int):
+            eos_token_ids = [eos_token_ids]
+        self.eos_token_ids = set(eos_token_ids or [])
+        self.special_token_ids = set(tokenizer.all_special_ids) - self.eos_token_ids
+
+        # Token texts are decoded after an anchor token, so tokenizers that drop a leading space when decoding a
+        # single token still report it
+        self.anchor_ids = tokenizer.encode('a', add_special_tokens=False)
+        self.anchor_text = tokenizer.decode(self.anchor_ids)
+        self.token_texts = {}
+
+        self.prompt_length = None
+        self.states = None
+        self.generated = None
+
+    def token_text(self, token_id):
+        text = self.token_texts.get(token_id)
+        if text is None:
+            text = self.tokenizer.decode(self.anchor_ids + [token_id])[len(self.anchor_text):]
+            self.token_texts[token_id] = text
+        return text
+
+    def __call__(self, input_ids, scores):
+        if self.prompt_length is None:
+            self.prompt_length = input_ids.shape[1]
+            self.states = [ASP_Prefix_State() for _ in range(input_ids.shape[0])]
+            self.generated = [0] * input_ids.shape[0]
+
+        for row in range(input_ids.shape[0]):
+            state = self.states[row]
+            if state is None:
+                continue
+
+            # Advance over the tokens generated since the previous step
+            new_ids = input_ids[row, self.prompt_length + self.generated[row]:].tolist()
+            self.generated[row] += len(new_ids)
+            for token_id in new_ids:
+                if token_id in self.eos_token_ids or token_id in self.special_token_ids:
+                    continue
+                if not state.feed(self.token_text(token_id)):
+                    # An unconstrained step produced invalid text; stop constraining this row
+                    state = None
+                    break
+            self.states[row] = state
+            if state is None:
+                continue
+
+            allowed = []
+            for token_id in torch.topk(scores[row], min(self.top_k, scores.shape[-1])).indices.tolist():
+                if token_id in self.eos_token_ids:
+                    if state.can_end():
+                        allowed.append(token_id)
+                elif token_id not in self.special_token_ids and state.copy().feed(self.token_text(token_id)):
+                    allowed.append(token_id)
+
+            if allowed:
+                mask = torch.ones_like(scores[row], dtype=torch.bool)
+                mask[allowed] = False
+                scores[row] = scores[row].masked_fill(mask, float('-inf'))
+
+        return scores
@@ -0,0 +1,68 @@
+"""Import-time benchmark for the scheduler.
+
+Importing the scheduler must not pull in the heavy dependencies of the bot backends (torch, transformers,
+huggingface_hub, pandas); these are only imported once a remote or local bot is actually used. Each import is timed in
+a fresh interpreter, so earlier imports can not hide the cost of later ones.
+
+Usage (from the repository root):
+    python -m LLM.benchmark_imports [--runs 5]
+
+Exits with status 1 when a heavy module is imported by the scheduler, so it can be used as a regression check.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['torch', 'transformers', 'huggingface_hub', 'pandas']
+
+TARGETS = ['LLM.bots', 'ASP_Scheduler.scheduler']
+
+_MEASURE = '''
+import json, resource, sys, time
+start = time.perf_counter()
+import {target}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy": [name for name in {heavy!r} if name in sys.modules],
+}}))
+'''
+
+
+def measure(target):
+    """Import `target` in a fresh interpreter and return its import time, peak RSS and the heavy modules it loaded."""
+    output = subprocess.check_output([sys.executable, '-c', _MEASURE.format(target=target, heavy=HEAVY_MODULES)], cwd=REPO_ROOT)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='number of fresh interpreters per target')
+    args = parser.parse_args()
+
+    failed = False
+    for target in TARGETS:
+        results = [measure(target) for _ in range(args.runs)]
+        seconds = sorted(result['seconds'] for result in results)
+        heavy = sorted(set(name for result in results for name in result['heavy']))
+
+        print(f'{target}:')
+        print(f'  import time: median {seconds[len(seconds) // 2] * 1000:.1f} ms, min {seconds[0] * 1000:.1f} ms ({args.runs} runs)')
+        print(f'  peak RSS   : {max(result["max_rss_mb"] for result in results):.1f} MB')
+        print(f'  heavy deps : {", ".join(heavy) if heavy else "none"}')
+
+        if heavy:
+            failed = True
+
+    print()
+    print('Lazy imports: ' + ('FAILED' if failed else 'OK'))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,113 +1,212 @@
-import json
-import pandas as pd
-from huggingface_hub import InferenceClient
-from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline, BitsAndBytesConfig
-import json
-import time
-from dotenv import load_dotenv
+import copy
+import importlib
 import os
-import torch
+import sys
+import time
+from LLM.cache import Response_Cache
+from utils import tracing
 # from llama import Dialog, Llama
 # from typing import List, Optional
 
-# Load the environment variables from the .env file
-load_dotenv()
+# The bot backends live in their own modules and are only imported on first use, so that importing this module (and
+# the scheduler) does not pull in torch, transformers or huggingface_hub:
+# - LLM.remote_bots: HF API and together provider bots (huggingface_hub)
+# - LLM.local_bots: local transformers pipeline bots (torch, transformers)
+# - LLM.mock_bots: offline bots replaying recorded responses, for benchmarking
+_LAZY_ATTRIBUTES = {
+    'API_Bot': 'LLM.remote_bots',
+    'Deepseek_Bot': 'LLM.remote_bots',
+    'DeepseekDirect_Bot': 'LLM.remote_bots',
+    'Async_API_Bot': 'LLM.remote_bots',
+    'Async_Deepseek_Bot': 'LLM.remote_bots',
+    'Token_Bucket': 'LLM.remote_bots',
+    'configure_remote_limits': 'LLM.remote_bots',
+    'get_event_loop': 'LLM.remote_bots',
+    'run_coroutine': 'LLM.remote_bots',
+    'get_inference_client': 'LLM.remote_bots',
+    'configure_client_pool': 'LLM.remote_bots',
+    'client_pool_stats': 'LLM.remote_bots',
+    'Local_Bot': 'LLM.local_bots',
+    'Batched_Pipe': 'LLM.local_bots',
+    'generate_batch': 'LLM.local_bots',
+    'encode_chat': 'LLM.local_bots',
+    'get_prefix_kv_cache': 'LLM.local_bots',
+    'common_prefix_length': 'LLM.local_bots',
+    'load_pipe': 'LLM.local_bots',
+    'load_from_snellius': 'LLM.local_bots',
+    'Mock_Bot': 'LLM.mock_bots',
+    'configure_mock_backend': 'LLM.mock_bots',
+    'mock_backend_stats': 'LLM.mock_bots',
+}
+
+_hf_key_loaded = False
+_hf_key = None
+
+# Opt-in reuse of prefix KV caches for local models (see enable_prefix_cache)
+PREFIX_CACHE_ENABLED = False
+# Number of system-prompt prefixes for which the KV cache is kept (least recently used ones are dropped)
+PREFIX_CACHE_SIZE = 4
+
+# Opt-in grammar-constrained decoding for local models (see enable_asp_grammar)
+ASP_GRAMMAR_ENABLED = False
+# Number of most likely next tokens that are checked against the grammar at every step
+ASP_GRAMMAR_TOP_K = 20
+
+# Opt-in persistent response cache, shared by all bots created by load_bot (see enable_response_cache)
+_response_cache = None
+
+
+def __getattr__(name):
+    # Import the backend providing `name` on first access (PEP 562)
+    if name == 'HF_KEY':
+        return get_hf_key()
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(module_name), name)
+
+
+def get_hf_key():
+    """Return the Huggingface API key, loading the environment variables from the .env file on first use."""
+    global _hf_key_loaded, _hf_key
+    if not _hf_key_loaded:
+        from dotenv import load_dotenv
+
+        # Load the environment variables from the .env file
+        load_dotenv()
+        _hf_key = os.getenv('HF_KEY')
+        _hf_key_loaded = True
+    return _hf_key
+
+
+def enable_response_cache(path='llm_cache/responses.sqlite', max_size_mb=512):
+    """Cache all LLM responses on disk, keyed on model id, full message list and sampling params.
+
+    Only use this for deterministic settings (e.g. a fixed seed), as a cached prompt always returns the same response.
+
+    Args:
+        path (str): path of the SQLite cache file (parent folders are created automatically)
+        max_size_mb (float|None): the least recently used responses are evicted above this size; None for no limit
+
+    Returns:
+        Response_Cache: the cache, e.g. to report its stats()
+    """
+    global _response_cache
+    _response_cache = Response_Cache(path, max_size_bytes=int(max_size_mb * 1024 * 1024) if max_size_mb is not None else None)
+    return _response_cache
+
+
+def disable_response_cache():
+    """Stop caching LLM responses for bots created from now on."""
+    global _response_cache
+    _response_cache = None
+
+
+def response_cache_stats():
+    """Return the hit/miss stats of the response cache, or None if it is not enabled."""
+    return _response_cache.stats() if _response_cache is not None else None
+
+
+def enable_prefix_cache(size=4):
+    """Let local bots reuse the KV cache of already encoded prompt prefixes instead of prefilling them again.
+
+    The system prompt of a problem (with the same problem description, instance template and generator for every
+    constraint) is encoded once and its past_key_values are shared by all bots using that system prompt. Each bot also
+    keeps the KV cache of its own conversation, so a repair turn only prefills the new user message.
+
+    Args:
+        size (int): number of system-prompt prefixes to keep in the shared cache
+    """
+    global PREFIX_CACHE_ENABLED, PREFIX_CACHE_SIZE
+    PREFIX_CACHE_ENABLED = True
+    PREFIX_CACHE_SIZE = size
+
+
+def disable_prefix_cache():
+    """Stop reusing prefix KV caches for local bots created from now on, and free the shared caches."""
+    global PREFIX_CACHE_ENABLED
+    PREFIX_CACHE_ENABLED = False
+    if 'LLM.local_bots' in sys.modules:
+        sys.modules['LLM.local_bots'].clear_prefix_kv_caches()
+
+
+def enable_asp_grammar(top_k=20):
+    """Restrict the decoding of local bots created from now on to ASP syntax.
+
+    At every step, only those of the top_k most likely tokens are allowed that keep the response a valid prefix of a
+    sequence of ASP statements (see LLM.asp_grammar): no prose, no code fences, balanced brackets, and the response can
+    only end after a complete statement. Remote bots are not affected.
+
+    Args:
+        top_k (int): number of most likely next tokens checked against the grammar at every step
+    """
+    global ASP_GRAMMAR_ENABLED, ASP_GRAMMAR_TOP_K
+    ASP_GRAMMAR_ENABLED = True
+    ASP_GRAMMAR_TOP_K = top_k
+
+
+def disable_asp_grammar():
+    """Stop restricting the decoding of local bots created from now on."""
+    global ASP_GRAMMAR_ENABLED
+    ASP_GRAMMAR_ENABLED = False
 
-# Access your environment variables
-HF_KEY = os.getenv('HF_KEY')
 
 # If no pipeline is provided, the bot will default to Meta Llama 3 8B accessed via HF API
-def load_bot(system_prompt, pipe = None, max_new_tokens=512, temperature = None, top_p = None, seed = None):
+def load_bot(system_prompt, pipe = None, max_new_tokens=512, temperature = None, top_p = None, seed = None, cache = None):
     """Load an appropriate bot instance and pass sampling params through.
 
     Args:
         system_prompt (str): the system prompt text
-        pipe: None for remote HF API, 'deepseek' for together/deepseek provider, or a local pipeline object
+        pipe: None for remote HF API, 'deepseek' for together/deepseek provider, 'async' or 'async-deepseek' for the
+            rate-limited asyncio variants of those two, 'mock' or 'mock-async' for the offline mock backend (replaying
+            recorded responses, see LLM.mock_bots), or a local pipeline object
         max_new_tokens (int): max tokens for generation (used for local bots)
         temperature (float|None): sampling temperature
         top_p (float|None): nucleus sampling parameter
         seed (int|None): optional seed for reproducible sampling
+        cache (Response_Cache|None): response cache to use; defaults to the one set by enable_response_cache
 
     Returns:
         bot instance
     """
-    if pipe == 'deepseek':
+    if pipe == 'mock':
+        from LLM.mock_bots import Mock_Bot
+        bot = Mock_Bot(system_prompt, temperature=temperature, top_p=top_p, seed=seed, max_new_tokens=max_new_tokens)
+    elif pipe == 'mock-async':
+        from LLM.mock_bots import Mock_Client
+        from LLM.remote_bots import Async_API_Bot
+        bot = Async_API_Bot(system_prompt, model='mock', provider='mock', temperature=temperature, top_p=top_p, seed=seed, max_new_tokens=max_new_tokens, client=Mock_Client(seed=seed))
+    elif pipe == 'async':
+        from LLM.remote_bots import Async_API_Bot
+        bot = Async_API_Bot(system_prompt, model="meta-llama/Meta-Llama-3-8B-Instruct", temperature=temperature, top_p=top_p, seed=seed, max_new_tokens=max_new_tokens)
+    elif pipe == 'async-deepseek':
+        from LLM.remote_bots import Async_Deepseek_Bot
+        bot = Async_Deepseek_Bot(system_prompt, temperature=temperature, top_p=top_p, seed=seed, max_new_tokens=max_new_tokens)
+    elif pipe == 'deepseek':
+        from LLM.remote_bots import Deepseek_Bot
         bot = Deepseek_Bot(system_prompt, temperature=temperature, top_p=top_p, seed=seed, max_new_tokens=max_new_tokens)
     elif pipe is not None:
+        from LLM.local_bots import Local_Bot
         bot = Local_Bot(system_prompt, pipe, max_new_tokens=max_new_tokens, temperature=temperature if temperature is not None else 0.01, top_p=top_p if top_p is not None else 0, seed=seed)
     else:
+        from LLM.remote_bots import API_Bot
         bot = API_Bot(system_prompt, model="meta-llama/Meta-Llama-3-8B-Instruct", temperature=temperature, top_p=top_p, seed=seed, max_new_tokens=max_new_tokens)
 
+    bot.cache = cache if cache is not None else _response_cache
+
     return bot
 
 
-# Class representing an LLM chat bot
-class API_Bot():
-    def __init__(self, system_prompt, model="meta-llama/Meta-Llama-3-8B-Instruct", temperature=None, top_p=None, seed=None, max_new_tokens=512):
+# Base class representing an LLM chat bot. Subclasses implement infer() for their backend.
+class Chat_Bot():
+    def __init__(self, system_prompt, max_history_tokens=None):
         self.system_prompt = system_prompt
-        self.client = InferenceClient(api_key=HF_KEY)
-        self.model = model
-        self.temperature = temperature
-        self.top_p = top_p
-        self.seed = seed
-        self.max_new_tokens = max_new_tokens
-
-        # Start the conversation with the system prompt
-        self.messages = [
-            {
-                "role": "system",
-                "content": system_prompt
-            }
-        ]
-    
-    # Prompt the chat bot (both the prompt and response get added to message history)
-    def prompt(self, content):
-        self.add_to_prompt('user', content)
-        response = self.infer()
-        self.add_to_prompt('assistant', response)
-        return response
-
-    # Add a message to the prompt
-    def add_to_prompt(self, role, content):
-        self.messages.append({
-            "role": role,
-            "content": content
-        })
-
-    # Infer the response
-    def infer(self):
-        # Build kwargs for the inference client based on what was provided
-        call_kwargs = {
-            "model": self.model,
-            "messages": self.messages,
-            "max_tokens": self.max_new_tokens
-        }
-        if self.temperature is not None:
-            call_kwargs["temperature"] = self.temperature
-        if self.top_p is not None:
-            call_kwargs["top_p"] = self.top_p
-        if self.seed is not None:
-            call_kwargs["seed"] = self.seed
-
-        response = self.client.chat.completions.create(**call_kwargs)
+        self.cache = None
 
-        return response.choices[0].message.content
-    
-    def get_full_chat(self):
-        messages = []
-        for message in self.messages:
-            messages.append(f"{message['role']}: {message['content']}")
-        return messages
-
-# Class representing an LLM chat bot
-class Local_Bot():
-    def __init__(self, system_prompt, pipe, max_new_tokens=512, temperature = 0.01, top_p = 0, seed=None):
-        self.system_prompt = system_prompt
-        self.pipe = pipe
-        self.max_new_tokens = max_new_tokens
-        self.temperature = temperature
-        self.top_p = top_p
-        self.seed = seed
+        # Token budget for the conversation after the system prompt; older turns are summarized and removed when it is
+        # exceeded (see trim_history)
+        self.max_history_tokens = max_history_tokens
+        self.history_summary = []
 
         # Start the conversation with the system prompt
         self.messages = [
@@ -116,87 +215,59 @@ class Local_Bot():
                 "content": system_prompt
             }
         ]
-    
+
     # Prompt the chat bot (both the prompt and response get added to message history)
     def prompt(self, content):
         self.add_to_prompt('user', content)
-        response = self.infer()
+        self.trim_history()
+        with tracing.span('bot.prompt') as span:
+            start = time.perf_counter()
+            response = self.get_cached_response()
+            cached = response is not None
+            if response is None:
+                response = self.infer()
+                self.cache_response(response)
+            # Without streaming, the first token arrives with the whole response
+            self.trace_prompt(span, response, cached, time.perf_counter() - start)
         self.add_to_prompt('assistant', response)
         return response
 
-    # Add a message to the prompt
-    def add_to_prompt(self, role, content):
-        self.messages.append({
-            "role": role,
-            "content": content
-        })
-
-    # Infer the response locally using the provided inference logic
-    def infer(self):
-        # Prepare kwargs for the pipeline call
-        pipe_kwargs = {
-            "max_new_tokens": self.max_new_tokens,
-            "pad_token_id": self.pipe.tokenizer.eos_token_id,
-            "temperature": self.temperature,
-            "top_p": self.top_p,
-        }
-
-        # Decide whether to sample
-        do_sample = False
-        if (self.temperature is not None and self.temperature > 0) or (self.top_p is not None and self.top_p > 0):
-            do_sample = True
-
-        # If a seed is provided, create a torch.Generator for reproducible sampling
-        if self.seed is not None:
-            device = 'cuda' if torch.cuda.is_available() else 'cpu'
-            try:
-                gen = torch.Generator(device=device).manual_seed(int(self.seed))
-                outputs = self.pipe(self.messages, do_sample=do_sample, generator=gen, **pipe_kwargs)
-            except Exception:
-                # Fallback to CPU generator if CUDA generator creation fails
-                gen = torch.Generator(device='cpu').manual_seed(int(self.seed))
-                outputs = self.pipe(self.messages, do_sample=do_sample, generator=gen, **pipe_kwargs)
-        else:
-            outputs = self.pipe(self.messages, do_sample=do_sample, **pipe_kwargs)
-
-        response = outputs[0]["generated_text"][-1]
-        response_text = response['content']
-
-        return response_text
-    
-    def get_full_chat(self):
-        messages = []
-        for message in self.messages:
-            messages.append(f"{message['role']}: {message['content']}")
-        return messages
-    
-# Class representing an LLM chat bot
-class Deepseek_Bot():
-    def __init__(self, system_prompt, temperature=None, top_p=None, seed=None, max_new_tokens=2000):
-        self.system_prompt = system_prompt
-        self.client = client = InferenceClient(
-            provider="together",
-            api_key=HF_KEY
-        )
-        self.model = "deepseek-ai/DeepSeek-V3"
-        self.temperature = temperature
-        self.top_p = top_p
-        self.seed = seed
-        self.max_new_tokens = max_new_tokens
-        # Start the conversation with the system prompt
-        self.messages = [
-            {
-                "role": "system",
-                "content": system_prompt
-            }
-        ]
-    
-    # Prompt the chat bot (both the prompt and response get added to message history)
-    def prompt(self, content):
+    # Prompt the chat bot and stream the response as chunks of text. The consumer may stop early by closing the
+    # generator; the (partial) response is added to the message history once the stream ends.
+    def stream_prompt(self, content):
         self.add_to_prompt('user', content)
-        response = self.infer()
-        self.add_to_prompt('assistant', response)
-        return response
+        self.trim_history()
+        # The span is not entered: the generator may be resumed and closed from other contexts
+        span = tracing.span('bot.prompt', stream=True).start()
+        start = time.perf_counter()
+        response = self.get_cached_response()
+        if response is not None:
+            self.trace_prompt(span, response, True, time.perf_counter() - start)
+            span.finish()
+            self.add_to_prompt('assistant', response)
+            yield response
+            return
+
+        chunks = []
+        complete = False
+        time_to_first_token = None
+        stream = self.stream_infer()
+        try:
+            for chunk in stream:
+                if time_to_first_token is None:
+                    time_to_first_token = time.perf_counter() - start
+                chunks.append(chunk)
+                yield chunk
+            complete = True
+        finally:
+            stream.close()
+            response = ''.join(chunks)
+            # Only cache complete responses
+            if complete:
+                self.cache_response(response)
+            self.trace_prompt(span, response, False, time_to_first_token)
+            span.finish()
+            self.add_to_prompt('assistant', response)
 
     # Add a message to the prompt
     def add_to_prompt(self, role, content):
@@ -207,156 +278,104 @@ class Deepseek_Bot():
 
     # Infer the response
     def infer(self):
-        call_kwargs = {"model": self.model, "messages": self.messages, "max_tokens": self.max_new_tokens}
-        if self.temperature is not None:
-            call_kwargs["temperature"] = self.temperature
-        if self.top_p is not None:
-            call_kwargs["top_p"] = self.top_p
-        if self.seed is not None:
-            call_kwargs["seed"] = self.seed
-
-        response = self.client.chat.completions.create(**call_kwargs)
-
-        return response.choices[0].message.content
-    
-    def get_full_chat(self):
-        messages = []
-        for message in self.messages:
-            messages.append(f"{message['role']}: {message['content']}")
-        return messages
+        raise NotImplementedError
+
+    # Infer the response as a stream of text chunks. Backends without streaming support return it in one chunk.
+    def stream_infer(self):
+        yield self.infer()
+
+    # Return a new bot with the same settings and system prompt, but a fresh conversation. The new bot shares the
+    # inference client (or pipeline) and cache of this bot.
+    def fork(self):
+        bot = copy.copy(self)
+        bot.messages = [self.messages[0]]
+        bot.history_summary = []
+        return bot
+
+    # Estimate the number of tokens in a text (about 4 characters per token); local bots count with their tokenizer
+    def count_tokens(self, text):
+        return len(text) // 4 + 1
+
+    # Keep the conversation after the system prompt within max_history_tokens. The latest message is always kept;
+    # the oldest turns are removed and their answers are summarized in a short note after the system prompt.
+    def trim_history(self):
+        if self.max_history_tokens is None:
+            return
+
+        system, turns = self.messages[0], self.messages[1:]
+        if self.history_summary:
+            # Drop the previous summary note; it is rebuilt below
+            turns = turns[2:]
+
+        def build(summary, turns):
+            if not summary:
+                return [system] + turns
+            note = "Summary of earlier turns, removed to save context:\n" + "\n".join(f"- {line}" for line in summary)
+            return [system, {"role": "user", "content": note}, {"role": "assistant", "content": "Understood."}] + turns
+
+        def size(messages):
+            return sum(self.count_tokens(message['content']) for message in messages)
+
+        summary = list(self.history_summary)
+        trimmed = False
+        while len(turns) > 1 and (size(build(summary, turns)[1:]) > self.max_history_tokens or turns[0]['role'] != 'user'):
+            message = turns.pop(0)
+            trimmed = True
+            if message['role'] == 'assistant':
+                answer = ' '.join(message['content'].split())
+                summary.append(f"Earlier answer: {answer[:200]}{'...' if len(answer) > 200 else ''}")
+                # Only keep the most recent answers in the summary
+                summary = summary[-5:]
+
+        # If the summary alone is too large, drop its oldest lines
+        while summary and size(build(summary, turns)[1:]) > self.max_history_tokens:
+            summary.pop(0)
+            trimmed = True
+
+        if trimmed:
+            self.history_summary = summary
+            self.messages = build(summary, turns)
+
+    # Add the provider, model, token counts and time to first token to a bot.prompt span (see utils.tracing)
+    def trace_prompt(self, span, response, cached, time_to_first_token):
+        if span is tracing.NULL_SPAN:
+            return
+        # Token counts of count_tokens, not the usage reported by the provider: an estimate for all but the local bots
+        span.set(provider=self.get_provider(), model=self.get_model_id(), cached=cached, time_to_first_token=time_to_first_token,
+                 estimated_prompt_tokens=sum(self.count_tokens(message['content']) for message in self.messages),
+                 estimated_completion_tokens=self.count_tokens(response))
+
+    # Name of the inference provider (the class name for bots without one)
+    def get_provider(self):
+        return getattr(self, 'provider', None) or type(self).__name__
+
+    # Identifier of the model, used in the response cache key
+    def get_model_id(self):
+        return getattr(self, 'model', None)
+
+    # Sampling parameters, used in the response cache key
+    def get_sampling_params(self):
+        return {
+            "max_new_tokens": getattr(self, 'max_new_tokens', None),
+            "temperature": getattr(self, 'temperature', None),
+            "top_p": getattr(self, 'top_p', None),
+            "seed": getattr(self, 'seed', None),
+        }
 
-# Class representing an LLM chat bot
-class DeepseekDirect_Bot():
-    def __init__(self, system_prompt, temperature=None, top_p=None, seed=None, max_new_tokens=2000):
-        self.system_prompt = system_prompt
-        self.client = client = InferenceClient(
-            provider="together",
-            api_key=HF_KEY
-        )
-        self.model = "deepseek-ai/DeepSeek-R1"
-        self.temperature = temperature
-        self.top_p = top_p
-        self.seed = seed
-        self.max_new_tokens = max_new_tokens
-        # Start the conversation with the system prompt
-        self.messages = [
-            {
-                "role": "system",
-                "content": system_prompt
-            }
-        ]
-    
-    # Prompt the chat bot (both the prompt and response get added to message history)
-    def prompt(self, content):
-        self.add_to_prompt('user', content)
-        response = self.infer()
-        self.add_to_prompt('assistant', response)
-        return response
+    # Look up the response to the current messages in the response cache (None if not cached or no cache is used)
+    def get_cached_response(self):
+        if self.cache is None:
+            return None
+        return self.cache.get(Response_Cache.make_key(self.get_model_id(), self.messages, self.get_sampling_params()))
 
-    # Add a message to the prompt
-    def add_to_prompt(self, role, content):
-        self.messages.append({
-            "role": role,
-            "content": content
-        })
+    # Store the response to the current messages in the response cache
+    def cache_response(self, response):
+        if self.cache is None:
+            return
+        self.cache.put(Response_Cache.make_key(self.get_model_id(), self.messages, self.get_sampling_params()), response, model=self.get_model_id())
 
-    # Infer the response
-    def infer(self):
-        call_kwargs = {"model": self.model, "messages": self.messages, "max_tokens": self.max_new_tokens}
-        if self.temperature is not None:
-            call_kwargs["temperature"] = self.temperature
-        if self.top_p is not None:
-            call_kwargs["top_p"] = self.top_p
-        if self.seed is not None:
-            call_kwargs["seed"] = self.seed
-
-        response = self.client.chat.completions.create(**call_kwargs)
-
-        return response.choices[0].message.content
-    
     def get_full_chat(self):
         messages = []
         for message in self.messages:
             messages.append(f"{message['role']}: {message['content']}")
         return messages
-
-
-# Function to load model and tokenizer
-# Models are loaded from the ./local_models folder if they are already downloaded
-# Models are downloaded and saved in the ./local_models folder if they are not already downloaded
-def load_pipe(model_checkpoint="meta-llama/Meta-Llama-3-8B-Instruct", local_dir="./local_models", quantization_config=None, save=False):
-    if model_checkpoint == None:
-        return None
-
-    # If HF_KEY is present, set HUGGINGFACE_HUB_TOKEN so transformers/huggingface_hub can authenticate
-    if HF_KEY:
-        os.environ.setdefault('HUGGINGFACE_HUB_TOKEN', HF_KEY)
-    
-    torch.cuda.empty_cache()
-
-    # prefer float16 on CUDA devices (works on most NVIDIA consumer GPUs); otherwise keep bfloat16
-    dtype = torch.bfloat16
-    if torch.cuda.is_available():
-        dtype = torch.float16
-
-    # Check if the model and tokenizer are already stored locally
-    model_directory = local_dir + '/' + model_checkpoint
-    if not os.path.exists(model_directory):
-        print('downloading model...')
-        # Download and save the model and tokenizer locally
-        tokenizer = AutoTokenizer.from_pretrained(model_checkpoint)
-
-        # Load model with correct qunatization settings
-        if quantization_config == '8bit':
-            quantization_config = BitsAndBytesConfig(load_in_8bit=True)
-            model = AutoModelForCausalLM.from_pretrained(model_checkpoint, device_map="auto", trust_remote_code=True, quantization_config=quantization_config)
-        
-        elif quantization_config == '4bit':
-            quantization_config = BitsAndBytesConfig(load_in_4bit=True, bnb_4bit_compute_dtype=torch.float16)
-            model = AutoModelForCausalLM.from_pretrained(model_checkpoint, device_map="auto", trust_remote_code=True, quantization_config=quantization_config)
-        
-        else:
-            # use the chosen dtype variable for consistency
-            model = AutoModelForCausalLM.from_pretrained(model_checkpoint, device_map="auto", torch_dtype=dtype)
-        
-        # Save model and tokenizer locally
-        if save:
-            print('saving model...')
-            # Save them locally for future use
-            tokenizer.save_pretrained(model_directory)
-            model.save_pretrained(model_directory)
-
-        # Load the model and tokenizer
-        print('loading model...')
-        pipe = pipeline(
-            "text-generation",
-            model=model,
-            tokenizer=tokenizer,
-            model_kwargs={"dtype": torch.bfloat16},
-            device_map="auto",
-            )
-    else:
-
-        # Load the model and tokenizer
-        print('loading model...')
-        pipe = pipeline(
-            "text-generation",
-            model=model_directory,
-            model_kwargs={"dtype": torch.bfloat16},
-            device_map="auto",
-            )
-
-    return pipe
-
-# Function to load model and tokenizer locally
-def load_from_snellius(directory):
-
-    print(f'Loading model from {directory}...')
-    pipe = pipeline(
-        "text-generation",
-        model=directory,
-        model_kwargs={"dtype": torch.bfloat16},
-        device_map="auto",
-        )
-
-    return pipe
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+# Persistent, content-addressed cache of LLM responses, stored in SQLite.
+# Safe to use from several threads (one connection per thread) and several processes (SQLite WAL mode with a busy
+# timeout). When the stored responses exceed max_size_bytes, the least recently used responses are evicted.
+class Response_Cache():
+    def __init__(self, path='llm_cache/responses.sqlite', max_size_bytes=512 * 1024 * 1024):
+        self.path = os.path.abspath(path)
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+
+        connection = self._connection()
+        with connection:
+            connection.execute('''CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )''')
+            connection.execute('CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)')
+
+    # Each thread gets its own connection, as SQLite connections can not be shared between threads
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def make_key(model, messages, sampling_params):
+        """Return the cache key for a model, the full message list and the sampling parameters."""
+        payload = json.dumps({'model': model, 'messages': messages, 'sampling_params': sampling_params}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the cached response for a key, or None if it is not cached."""
+        connection = self._connection()
+        row = connection.execute('SELECT response FROM responses WHERE key = ?', (key,)).fetchone()
+
+        with self._stats_lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if row is None:
+            return None
+
+        # Mark the response as recently used
+        with connection:
+            connection.execute('UPDATE responses SET last_access = ? WHERE key = ?', (time.time(), key))
+        return row[0]
+
+    def put(self, key, response, model=None):
+        """Store a response under a key and evict the least recently used responses if the cache is too large."""
+        if response is None:
+            return
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        connection = self._connection()
+        with connection:
+            connection.execute('INSERT OR REPLACE INTO responses (key, model, response, size, created, last_access) VALUES (?, ?, ?, ?, ?, ?)',
+                               (key, model, response, size, now, now))
+        self.evict()
+
+    def evict(self):
+        """Evict the least recently used responses until the cache is at most max_size_bytes."""
+        if self.max_size_bytes is None:
+            return
+        connection = self._connection()
+        with connection:
+            total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+            if total <= self.max_size_bytes:
+                return
+
+            # Walk from least to most recently used and delete until we are below the limit
+            to_delete = []
+            for key, size in connection.execute('SELECT key, size FROM responses ORDER BY last_access ASC'):
+                if total <= self.max_size_bytes:
+                    break
+                to_delete.append((key,))
+                total -= size
+            connection.executemany('DELETE FROM responses WHERE key = ?', to_delete)
+
+    def clear(self):
+        """Remove all cached responses."""
+        connection = self._connection()
+        with connection:
+            connection.execute('DELETE FROM responses')
+
+    def stats(self):
+        """Return the hit/miss counters of this process together with the size of the cache on disk."""
+        connection = self._connection()
+        entries, size = connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'size_bytes': size,
+        }
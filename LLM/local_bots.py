@@ -0,0 +1,494 @@
+# Local bots, running a transformers pipeline on this machine.
+# This module is imported by LLM.bots on first use, so torch and transformers are only imported when a local model is used.
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline, BitsAndBytesConfig, DynamicCache, TextIteratorStreamer, StoppingCriteria, StoppingCriteriaList, LogitsProcessor, LogitsProcessorList, TemperatureLogitsWarper, TopKLogitsWarper, TopPLogitsWarper
+from LLM import bots
+from LLM.bots import Chat_Bot, get_hf_key
+from LLM.asp_grammar import ASP_Grammar_Logits_Processor
+
+HF_KEY = get_hf_key()
+
+# Shared KV caches of system-prompt prefixes, per (model, system prompt), see bots.enable_prefix_cache
+_prefix_kv_caches = OrderedDict()
+_prefix_kv_lock = threading.Lock()
+
+
+def clear_prefix_kv_caches():
+    """Free the shared prefix KV caches."""
+    with _prefix_kv_lock:
+        _prefix_kv_caches.clear()
+
+
+def common_prefix_length(a, b):
+    """Return the length of the common prefix of two token id lists."""
+    if not a or not b:
+        return 0
+    n = min(len(a), len(b))
+    for i in range(n):
+        if a[i] != b[i]:
+            return i
+    return n
+
+
+def encode_chat(tokenizer, messages, add_generation_prompt=True):
+    """Return the token ids (a 1 x n tensor) of a conversation, rendered with the chat template of the tokenizer."""
+    return tokenizer.apply_chat_template(messages, add_generation_prompt=add_generation_prompt, return_tensors='pt', return_dict=True)['input_ids']
+
+
+def get_prefix_kv_cache(pipe, system_prompt):
+    """Return the token ids and KV cache of a system prompt, encoding it only the first time it is used.
+
+    The returned cache is shared: copy it before passing it to generate, as generate extends it in place.
+    """
+    key = (id(pipe.model), system_prompt)
+    with _prefix_kv_lock:
+        if key in _prefix_kv_caches:
+            _prefix_kv_caches.move_to_end(key)
+            return _prefix_kv_caches[key]
+
+    prefix_ids = encode_chat(pipe.tokenizer, [{"role": "system", "content": system_prompt}], add_generation_prompt=False).to(pipe.model.device)
+    with torch.no_grad():
+        prefix_kv = pipe.model(prefix_ids, past_key_values=DynamicCache(), use_cache=True).past_key_values
+
+    with _prefix_kv_lock:
+        _prefix_kv_caches[key] = (prefix_ids[0].tolist(), prefix_kv)
+        while len(_prefix_kv_caches) > bots.PREFIX_CACHE_SIZE:
+            _prefix_kv_caches.popitem(last=False)
+        return _prefix_kv_caches[key]
+
+
+# Stopping criterion that ends generation as soon as an event is set (e.g. when a streamed response is no longer read)
+class Stop_Event_Criteria(StoppingCriteria):
+    def __init__(self, event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+
+# Logits processor sampling the next token with its own torch.Generator, so a seeded generation is reproducible while
+# other generations run concurrently (generate samples from the process-wide RNG and does not take a generator). It
+# applies the temperature, top_k and top_p warpers of sampling and masks every other token, so the generation must use
+# greedy decoding (see seeded_sampling_kwargs).
+class Seeded_Sampler(LogitsProcessor):
+    def __init__(self, seed, temperature=None, top_p=None, top_k=None):
+        self.seed = int(seed)
+        self.generator = None
+        self.warpers = LogitsProcessorList()
+        if temperature is not None and temperature > 0 and temperature != 1.0:
+            self.warpers.append(TemperatureLogitsWarper(float(temperature)))
+        if top_k:
+            self.warpers.append(TopKLogitsWarper(top_k=top_k))
+        if top_p is not None and top_p < 1.0:
+            self.warpers.append(TopPLogitsWarper(top_p=float(top_p)))
+
+    def __call__(self, input_ids, scores):
+        if self.generator is None:
+            self.generator = torch.Generator(device=scores.device).manual_seed(self.seed)
+        probs = torch.softmax(self.warpers(input_ids, scores).float(), dim=-1)
+        next_tokens = torch.multinomial(probs, num_samples=1, generator=self.generator)
+        return torch.full_like(scores, float('-inf')).scatter(1, next_tokens, 0.0)
+
+
+def asp_grammar_logits_processor(pipe):
+    """Return a new ASP grammar logits processor (see LLM.asp_grammar) for one generate call of a pipeline."""
+    eos_token_ids = getattr(getattr(pipe.model, 'generation_config', None), 'eos_token_id', None)
+    if eos_token_ids is None or isinstance(eos_token_ids, int):
+        eos_token_ids = [eos_token_ids]
+    eos_token_ids = [token_id for token_id in set(eos_token_ids) | {pipe.tokenizer.eos_token_id} if token_id is not None]
+    return ASP_Grammar_Logits_Processor(pipe.tokenizer, eos_token_ids=eos_token_ids, top_k=bots.ASP_GRAMMAR_TOP_K)
+
+
+def seeded_sampling_kwargs(model, generate_kwargs, seed):
+    """Return generate kwargs that sample with a Seeded_Sampler of the seed instead of the process-wide RNG.
+
+    Kwargs without sampling (do_sample False) or without a seed are returned unchanged.
+    """
+    if seed is None or not generate_kwargs.get('do_sample'):
+        return generate_kwargs
+    top_k = getattr(getattr(model, 'generation_config', None), 'top_k', None)
+    sampler = Seeded_Sampler(seed, temperature=generate_kwargs.get('temperature'), top_p=generate_kwargs.get('top_p'), top_k=top_k)
+    # The sampler runs after the other logits processors (e.g. the ASP grammar)
+    logits_processor = LogitsProcessorList(list(generate_kwargs.get('logits_processor', [])) + [sampler])
+    return {**generate_kwargs, 'do_sample': False, 'temperature': None, 'top_p': None, 'top_k': None, 'logits_processor': logits_processor}
+
+
+# Class representing an LLM chat bot
+class Local_Bot(Chat_Bot):
+    def __init__(self, system_prompt, pipe, max_new_tokens=512, temperature = 0.01, top_p = 0, seed=None, prefix_cache=None, asp_grammar=None):
+        super().__init__(system_prompt)
+        self.pipe = pipe
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.top_p = top_p
+        self.seed = seed
+
+        # Reuse KV caches of already encoded prefixes (see enable_prefix_cache)
+        self.prefix_cache = bots.PREFIX_CACHE_ENABLED if prefix_cache is None else prefix_cache
+        # Token ids and KV cache of this bot's conversation so far, so a follow-up prompt only prefills its new turn
+        self.conversation_ids = None
+        self.conversation_kv = None
+
+        # Restrict decoding to ASP syntax (see enable_asp_grammar)
+        self.asp_grammar = bots.ASP_GRAMMAR_ENABLED if asp_grammar is None else asp_grammar
+
+    # Fork the bot without the KV cache of this bot's conversation
+    def fork(self):
+        bot = super().fork()
+        bot.conversation_ids = None
+        bot.conversation_kv = None
+        return bot
+
+    # Count the tokens in a text with the tokenizer of the pipeline
+    def count_tokens(self, text):
+        return len(self.pipe.tokenizer.encode(text, add_special_tokens=False))
+
+    # Identifier of the local model, used in the response cache key
+    def get_model_id(self):
+        model = getattr(self.pipe, 'model', None)
+        return getattr(model, 'name_or_path', None) or getattr(getattr(model, 'config', None), '_name_or_path', None)
+
+    # Sampling parameters, used in the response cache key. Grammar-constrained responses are cached separately.
+    def get_sampling_params(self):
+        params = super().get_sampling_params()
+        if self.asp_grammar:
+            params["asp_grammar"] = True
+        return params
+
+    # Generation kwargs adding the ASP grammar logits processor, if enabled
+    def get_grammar_kwargs(self):
+        if not self.asp_grammar:
+            return {}
+        return {"logits_processor": LogitsProcessorList([asp_grammar_logits_processor(self.pipe)])}
+
+    # Infer the response locally using the provided inference logic
+    def infer(self):
+        # Batched pipelines collect the prompts of concurrently running bots and generate them together
+        if isinstance(self.pipe, Batched_Pipe):
+            return self.pipe.submit(self.messages, max_new_tokens=self.max_new_tokens, temperature=self.temperature, top_p=self.top_p, seed=self.seed, asp_grammar=self.asp_grammar).result()
+
+        if self.prefix_cache:
+            return self.infer_with_prefix_cache()
+
+        outputs = self.run_pipe()
+
+        response = outputs[0]["generated_text"][-1]
+        response_text = response['content']
+
+        return response_text
+
+    # Infer the response as a stream of text chunks, using a TextIteratorStreamer. When the consumer stops reading
+    # early, generation is stopped as well.
+    def stream_infer(self):
+        # Batched pipelines can not stream; the response is returned in one chunk
+        if isinstance(self.pipe, Batched_Pipe):
+            yield self.infer()
+            return
+
+        streamer = TextIteratorStreamer(self.pipe.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        stopped = threading.Event()
+        errors = []
+
+        def generate():
+            try:
+                self.run_pipe(streamer=streamer, stopping_criteria=StoppingCriteriaList([Stop_Event_Criteria(stopped)]))
+            except Exception as e:
+                errors.append(e)
+                # Unblock the consumer
+                streamer.end()
+
+        thread = threading.Thread(target=generate, daemon=True)
+        thread.start()
+        try:
+            for text in streamer:
+                if text:
+                    yield text
+        finally:
+            stopped.set()
+            thread.join()
+        if errors:
+            raise errors[0]
+
+    # Call the pipeline on the conversation with the sampling settings of this bot
+    def run_pipe(self, **extra_kwargs):
+        # Prepare kwargs for the pipeline call
+        pipe_kwargs = {
+            "max_new_tokens": self.max_new_tokens,
+            "pad_token_id": self.pipe.tokenizer.eos_token_id,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            **self.get_grammar_kwargs(),
+            **extra_kwargs
+        }
+
+        # Decide whether to sample
+        do_sample = False
+        if (self.temperature is not None and self.temperature > 0) or (self.top_p is not None and self.top_p > 0):
+            do_sample = True
+
+        # If a seed is provided, create a torch.Generator for reproducible sampling
+        if self.seed is not None:
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
+            try:
+                gen = torch.Generator(device=device).manual_seed(int(self.seed))
+                outputs = self.pipe(self.messages, do_sample=do_sample, generator=gen, **pipe_kwargs)
+            except Exception:
+                # Fallback to CPU generator if CUDA generator creation fails
+                gen = torch.Generator(device='cpu').manual_seed(int(self.seed))
+                outputs = self.pipe(self.messages, do_sample=do_sample, generator=gen, **pipe_kwargs)
+        else:
+            outputs = self.pipe(self.messages, do_sample=do_sample, **pipe_kwargs)
+
+        return outputs
+
+    # Infer the response by calling generate directly, only prefilling the tokens that are not covered by a cached
+    # prefix: either this bot's previous turns or the (shared) system prompt of the conversation.
+    def infer_with_prefix_cache(self):
+        model = self.pipe.model
+        tokenizer = self.pipe.tokenizer
+        input_ids = encode_chat(tokenizer, self.messages, add_generation_prompt=True).to(model.device)
+        ids = input_ids[0].tolist()
+
+        # Pick the cached prefix that covers most of the input. At least one token must be left to prefill.
+        past_key_values = None
+        own_length = common_prefix_length(self.conversation_ids, ids) if self.conversation_kv is not None else 0
+        prefix_ids, prefix_kv = get_prefix_kv_cache(self.pipe, self.system_prompt)
+        shared_length = common_prefix_length(prefix_ids, ids)
+        if own_length >= shared_length and own_length > 0:
+            past_key_values, reused = self.conversation_kv, min(own_length, len(ids) - 1)
+        elif shared_length > 0:
+            past_key_values, reused = copy.deepcopy(prefix_kv), min(shared_length, len(ids) - 1)
+        if past_key_values is not None and past_key_values.get_seq_length() > reused:
+            # Drop the cached tokens that differ from (or are not part of the prefix of) the new input
+            past_key_values.crop(reused - past_key_values.get_seq_length())
+
+        do_sample = (self.temperature is not None and self.temperature > 0) or (self.top_p is not None and self.top_p > 0)
+        generate_kwargs = {
+            "max_new_tokens": self.max_new_tokens,
+            "pad_token_id": tokenizer.eos_token_id,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "do_sample": do_sample,
+            "return_dict_in_generate": True,
+            **self.get_grammar_kwargs()
+        }
+        # Sample with a generator of this call: concurrent bots (e.g. constraints generated in parallel) would
+        # interleave their draws from the process-wide RNG
+        generate_kwargs = seeded_sampling_kwargs(model, generate_kwargs, self.seed)
+
+        with torch.no_grad():
+            outputs = model.generate(
+                input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                past_key_values=past_key_values if past_key_values is not None else DynamicCache(),
+                **generate_kwargs
+            )
+
+        # Keep the cache of the whole conversation (including the response) for the next prompt of this bot
+        sequence = outputs.sequences[0]
+        self.conversation_kv = outputs.past_key_values
+        self.conversation_ids = sequence[:self.conversation_kv.get_seq_length()].tolist()
+
+        return tokenizer.decode(sequence[input_ids.shape[1]:], skip_special_tokens=True)
+
+def generate_batch(pipe, conversations, batch_size=8, max_new_tokens=512, temperature=0.01, top_p=0, seed=None, asp_grammar=False):
+    """Generate responses for many independent conversations with a local pipeline, in padded batches.
+
+    The conversations are sorted by token length before batching, so conversations of similar length share a batch
+    and little compute is spent on padding.
+
+    Args:
+        pipe: a local text-generation pipeline
+        conversations (list): a list of message lists (as in Chat_Bot.messages)
+        batch_size (int): maximum number of conversations per batch
+        max_new_tokens (int): max tokens for generation
+        temperature (float|None): sampling temperature
+        top_p (float|None): nucleus sampling parameter
+        seed (int|None): optional seed for reproducible sampling
+        asp_grammar (bool): restrict decoding to ASP syntax (see bots.enable_asp_grammar)
+
+    Returns:
+        list: the response texts, in the same order as the conversations
+    """
+    if not conversations:
+        return []
+
+    tokenizer = pipe.tokenizer
+    # Decoder-only models need left padding, so every prompt ends right where generation starts. The tokenizer is
+    # shared with the other users of the pipeline, so its settings are restored afterwards.
+    padding_side, pad_token = tokenizer.padding_side, tokenizer.pad_token
+    tokenizer.padding_side = 'left'
+    if tokenizer.pad_token_id is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    try:
+        lengths = [encode_chat(tokenizer, conversation).shape[1] for conversation in conversations]
+        order = sorted(range(len(conversations)), key=lambda i: lengths[i], reverse=True)
+
+        do_sample = (temperature is not None and temperature > 0) or (top_p is not None and top_p > 0)
+
+        responses = [None] * len(conversations)
+        for start in range(0, len(order), batch_size):
+            indices = order[start:start + batch_size]
+            generate_kwargs = {
+                "do_sample": do_sample,
+                "max_new_tokens": max_new_tokens,
+                "pad_token_id": tokenizer.pad_token_id,
+                "temperature": temperature,
+                "top_p": top_p
+            }
+            if asp_grammar:
+                # The grammar keeps a state per row of the batch, so every batch gets its own processor
+                generate_kwargs["logits_processor"] = LogitsProcessorList([asp_grammar_logits_processor(pipe)])
+            # Sample with a generator of this call instead of reseeding the process-wide RNG
+            outputs = pipe([conversations[i] for i in indices], batch_size=len(indices), **seeded_sampling_kwargs(pipe.model, generate_kwargs, seed))
+            for i, output in zip(indices, outputs):
+                responses[i] = output[0]["generated_text"][-1]['content']
+    finally:
+        tokenizer.padding_side = padding_side
+        tokenizer.pad_token = pad_token
+
+    return responses
+
+
+# Wrapper around a local pipeline that batches the prompts of bots running in different threads (e.g. the constraint
+# generations and repair loops of full_ASP_program with max_workers > 1). A background thread waits up to max_wait
+# seconds for more prompts to arrive, and then generates all waiting prompts with the same sampling params together.
+class Batched_Pipe():
+    def __init__(self, pipe, max_batch_size=8, max_wait=0.05):
+        self.pipe = pipe
+        self.tokenizer = pipe.tokenizer
+        self.model = pipe.model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._pending = []
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='batched-pipe', daemon=True)
+        self._thread.start()
+
+    # Use the wrapped pipeline directly
+    def __call__(self, *args, **kwargs):
+        return self.pipe(*args, **kwargs)
+
+    # Queue a conversation for generation. Returns a Future with the response text.
+    def submit(self, messages, max_new_tokens=512, temperature=0.01, top_p=0, seed=None, asp_grammar=False):
+        future = Future()
+        sampling_params = (max_new_tokens, temperature, top_p, seed, asp_grammar)
+        with self._condition:
+            self._pending.append((list(messages), sampling_params, future))
+            self._condition.notify()
+        return future
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                # Give other threads a moment to submit their prompts, unless the batch is already full
+                deadline = time.monotonic() + self.max_wait
+                while len(self._pending) < self.max_batch_size and time.monotonic() < deadline:
+                    self._condition.wait(deadline - time.monotonic())
+                requests, self._pending = self._pending, []
+
+            # Only conversations with the same sampling params can share a batch
+            groups = {}
+            for request in requests:
+                groups.setdefault(request[1], []).append(request)
+
+            for (max_new_tokens, temperature, top_p, seed, asp_grammar), group in groups.items():
+                try:
+                    responses = generate_batch(self.pipe, [messages for messages, _, _ in group], batch_size=self.max_batch_size,
+                                               max_new_tokens=max_new_tokens, temperature=temperature, top_p=top_p, seed=seed,
+                                               asp_grammar=asp_grammar)
+                except Exception as e:
+                    for _, _, future in group:
+                        future.set_exception(e)
+                    continue
+                for (_, _, future), response in zip(group, responses):
+                    future.set_result(response)
+
+# Function to load model and tokenizer
+# Models are loaded from the ./local_models folder if they are already downloaded
+# Models are downloaded and saved in the ./local_models folder if they are not already downloaded
+def load_pipe(model_checkpoint="meta-llama/Meta-Llama-3-8B-Instruct", local_dir="./local_models", quantization_config=None, save=False):
+    if model_checkpoint == None:
+        return None
+
+    # If HF_KEY is present, set HUGGINGFACE_HUB_TOKEN so transformers/huggingface_hub can authenticate
+    if HF_KEY:
+        os.environ.setdefault('HUGGINGFACE_HUB_TOKEN', HF_KEY)
+    
+    torch.cuda.empty_cache()
+
+    # prefer float16 on CUDA devices (works on most NVIDIA consumer GPUs); otherwise keep bfloat16
+    dtype = torch.bfloat16
+    if torch.cuda.is_available():
+        dtype = torch.float16
+
+    # Check if the model and tokenizer are already stored locally
+    model_directory = local_dir + '/' + model_checkpoint
+    if not os.path.exists(model_directory):
+        print('downloading model...')
+        # Download and save the model and tokenizer locally
+        tokenizer = AutoTokenizer.from_pretrained(model_checkpoint)
+
+        # Load model with correct qunatization settings
+        if quantization_config == '8bit':
+            quantization_config = BitsAndBytesConfig(load_in_8bit=True)
+            model = AutoModelForCausalLM.from_pretrained(model_checkpoint, device_map="auto", trust_remote_code=True, quantization_config=quantization_config)
+        
+        elif quantization_config == '4bit':
+            quantization_config = BitsAndBytesConfig(load_in_4bit=True, bnb_4bit_compute_dtype=torch.float16)
+            model = AutoModelForCausalLM.from_pretrained(model_checkpoint, device_map="auto", trust_remote_code=True, quantization_config=quantization_config)
+        
+        else:
+            # use the chosen dtype variable for consistency
+            model = AutoModelForCausalLM.from_pretrained(model_checkpoint, device_map="auto", torch_dtype=dtype)
+        
+        # Save model and tokenizer locally
+        if save:
+            print('saving model...')
+            # Save them locally for future use
+            tokenizer.save_pretrained(model_directory)
+            model.save_pretrained(model_directory)
+
+        # Load the model and tokenizer
+        print('loading model...')
+        pipe = pipeline(
+            "text-generation",
+            model=model,
+            tokenizer=tokenizer,
+            model_kwargs={"dtype": torch.bfloat16},
+            device_map="auto",
+            )
+    else:
+
+        # Load the model and tokenizer
+        print('loading model...')
+        pipe = pipeline(
+            "text-generation",
+            model=model_directory,
+            model_kwargs={"dtype": torch.bfloat16},
+            device_map="auto",
+            )
+
+    return pipe
+
+# Function to load model and tokenizer locally
+def load_from_snellius(directory):
+
+    print(f'Loading model from {directory}...')
+    pipe = pipeline(
+        "text-generation",
+        model=directory,
+        model_kwargs={"dtype": torch.bfloat16},
+        device_map="auto",
+        )
+
+    return pipe
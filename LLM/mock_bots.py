@@ -0,0 +1,289 @@
+# Offline mock bots, replaying recorded responses with simulated latency and provider errors. They make it possible to
+# benchmark the scheduling, caching and concurrency of the pipeline on one machine, without network access or a GPU
+# (see ASP_Scheduler/benchmark.py). This module is imported by LLM.bots on first use.
+import asyncio
+import glob
+import json
+import os
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from LLM.bots import Chat_Bot
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Settings of the simulated provider. Use configure_mock_backend to change them.
+MOCK_BACKEND = {
+    # Folder with .lp programs to replay (as written by the scheduler notebook), or None
+    'results_dir': os.path.join(REPO_ROOT, 'Results'),
+    # JSONL file with {"prompt": ..., "response": ...} lines to replay, or None
+    'transcript': None,
+    # Problem descriptions (e.g. all_problems), used to find the instance template and generator of each .lp program
+    'problems': None,
+    # Latency: time to first token plus the time to generate each further token
+    'time_to_first_token': 0.5,
+    'tokens_per_second': 50.0,
+    # Fraction of requests failing with a 500 and with a 429 (too many requests) response
+    'error_rate': 0.0,
+    'rate_limit_rate': 0.0,
+    # Retry-After (in seconds) sent with a 429 response, or None
+    'retry_after': None,
+    # Seed of the simulated errors
+    'seed': 0,
+}
+
+_responses = None
+_responses_lock = threading.Lock()
+_random = random.Random(MOCK_BACKEND['seed'])
+_random_lock = threading.Lock()
+_stats = {'requests': 0, 'errors': 0, 'rate_limited': 0, 'replayed': 0, 'unmatched': 0, 'simulated_seconds': 0.0}
+_stats_lock = threading.Lock()
+
+
+def configure_mock_backend(**settings):
+    """Change the settings of the mock backend (see MOCK_BACKEND for the available settings).
+
+    Changing the replay sources reloads the recorded responses on the next request.
+    """
+    global _responses, _random
+    for name, value in settings.items():
+        if name not in MOCK_BACKEND:
+            raise ValueError(f"Unknown mock backend setting: {name}")
+        MOCK_BACKEND[name] = value
+    with _responses_lock:
+        if {'results_dir', 'transcript', 'problems'} & set(settings):
+            _responses = None
+    if 'seed' in settings:
+        with _random_lock:
+            _random = random.Random(MOCK_BACKEND['seed'])
+
+
+def mock_backend_stats():
+    """Return the number of requests, simulated errors and replayed responses, and the total simulated latency."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_mock_backend_stats():
+    """Reset the counters returned by mock_backend_stats."""
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def get_mock_responses():
+    """Return the recorded responses, loading them from the configured sources on first use."""
+    global _responses
+    with _responses_lock:
+        if _responses is None:
+            responses = Mock_Responses()
+            if MOCK_BACKEND['results_dir'] is not None:
+                responses.load_results(MOCK_BACKEND['results_dir'], problems=MOCK_BACKEND['problems'])
+            if MOCK_BACKEND['transcript'] is not None:
+                responses.load_transcript(MOCK_BACKEND['transcript'])
+            _responses = responses
+        return _responses
+
+
+# Error of the simulated provider, carrying its HTTP status like the errors of the inference clients
+class Mock_API_Error(Exception):
+    def __init__(self, status, message, retry_after=None):
+        super().__init__(f"{status} {message}")
+        self.status = status
+        self.headers = {'Retry-After': str(retry_after)} if retry_after is not None else {}
+
+
+# Recorded responses, looked up by prompt
+class Mock_Responses():
+    def __init__(self):
+        self.responses = {}
+
+    @staticmethod
+    def normalize(text):
+        return ' '.join(text.split())
+
+    # Constraint prompts are bullet points, of which only the first line is kept as comment in the .lp programs
+    @staticmethod
+    def first_line_key(text):
+        for line in text.splitlines():
+            if line.strip():
+                return Mock_Responses.normalize(re.sub(r'^\s*-\s*', '', line))
+        return ''
+
+    def add(self, prompt, response):
+        self.responses.setdefault(self.normalize(prompt), []).append(response)
+
+    def load_transcript(self, path):
+        """Add the prompts and responses of a JSONL transcript with {"prompt": ..., "response": ...} lines."""
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                if line.strip():
+                    record = json.loads(line)
+                    self.add(record['prompt'], record['response'])
+
+    def load_results(self, results_dir, problems=None):
+        """Add the partial programs of all .lp programs in a folder.
+
+        Constraints are found by the description comment above them. The instance template and generator are only
+        added when the problem descriptions are given, as the programs do not contain their prompts.
+        """
+        for path in sorted(glob.glob(os.path.join(results_dir, '*.lp'))):
+            with open(path, 'r', encoding='utf-8') as file:
+                sections = self.split_program(file.read())
+
+            problem = None
+            if problems is not None:
+                name = os.path.basename(path)
+                matches = [key for key in problems if name.startswith(key + '_')]
+                problem = problems[max(matches, key=len)] if matches else None
+
+            if problem is not None:
+                self.add(problem['instance_description'], sections['instance'])
+                self.add(problem['generator_description'], sections['generator'])
+            for description, constraint in sections['constraints']:
+                self.add(description, constraint)
+
+    @staticmethod
+    def split_program(program):
+        """Split a full program into its instance template, generator and (description, constraint) pairs."""
+        sections = {'instance': [], 'generator': [], 'constraints': []}
+        part = 'instance'
+        for line in program.splitlines():
+            header = line.strip()
+            if header == '% Generator':
+                part = 'generator'
+            elif header in ('% Hard Constraints', '% Soft Constraints'):
+                part = 'constraints'
+            elif header == '% Objective function':
+                break
+            elif part == 'constraints' and header.startswith('% '):
+                # The constraint code has no comments of its own, so every comment starts a new constraint
+                sections['constraints'].append((header[2:], []))
+            elif part == 'constraints':
+                if sections['constraints']:
+                    sections['constraints'][-1][1].append(line)
+            else:
+                sections[part].append(line)
+
+        return {
+            'instance': '\n'.join(sections['instance']).strip() + '\n',
+            'generator': '\n'.join(sections['generator']).strip() + '\n',
+            'constraints': [(description, '\n'.join(lines).strip() + '\n') for description, lines in sections['constraints']],
+        }
+
+    def lookup(self, messages, seed=None):
+        """Return the response to a conversation: a recorded one if the prompt was recorded, otherwise a stand-in."""
+        prompt = messages[-1]['content']
+
+        # Repair prompts are answered with the erroneous code, so every broken block uses all its repair attempts
+        match = re.search(r'Erroneous ASP code:\n(.*?)\n\nClingo error message:', prompt, re.DOTALL)
+        if match:
+            _count('unmatched')
+            return match.group(1)
+        if prompt.startswith('The previous response contained multiple statements'):
+            _count('unmatched')
+            previous = messages[-2]['content'] if len(messages) > 1 else ''
+            return previous.strip().splitlines()[0] + '\n' if previous.strip() else ''
+
+        candidates = self.responses.get(self.normalize(prompt)) or self.responses.get(self.first_line_key(prompt))
+        if candidates:
+            _count('replayed')
+        else:
+            # Unknown prompt: answer with any recorded response (stable for the same prompt)
+            _count('unmatched')
+            candidates = [response for key in sorted(self.responses) for response in self.responses[key]] or ['\n']
+
+        # Different recordings of the same prompt (other models or runs) are picked by seed
+        return random.Random(f'{seed}:{prompt}').choice(candidates)
+
+
+# Simulated provider: draws errors, looks up the response and waits for the simulated latency
+class Mock_Client():
+    def __init__(self, seed=None):
+        self.seed = seed
+        self.responses = get_mock_responses()
+
+    def respond(self, messages):
+        _count('requests')
+        with _random_lock:
+            draw = _random.random()
+        if draw < MOCK_BACKEND['rate_limit_rate']:
+            _count('rate_limited')
+            raise Mock_API_Error(429, 'Too Many Requests (simulated)', retry_after=MOCK_BACKEND['retry_after'])
+        if draw < MOCK_BACKEND['rate_limit_rate'] + MOCK_BACKEND['error_rate']:
+            _count('errors')
+            raise Mock_API_Error(500, 'Internal Server Error (simulated)')
+        return self.responses.lookup(messages, self.seed)
+
+    @staticmethod
+    def token_seconds(text):
+        # Same estimate of the number of tokens as Chat_Bot.count_tokens
+        return (len(text) // 4 + 1) / MOCK_BACKEND['tokens_per_second']
+
+    # Blocking completion
+    def complete(self, messages):
+        response = self.respond(messages)
+        seconds = MOCK_BACKEND['time_to_first_token'] + self.token_seconds(response)
+        _count('simulated_seconds', seconds)
+        time.sleep(seconds)
+        return response
+
+    # Blocking completion, streamed line by line
+    def stream(self, messages):
+        response = self.respond(messages)
+        _count('simulated_seconds', MOCK_BACKEND['time_to_first_token'])
+        time.sleep(MOCK_BACKEND['time_to_first_token'])
+        for line in response.splitlines(keepends=True):
+            seconds = self.token_seconds(line)
+            _count('simulated_seconds', seconds)
+            time.sleep(seconds)
+            yield line
+
+    # Same interface as AsyncInferenceClient.chat_completion, so the async bots (with their rate limiting and retries)
+    # can use the mock as their client
+    async def chat_completion(self, messages, stream=False, **kwargs):
+        response = self.respond(messages)
+        _count('simulated_seconds', MOCK_BACKEND['time_to_first_token'])
+        await asyncio.sleep(MOCK_BACKEND['time_to_first_token'])
+
+        if not stream:
+            seconds = self.token_seconds(response)
+            _count('simulated_seconds', seconds)
+            await asyncio.sleep(seconds)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=response))])
+
+        async def chunks():
+            for line in response.splitlines(keepends=True):
+                seconds = self.token_seconds(line)
+                _count('simulated_seconds', seconds)
+                await asyncio.sleep(seconds)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=line))])
+        return chunks()
+
+
+# Class representing an LLM chat bot backed by the simulated provider
+class Mock_Bot(Chat_Bot):
+    def __init__(self, system_prompt, model='mock', temperature=None, top_p=None, seed=None, max_new_tokens=512):
+        super().__init__(system_prompt)
+        self.client = Mock_Client(seed=seed)
+        self.model = model
+        self.temperature = temperature
+        self.top_p = top_p
+        self.seed = seed
+        self.max_new_tokens = max_new_tokens
+
+    # Infer the response
+    def infer(self):
+        return self.client.complete(self.messages)
+
+    # Infer the response as a stream of text chunks
+    def stream_infer(self):
+        yield from self.client.stream(self.messages)
+
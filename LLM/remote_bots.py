@@ -0,0 +1,569 @@
+# Remote bots, using the Huggingface inference clients (HF API and the together provider).
+# This module is imported by LLM.bots on first use, so huggingface_hub is only imported when a remote bot is needed.
+import asyncio
+import queue
+import random
+import threading
+import time
+import warnings
+import huggingface_hub
+from huggingface_hub import InferenceClient, AsyncInferenceClient
+from LLM.bots import Chat_Bot, get_hf_key
+
+HF_KEY = get_hf_key()
+
+# Keep-alive connection pool of the HTTP clients used by all inference clients in the process. Use
+# configure_client_pool to change the pool sizes before the first request is made.
+CLIENT_POOL = {
+    'max_connections': 32,
+    'max_keepalive_connections': 16,
+    'keepalive_expiry': 60.0,
+}
+
+# Inference clients are shared process-wide, one per (sync/async, provider, API key), so that bots and repair sessions
+# reuse the pooled connections instead of paying connection setup and TLS handshakes again.
+_clients = {}
+_clients_lock = threading.Lock()
+_http_pool_installed = False
+# HTTP library of huggingface_hub the pool was installed for ('httpx' or 'requests'), None if it is not supported
+_http_pool_backend = None
+_pool_stats = {'clients_created': 0, 'client_reuses': 0, 'requests': 0, 'new_connections': 0}
+_pool_stats_lock = threading.Lock()
+
+
+def _count(name, amount=1):
+    with _pool_stats_lock:
+        _pool_stats[name] += amount
+
+
+def _trace_connection(event_name, info):
+    # httpcore trace events; a TCP connect means the request could not reuse a pooled connection
+    if event_name == 'connection.connect_tcp.complete':
+        _count('new_connections')
+
+
+async def _async_trace_connection(event_name, info):
+    _trace_connection(event_name, info)
+
+
+def _hf_httpx(hf_http):
+    # huggingface_hub 1.x uses httpx, 2.x the httpx2 fork with the same API
+    return getattr(hf_http, 'httpx', None) or getattr(hf_http, 'httpx2', None)
+
+
+def _install_http_pool():
+    """Make huggingface_hub create its HTTP clients with the keep-alive pool sizes of CLIENT_POOL."""
+    global _http_pool_installed, _http_pool_backend
+    if _http_pool_installed:
+        return
+    _http_pool_installed = True
+
+    from huggingface_hub.utils import _http as hf_http
+
+    httpx = _hf_httpx(hf_http)
+    if httpx is not None and hasattr(hf_http, 'set_client_factory'):
+        # huggingface_hub >= 1.0 (httpx or httpx2). Keep the default hooks of huggingface_hub and count requests and new
+        # connections on top of them.
+        limits = httpx.Limits(**CLIENT_POOL)
+
+        def request_hook(request):
+            hf_http.hf_request_event_hook(request)
+            request.extensions['trace'] = _trace_connection
+            _count('requests')
+
+        async def async_request_hook(request):
+            await hf_http.async_hf_request_event_hook(request)
+            request.extensions['trace'] = _async_trace_connection
+            _count('requests')
+
+        hf_http.set_client_factory(lambda: httpx.Client(
+            event_hooks={'request': [request_hook]}, follow_redirects=True, timeout=None, limits=limits
+        ))
+        hf_http.set_async_client_factory(lambda: httpx.AsyncClient(
+            event_hooks={'request': [async_request_hook], 'response': [hf_http.async_hf_response_event_hook]},
+            follow_redirects=True, timeout=None, limits=limits
+        ))
+        _http_pool_backend = 'httpx'
+    elif hasattr(hf_http, 'configure_http_backend'):
+        # huggingface_hub < 1.0 (requests). Only the requests are counted, urllib3 does not report new connections.
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        def backend_factory():
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=CLIENT_POOL['max_keepalive_connections'], pool_maxsize=CLIENT_POOL['max_connections'])
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.hooks['response'].append(lambda response, *args, **kwargs: _count('requests'))
+            return session
+
+        hf_http.configure_http_backend(backend_factory=backend_factory)
+        _http_pool_backend = 'requests'
+    else:
+        _http_pool_backend = None
+        warnings.warn(f'The HTTP backend of huggingface_hub {huggingface_hub.__version__} is not supported: the inference '
+                      'clients use its default connection pool and client_pool_stats can not count requests or connections')
+
+
+def configure_client_pool(max_connections=None, max_keepalive_connections=None, keepalive_expiry=None):
+    """Change the keep-alive connection pool shared by the inference clients.
+
+    Clients that were already created keep their pool; call this before the first bot is loaded.
+
+    Args:
+        max_connections (int|None): maximum number of open connections per HTTP client
+        max_keepalive_connections (int|None): number of idle connections kept open for reuse
+        keepalive_expiry (float|None): seconds an idle connection is kept open
+    """
+    global _http_pool_installed
+    if max_connections is not None:
+        CLIENT_POOL['max_connections'] = max_connections
+    if max_keepalive_connections is not None:
+        CLIENT_POOL['max_keepalive_connections'] = max_keepalive_connections
+    if keepalive_expiry is not None:
+        CLIENT_POOL['keepalive_expiry'] = keepalive_expiry
+    with _clients_lock:
+        _http_pool_installed = False
+        _install_http_pool()
+
+
+def get_inference_client(provider=None, api_key=None, asynchronous=False):
+    """Return the process-wide inference client for a provider and API key, creating it on first use.
+
+    Args:
+        provider (str|None): the inference provider, e.g. 'together'; None for the default HF inference API
+        api_key (str|None): the API key to authenticate with
+        asynchronous (bool): return an AsyncInferenceClient instead of an InferenceClient
+
+    Returns:
+        InferenceClient|AsyncInferenceClient: the shared client
+    """
+    key = (asynchronous, provider, api_key)
+    with _clients_lock:
+        _install_http_pool()
+        client = _clients.get(key)
+        if client is None:
+            client_class = AsyncInferenceClient if asynchronous else InferenceClient
+            client = client_class(provider=provider, api_key=api_key) if provider is not None else client_class(api_key=api_key)
+            _clients[key] = client
+            _count('clients_created')
+        else:
+            _count('client_reuses')
+    return client
+
+
+def client_pool_stats():
+    """Return how often inference clients and HTTP connections were reused in this process.
+
+    Returns:
+        dict: clients_created, client_reuses, requests, new_connections, reused_connections and connection_reuse_rate
+            (requests is None when the HTTP backend of huggingface_hub is not supported, new_connections is None when
+            the HTTP backend does not report connections)
+    """
+    with _pool_stats_lock:
+        stats = dict(_pool_stats)
+
+    if _http_pool_installed and _http_pool_backend is None:
+        stats['requests'] = None
+    if _http_pool_backend != 'httpx':
+        stats['new_connections'] = None
+        stats['reused_connections'] = None
+        stats['connection_reuse_rate'] = None
+    else:
+        stats['reused_connections'] = max(stats['requests'] - stats['new_connections'], 0)
+        stats['connection_reuse_rate'] = stats['reused_connections'] / stats['requests'] if stats['requests'] else 0.0
+    return stats
+
+# Class representing an LLM chat bot
+class API_Bot(Chat_Bot):
+    def __init__(self, system_prompt, model="meta-llama/Meta-Llama-3-8B-Instruct", temperature=None, top_p=None, seed=None, max_new_tokens=512):
+        super().__init__(system_prompt)
+        self.client = get_inference_client(api_key=HF_KEY)
+        self.model = model
+        self.temperature = temperature
+        self.top_p = top_p
+        self.seed = seed
+        self.max_new_tokens = max_new_tokens
+
+    # Infer the response
+    def infer(self):
+        # Build kwargs for the inference client based on what was provided
+        call_kwargs = {
+            "model": self.model,
+            "messages": self.messages,
+            "max_tokens": self.max_new_tokens
+        }
+        if self.temperature is not None:
+            call_kwargs["temperature"] = self.temperature
+        if self.top_p is not None:
+            call_kwargs["top_p"] = self.top_p
+        if self.seed is not None:
+            call_kwargs["seed"] = self.seed
+
+        response = self.client.chat.completions.create(**call_kwargs)
+
+        return response.choices[0].message.content
+
+    # Infer the response as a stream of text chunks
+    def stream_infer(self):
+        call_kwargs = {"model": self.model, "messages": self.messages, "max_tokens": self.max_new_tokens, "stream": True}
+        if self.temperature is not None:
+            call_kwargs["temperature"] = self.temperature
+        if self.top_p is not None:
+            call_kwargs["top_p"] = self.top_p
+        if self.seed is not None:
+            call_kwargs["seed"] = self.seed
+
+        stream = self.client.chat.completions.create(**call_kwargs)
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Closing the stream stops the generation on the provider side as well
+            if hasattr(stream, 'close'):
+                stream.close()
+
+# Class representing an LLM chat bot
+class Deepseek_Bot(Chat_Bot):
+    def __init__(self, system_prompt, temperature=None, top_p=None, seed=None, max_new_tokens=2000):
+        super().__init__(system_prompt)
+        self.client = get_inference_client(provider="together", api_key=HF_KEY)
+        self.model = "deepseek-ai/DeepSeek-V3"
+        self.temperature = temperature
+        self.top_p = top_p
+        self.seed = seed
+        self.max_new_tokens = max_new_tokens
+
+    # Infer the response
+    def infer(self):
+        call_kwargs = {"model": self.model, "messages": self.messages, "max_tokens": self.max_new_tokens}
+        if self.temperature is not None:
+            call_kwargs["temperature"] = self.temperature
+        if self.top_p is not None:
+            call_kwargs["top_p"] = self.top_p
+        if self.seed is not None:
+            call_kwargs["seed"] = self.seed
+
+        response = self.client.chat.completions.create(**call_kwargs)
+
+        return response.choices[0].message.content
+
+    # Infer the response as a stream of text chunks
+    def stream_infer(self):
+        call_kwargs = {"model": self.model, "messages": self.messages, "max_tokens": self.max_new_tokens, "stream": True}
+        if self.temperature is not None:
+            call_kwargs["temperature"] = self.temperature
+        if self.top_p is not None:
+            call_kwargs["top_p"] = self.top_p
+        if self.seed is not None:
+            call_kwargs["seed"] = self.seed
+
+        stream = self.client.chat.completions.create(**call_kwargs)
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Closing the stream stops the generation on the provider side as well
+            if hasattr(stream, 'close'):
+                stream.close()
+
+# Class representing an LLM chat bot
+class DeepseekDirect_Bot(Chat_Bot):
+    def __init__(self, system_prompt, temperature=None, top_p=None, seed=None, max_new_tokens=2000):
+        super().__init__(system_prompt)
+        self.client = get_inference_client(provider="together", api_key=HF_KEY)
+        self.model = "deepseek-ai/DeepSeek-R1"
+        self.temperature = temperature
+        self.top_p = top_p
+        self.seed = seed
+        self.max_new_tokens = max_new_tokens
+
+    # Infer the response
+    def infer(self):
+        call_kwargs = {"model": self.model, "messages": self.messages, "max_tokens": self.max_new_tokens}
+        if self.temperature is not None:
+            call_kwargs["temperature"] = self.temperature
+        if self.top_p is not None:
+            call_kwargs["top_p"] = self.top_p
+        if self.seed is not None:
+            call_kwargs["seed"] = self.seed
+
+        response = self.client.chat.completions.create(**call_kwargs)
+
+        return response.choices[0].message.content
+
+    # Infer the response as a stream of text chunks
+    def stream_infer(self):
+        call_kwargs = {"model": self.model, "messages": self.messages, "max_tokens": self.max_new_tokens, "stream": True}
+        if self.temperature is not None:
+            call_kwargs["temperature"] = self.temperature
+        if self.top_p is not None:
+            call_kwargs["top_p"] = self.top_p
+        if self.seed is not None:
+            call_kwargs["seed"] = self.seed
+
+        stream = self.client.chat.completions.create(**call_kwargs)
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Closing the stream stops the generation on the provider side as well
+            if hasattr(stream, 'close'):
+                stream.close()
+
+# Rate limits per remote provider for the async bots: sustained requests per second, burst size and the maximum
+# number of requests in flight. Use configure_remote_limits to change them before the first request is made.
+REMOTE_LIMITS = {
+    'hf-inference': {'requests_per_second': 1.0, 'burst': 4, 'max_in_flight': 4},
+    'together': {'requests_per_second': 1.0, 'burst': 4, 'max_in_flight': 4},
+}
+
+# Retry settings for the async bots (only 429 and 5xx responses are retried)
+MAX_RETRIES = 6
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+# All async bots share one event loop, running in a background thread, so that the rate limiters and in-flight caps
+# are shared by every bot in the process (also when the bots are prompted from several threads).
+_event_loop = None
+_event_loop_lock = threading.Lock()
+_provider_limits = {}
+
+
+def configure_remote_limits(provider, requests_per_second=None, burst=None, max_in_flight=None):
+    """Change the rate limits used by the async bots for one provider.
+
+    Args:
+        provider (str): the provider name, e.g. 'hf-inference' or 'together'
+        requests_per_second (float|None): sustained request rate
+        burst (int|None): number of requests that may be sent at once after an idle period
+        max_in_flight (int|None): maximum number of concurrent requests
+    """
+    limits = REMOTE_LIMITS.setdefault(provider, dict(REMOTE_LIMITS['hf-inference']))
+    if requests_per_second is not None:
+        limits['requests_per_second'] = requests_per_second
+    if burst is not None:
+        limits['burst'] = burst
+    if max_in_flight is not None:
+        limits['max_in_flight'] = max_in_flight
+    # Drop any limiter that was already created, so the new limits are used from now on
+    _provider_limits.pop(provider, None)
+
+
+def get_event_loop():
+    """Return the background event loop shared by all async bots, starting it on first use."""
+    global _event_loop
+    with _event_loop_lock:
+        if _event_loop is None:
+            _event_loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_event_loop.run_forever, name='async-bots', daemon=True)
+            thread.start()
+    return _event_loop
+
+
+def run_coroutine(coroutine):
+    """Run a coroutine on the shared background event loop and block until it is done."""
+    return asyncio.run_coroutine_threadsafe(coroutine, get_event_loop()).result()
+
+
+# Token bucket limiting the request rate to a provider. Only used from the shared event loop.
+class Token_Bucket():
+    def __init__(self, requests_per_second, burst):
+        self.rate = requests_per_second
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return now
+
+    # Wait until a request may be sent
+    async def acquire(self):
+        while True:
+            now = self.refill()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+            elif self.tokens >= 1:
+                self.tokens -= 1
+                return
+            else:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    # The provider pushed back: stop sending any requests for `seconds` and start again with an empty bucket
+    def block(self, seconds):
+        now = self.refill()
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = 0
+
+
+def get_provider_limits(provider):
+    """Return the (token bucket, in-flight semaphore) pair shared by all async bots of a provider."""
+    if provider not in _provider_limits:
+        limits = REMOTE_LIMITS.get(provider, REMOTE_LIMITS['hf-inference'])
+        _provider_limits[provider] = (
+            Token_Bucket(limits['requests_per_second'], limits['burst']),
+            asyncio.Semaphore(limits['max_in_flight'])
+        )
+    return _provider_limits[provider]
+
+
+def get_status_code(exception):
+    """Return the HTTP status code of a failed inference request, or None if it is not an HTTP error."""
+    status = getattr(exception, 'status', None)
+    if status is None:
+        response = getattr(exception, 'response', None)
+        status = getattr(response, 'status_code', None) or getattr(response, 'status', None)
+    return status
+
+
+def get_retry_after(exception):
+    """Return the Retry-After delay (in seconds) of a failed request, or None if the provider did not send one."""
+    headers = getattr(exception, 'headers', None)
+    if headers is None:
+        headers = getattr(getattr(exception, 'response', None), 'headers', None)
+    try:
+        return float(headers.get('Retry-After'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+# Class representing an LLM chat bot using the asyncio inference client. Instead of sleeping after every call, the
+# requests are throttled by a token bucket per provider and only retried (with jittered backoff) when the provider
+# pushes back with a 429 or 5xx response.
+class Async_API_Bot(Chat_Bot):
+    def __init__(self, system_prompt, model="meta-llama/Meta-Llama-3-8B-Instruct", provider=None, temperature=None, top_p=None, seed=None, max_new_tokens=512, client=None):
+        super().__init__(system_prompt)
+        self.provider = provider
+        # Any client with the chat_completion coroutine of AsyncInferenceClient can be used (e.g. the mock client)
+        self.client = client if client is not None else get_inference_client(provider=provider, api_key=HF_KEY, asynchronous=True)
+        self.model = model
+        self.temperature = temperature
+        self.top_p = top_p
+        self.seed = seed
+        self.max_new_tokens = max_new_tokens
+
+    # Infer the response (blocking), by running ainfer on the shared event loop
+    def infer(self):
+        return run_coroutine(self.ainfer())
+
+    # Prompt the chat bot from a coroutine running on any event loop
+    async def aprompt(self, content):
+        self.add_to_prompt('user', content)
+        self.trim_history()
+        response = self.get_cached_response()
+        if response is None:
+            response = await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self.ainfer(), get_event_loop()))
+            self.cache_response(response)
+        self.add_to_prompt('assistant', response)
+        return response
+
+    # Infer the response, respecting the rate limits of the provider
+    async def ainfer(self):
+        call_kwargs = {"model": self.model, "messages": list(self.messages), "max_tokens": self.max_new_tokens}
+        if self.temperature is not None:
+            call_kwargs["temperature"] = self.temperature
+        if self.top_p is not None:
+            call_kwargs["top_p"] = self.top_p
+        if self.seed is not None:
+            call_kwargs["seed"] = self.seed
+
+        bucket, in_flight = get_provider_limits(self.provider or 'hf-inference')
+
+        attempt = 0
+        while True:
+            async with in_flight:
+                await bucket.acquire()
+                try:
+                    response = await self.client.chat_completion(**call_kwargs)
+                    return response.choices[0].message.content
+                except Exception as e:
+                    status = get_status_code(e)
+                    if status is None or not (status == 429 or status >= 500) or attempt >= MAX_RETRIES:
+                        raise
+
+                    # Full jitter backoff, unless the provider told us how long to wait
+                    delay = get_retry_after(e)
+                    if delay is None:
+                        delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+                    if status == 429:
+                        # Too many requests: hold back every bot of this provider, not just this one
+                        bucket.block(delay)
+                    attempt += 1
+
+            await asyncio.sleep(delay)
+
+    # Infer the response as a stream of text chunks. The stream is read on the shared event loop and handed over to
+    # this thread through a queue; only the request itself (not a partially streamed response) is retried.
+    def stream_infer(self):
+        chunks = queue.Queue()
+        stopped = threading.Event()
+        end = object()
+
+        async def pump():
+            call_kwargs = {"model": self.model, "messages": list(self.messages), "max_tokens": self.max_new_tokens, "stream": True}
+            if self.temperature is not None:
+                call_kwargs["temperature"] = self.temperature
+            if self.top_p is not None:
+                call_kwargs["top_p"] = self.top_p
+            if self.seed is not None:
+                call_kwargs["seed"] = self.seed
+
+            bucket, in_flight = get_provider_limits(self.provider or 'hf-inference')
+            attempt = 0
+            try:
+                while True:
+                    async with in_flight:
+                        await bucket.acquire()
+                        try:
+                            stream = await self.client.chat_completion(**call_kwargs)
+                        except Exception as e:
+                            status = get_status_code(e)
+                            if status is None or not (status == 429 or status >= 500) or attempt >= MAX_RETRIES:
+                                raise
+                            delay = get_retry_after(e)
+                            if delay is None:
+                                delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+                            if status == 429:
+                                bucket.block(delay)
+                            attempt += 1
+                        else:
+                            try:
+                                async for chunk in stream:
+                                    if stopped.is_set():
+                                        break
+                                    if chunk.choices and chunk.choices[0].delta.content:
+                                        chunks.put(chunk.choices[0].delta.content)
+                            finally:
+                                # The client is shared, so hand the connection back as soon as we stop reading
+                                if hasattr(stream, 'aclose'):
+                                    await stream.aclose()
+                            return
+                    await asyncio.sleep(delay)
+            except Exception as e:
+                chunks.put(e)
+            finally:
+                chunks.put(end)
+
+        asyncio.run_coroutine_threadsafe(pump(), get_event_loop())
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is end:
+                    return
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+        finally:
+            stopped.set()
+
+# Class representing an LLM chat bot using Deepseek V3 on the together provider with the asyncio inference client
+class Async_Deepseek_Bot(Async_API_Bot):
+    def __init__(self, system_prompt, temperature=None, top_p=None, seed=None, max_new_tokens=2000):
+        super().__init__(system_prompt, model="deepseek-ai/DeepSeek-V3", provider="together", temperature=temperature, top_p=top_p, seed=seed, max_new_tokens=max_new_tokens)
@@ -0,0 +1,245 @@
+"""Deterministic repairs of common syntax errors in LLM-generated ASP code.
+
+Many syntax errors are mechanical: leftover markdown, lines of prose, a missing final '.', a trailing comma before the
+'.', unclosed aggregate braces, doubled braces or '\\=' instead of '!='. These can be fixed without asking an LLM. The
+Auto_Fixer classifies the Clingo error message, applies the fixers registered for that kind of error and re-checks the
+code; a rewrite is only kept when it fixes the error or moves it further into the code. Only blocks it can not fix need
+to be repaired by the syntax_corrector_bot. The re-checks run in the syntax worker pool when it is enabled (see
+utils.syntax_workers).
+
+Usage:
+    from utils import auto_fixer
+    code, error = auto_fixer.auto_fix(code, error)
+    print(auto_fixer.auto_fixer_stats())
+"""
+import re
+import threading
+from typing import Callable, Optional
+
+import utils.utils as utils
+from utils import syntax_workers
+
+
+def classify_syntax_error(message: str) -> dict:
+    """
+    Classify a Clingo error message, e.g. "<string>:1:5-6: error: syntax error, unexpected ., expecting } or ;".
+
+    Args:
+        message (str): The error message, as returned by check_syntax_of_one_string.
+
+    Returns:
+        dict: kind ('syntax', 'lexer' or 'other'), unexpected (the unexpected token, or None), expecting (the list of
+              expected tokens) and position ((line, column) of the error, or None).
+    """
+    first_line = message.strip().splitlines()[0] if message.strip() else ''
+
+    kind = 'other'
+    if 'lexer error' in first_line:
+        kind = 'lexer'
+    elif 'syntax error' in first_line:
+        kind = 'syntax'
+
+    match = re.search(r'unexpected (.*?)(?:, expecting (.*))?$', first_line)
+    unexpected = match.group(1).strip() if match else None
+    expecting = [token.strip() for token in match.group(2).split(' or ')] if match and match.group(2) else []
+
+    position = re.match(r'[^:]*:(\d+):(\d+)', first_line)
+    position = (int(position.group(1)), int(position.group(2))) if position else None
+
+    return {'kind': kind, 'unexpected': unexpected, 'expecting': expecting, 'position': position}
+
+
+class Fixer():
+    """
+    A deterministic rewrite for one kind of syntax error.
+
+    Args:
+        name (str): Name of the fixer, used in the stats.
+        applies (callable): Takes the classified error (see classify_syntax_error) and the code, returns whether the
+                            fixer should be tried.
+        rewrite (callable): Takes the code and returns the rewritten code.
+    """
+
+    def __init__(self, name: str, applies: Callable[[dict, str], bool], rewrite: Callable[[str], str]):
+        self.name = name
+        self.applies = applies
+        self.rewrite = rewrite
+
+
+def remove_markdown(code: str) -> str:
+    """Remove code-fence lines and inline backticks."""
+    lines = [line for line in code.splitlines() if not line.lstrip().startswith('```') and line.strip() != '``']
+    return '\n'.join(lines).replace('`', '')
+
+
+def remove_prose(code: str) -> str:
+    """Remove lines of natural language (see looks_like_prose) and separator lines like '-----'."""
+    lines = [line for line in code.splitlines() if not utils.looks_like_prose(line) and not re.fullmatch(r'\s*[-=*#]{3,}[^()]*', line)]
+    return '\n'.join(lines)
+
+
+def add_missing_period(code: str) -> str:
+    """Terminate the statement with a '.'."""
+    return code.rstrip() + '.'
+
+
+def remove_trailing_comma(code: str) -> str:
+    """Remove a ',' or ';' directly before the final '.' (or at the end of the code)."""
+    return re.sub(r'[,;]\s*(\.?)\s*$', r'\1', code.rstrip())
+
+
+def close_brackets(code: str) -> str:
+    """Close unbalanced '(' and '{' just before the final '.' (or at the end of the code)."""
+    body = code.rstrip()
+    period = body.endswith('.') and not body.endswith('..')
+    if period:
+        body = body[:-1]
+
+    stack = []
+    for character in re.sub(r'"(?:[^"\\]|\\.)*"', '""', body):
+        if character in '({[':
+            stack.append(character)
+        elif character in ')}]' and stack and '({['[')}]'.index(character)] == stack[-1]:
+            stack.pop()
+    closing = ''.join({'(': ')', '{': '}', '[': ']'}[character] for character in reversed(stack))
+
+    return body.rstrip() + closing + ('.' if period else '')
+
+
+def single_braces(code: str) -> str:
+    """Replace doubled braces ({{ and }}, e.g. from unrendered format strings) by single ones."""
+    return code.replace('{{', '{').replace('}}', '}')
+
+
+def fix_operators(code: str) -> str:
+    """Replace Prolog-style operators by their Clingo equivalents: \\= by !=, \\+ by not, =< by <=."""
+    code = re.sub(r'\\=', '!=', code)
+    code = re.sub(r'\\\+\s*', 'not ', code)
+    return re.sub(r'=<', '<=', code)
+
+
+DEFAULT_FIXERS = [
+    Fixer('markdown', lambda error, code: '`' in code, remove_markdown),
+    Fixer('prose', lambda error, code: error['unexpected'] in ('<IDENTIFIER>', '<VARIABLE>', '<NUMBER>', '<STRING>', ':', '-', '`') or error['kind'] == 'lexer', remove_prose),
+    Fixer('double braces', lambda error, code: '{{' in code or '}}' in code, single_braces),
+    Fixer('operators', lambda error, code: bool(re.search(r'\\=|\\\+|=<', code)), fix_operators),
+    Fixer('trailing comma', lambda error, code: bool(re.search(r'[,;]\s*\.?\s*$', code)), remove_trailing_comma),
+    Fixer('unclosed brackets', lambda error, code: any(token in ('}', ')', ']') for token in error['expecting']) or error['unexpected'] in ('EOF', '.'), close_brackets),
+    Fixer('missing period', lambda error, code: error['unexpected'] == 'EOF' and not code.rstrip().endswith('.'), add_missing_period),
+]
+
+
+class Auto_Fixer():
+    """
+    Pipeline of deterministic fixers, tried in order until the code is valid or no fixer makes progress.
+
+    Keeps per-fixer stats: how often a fixer was tried, how often its rewrite was kept, and how many blocks were fully
+    fixed without an LLM (each of those saves at least one syntax repair call).
+    """
+
+    def __init__(self, fixers: Optional[list] = None, max_rounds: int = 8):
+        self.fixers = list(DEFAULT_FIXERS if fixers is None else fixers)
+        self.max_rounds = max_rounds
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def register(self, fixer: Fixer, index: Optional[int] = None):
+        """Add a fixer to the pipeline (at the end, or at the given index)."""
+        if index is None:
+            self.fixers.append(fixer)
+        else:
+            self.fixers.insert(index, fixer)
+        with self._lock:
+            self.fixer_stats.setdefault(fixer.name, {'tried': 0, 'kept': 0})
+
+    def reset_stats(self):
+        with self._lock:
+            self.fixer_stats = {fixer.name: {'tried': 0, 'kept': 0} for fixer in self.fixers}
+            self.blocks = 0
+            self.fixed_blocks = 0
+
+    def stats(self) -> dict:
+        """Return the per-fixer hit rates and the number of blocks fixed without an LLM."""
+        with self._lock:
+            fixers = {
+                name: dict(counts, hit_rate=counts['kept'] / counts['tried'] if counts['tried'] else 0.0)
+                for name, counts in self.fixer_stats.items()
+            }
+            return {
+                'blocks': self.blocks,
+                'fixed_blocks': self.fixed_blocks,
+                'fix_rate': self.fixed_blocks / self.blocks if self.blocks else 0.0,
+                'fixers': fixers,
+            }
+
+    def _count(self, name: str, counter: str):
+        with self._lock:
+            self.fixer_stats.setdefault(name, {'tried': 0, 'kept': 0})[counter] += 1
+
+    @staticmethod
+    def _progress(old_error: str, new_error: str) -> bool:
+        # A rewrite makes progress if it fixes the error or moves it further into the code
+        if not new_error:
+            return True
+        old_position = classify_syntax_error(old_error)['position']
+        new_position = classify_syntax_error(new_error)['position']
+        return old_position is not None and new_position is not None and new_position > old_position
+
+    def fix(self, code: str, error: Optional[str] = None):
+        """
+        Try to fix the syntax of one statement block.
+
+        Args:
+            code (str): The statement block.
+            error (str, optional): Its Clingo error message, if already known.
+
+        Returns:
+            tuple: (code, error) - the (possibly) rewritten code and its remaining error ('' if it is valid now).
+        """
+        if error is None:
+            error = syntax_workers.check_statement_block(code)
+        if not error:
+            return code, error
+
+        with self._lock:
+            self.blocks += 1
+
+        for _ in range(self.max_rounds):
+            classified = classify_syntax_error(error)
+            for fixer in self.fixers:
+                if not fixer.applies(classified, code):
+                    continue
+                rewritten = fixer.rewrite(code)
+                if rewritten == code:
+                    continue
+
+                self._count(fixer.name, 'tried')
+                new_error = syntax_workers.check_statement_block(rewritten)
+                if self._progress(error, new_error):
+                    self._count(fixer.name, 'kept')
+                    code, error = rewritten, new_error
+                    break
+            else:
+                # No fixer made progress
+                break
+
+            if not error:
+                with self._lock:
+                    self.fixed_blocks += 1
+                break
+
+        return code, error
+
+
+# Module-level auto fixer, used by the scheduler
+default_auto_fixer = Auto_Fixer()
+
+
+def auto_fix(code: str, error: Optional[str] = None):
+    """Fix one statement block with the default auto fixer. Returns (code, remaining_error)."""
+    return default_auto_fixer.fix(code, error)
+
+
+def auto_fixer_stats() -> dict:
+    """Return the stats of the default auto fixer."""
+    return default_auto_fixer.stats()
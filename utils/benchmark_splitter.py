@@ -0,0 +1,68 @@
+"""Microbenchmark of split_ASP_code_into_statement_blocks on multi-megabyte programs.
+
+Builds programs of increasing size by repeating the .lp programs in Results/, as many lines and as one single line
+(without comments), and reports the throughput of the statement block splitter. The time per megabyte should stay flat
+as the programs grow (the splitter is linear in the size of its input).
+
+Usage (from the repository root):
+    python -m utils.benchmark_splitter [--sizes 1 4 16] [--runs 3]
+"""
+import argparse
+import glob
+import os
+import re
+import time
+
+import utils.utils as utils
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def build_program(corpus, megabytes):
+    """Repeat the corpus until the program has (at least) the given size."""
+    copies = max(1, int(megabytes * 1024 * 1024 / len(corpus)) + 1)
+    return corpus * copies
+
+
+def best_time(function, runs):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--results-dir', default=os.path.join(REPO_ROOT, 'Results'), help='folder with .lp programs')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 4, 16], help='program sizes in megabytes')
+    parser.add_argument('--runs', type=int, default=3, help='number of runs (the fastest is reported)')
+    args = parser.parse_args()
+
+    corpus = ''
+    for path in sorted(glob.glob(os.path.join(args.results_dir, '*.lp'))):
+        with open(path, 'r', encoding='utf-8') as file:
+            corpus += file.read().rstrip('\n') + '\n'
+
+    print(f'{"input":<12} {"size":>8} {"blocks":>9} {"seconds":>9} {"MB/s":>7} {"s/MB":>7}')
+    for megabytes in args.sizes:
+        program = build_program(corpus, megabytes)
+        # Without comments, so the single line is not one long comment
+        one_line = re.sub(r'%[^\n]*', '', program).replace('\n', ' ')
+        size = len(program) / (1024 * 1024)
+        inputs = [
+            ('lines', lambda: utils.split_ASP_code_into_statement_blocks(program.splitlines())),
+            ('one string', lambda: utils.split_ASP_code_into_statement_blocks([program])),
+            ('one line', lambda: utils.split_ASP_code_into_statement_blocks([one_line])),
+            ('generator', lambda: sum(1 for _ in utils.iter_ASP_statement_blocks([program]))),
+        ]
+        for name, function in inputs:
+            blocks, seconds = best_time(function, args.runs)
+            count = blocks if isinstance(blocks, int) else len(blocks)
+            print(f'{name:<12} {size:>6.1f}MB {count:>9} {seconds:>9.3f} {size / seconds:>7.1f} {seconds / size:>7.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark of the batch syntax checker against checking every statement block on its own.
+
+Splits the .lp programs in Results/ into statement blocks and checks them with check_syntax_of_one_string (one parse
+per block) and with check_syntax_of_statement_blocks (one parse per program, plus one per error). Both must return the
+same errors. --scale concatenates the programs to simulate larger generated programs.
+
+Both are timed with the syntax caches disabled (uncached: every block is parsed) and with the caches cleared before
+every run (cached: only blocks repeated within a run are reused, e.g. the copies of --scale), so no run reads results
+cached by an earlier run or by the other check.
+
+Usage (from the repository root):
+    python -m utils.benchmark_syntax_check [--scale 10] [--runs 5] [--valid-only]
+"""
+import argparse
+import glob
+import os
+import time
+
+import utils.utils as utils
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def best_time(function, blocks, runs, cached):
+    """Return the result and the fastest wall-clock time of several runs, starting every run with empty (cached) or disabled syntax caches."""
+    utils.configure_syntax_cache(maxsize=utils.SYNTAX_CACHE_SIZE if cached else 0, program_maxsize=utils.PROGRAM_SYNTAX_CACHE_SIZE if cached else 0)
+    best = None
+    for _ in range(runs):
+        utils.clear_syntax_cache()
+        start = time.perf_counter()
+        result = function(blocks)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--results-dir', default=os.path.join(REPO_ROOT, 'Results'), help='folder with .lp programs')
+    parser.add_argument('--scale', type=int, default=1, help='number of copies of the programs checked as one program')
+    parser.add_argument('--runs', type=int, default=5, help='number of runs (the fastest is reported)')
+    parser.add_argument('--valid-only', action='store_true', help='only use statement blocks without syntax errors')
+    args = parser.parse_args()
+
+    programs = []
+    for path in sorted(glob.glob(os.path.join(args.results_dir, '*.lp'))):
+        with open(path, 'r', encoding='utf-8') as file:
+            programs.append(utils.split_ASP_code_into_statement_blocks(file.read().splitlines()))
+    if args.valid_only:
+        programs = [[block for block in blocks if not utils.check_syntax_of_one_string(block)] for blocks in programs]
+
+    def per_block(blocks):
+        return [utils.check_syntax_of_one_string(block) for block in blocks]
+
+    def row(name, blocks, errors, seconds):
+        # seconds: per block and batch, uncached and cached
+        columns = ''.join(f' {per_block_seconds * 1000:>8.2f}ms {batch_seconds * 1000:>8.2f}ms {per_block_seconds / batch_seconds:>7.1f}x'
+                          for per_block_seconds, batch_seconds in (seconds[:2], seconds[2:]))
+        print(f'{name[:40]:<40} {blocks:>6} {errors:>6}{columns}')
+
+    print(f'{"":<54} {"uncached":-^30} {"cached":-^30}')
+    print(f'{"program":<40} {"blocks":>6} {"errors":>6}' + f' {"per block":>10} {"batch":>10} {"speedup":>8}' * 2)
+    totals = [0, 0, 0.0, 0.0, 0.0, 0.0]
+    for path, blocks in zip(sorted(glob.glob(os.path.join(args.results_dir, '*.lp'))), programs):
+        blocks = blocks * args.scale
+        seconds = []
+        for cached in (False, True):
+            expected, per_block_seconds = best_time(per_block, blocks, args.runs, cached)
+            errors, batch_seconds = best_time(utils.check_syntax_of_statement_blocks, blocks, args.runs, cached)
+            if errors != expected:
+                raise AssertionError(f'Batch check differs from per-block check for {path}')
+            seconds += [per_block_seconds, batch_seconds]
+
+        error_count = sum(1 for error in errors if error)
+        totals = [totals[0] + len(blocks), totals[1] + error_count] + [total + second for total, second in zip(totals[2:], seconds)]
+        row(os.path.basename(path), len(blocks), error_count, seconds)
+
+    row('total', totals[0], totals[1], totals[2:])
+    utils.configure_syntax_cache(maxsize=utils.SYNTAX_CACHE_SIZE, program_maxsize=utils.PROGRAM_SYNTAX_CACHE_SIZE)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,4 @@
-"""Module-level CSV logger (convenience API).
+"""CSV (and optionally SQLite) metrics logger.
 
 Usage:
     from utils import logger
@@ -6,119 +6,289 @@ Usage:
                        model='gpt-4', temperature=0.2, top_p=1.0, seed=42)
     logger.log('generation_type', fix_attempt_count=1, correct_syntax=True)
 
+    # Also store the rows in SQLite, with aggregate queries (see utils.metrics_store)
+    logger.init_logger('path/to/log.csv', problem_ID='prob1', store='path/to/metrics.sqlite')
+
+    # Several problems concurrently in one process: every run has its own context
+    with logger.start_run('prob1', max_fix_attempts=3, model='gpt-4'):
+        scheduler.full_ASP_program(...)   # logger.log() calls in this thread (and its executors) go to this run
+
 - filename is a path (directories will be created if needed).
-- init_logger resets an internal statement_block counter (starts at 1).
+- Every run (init_logger or start_run) has its own statement_block counter (starts at 1) and time stamp.
 - CSV header:
     datetimestamp, max_fix_attempts (k), problem_ID, generation_type, model, temperature, top_p, seed, statement_block, fix_attempt_count, correct_syntax
 
-This module exposes only init_logger and log.
+Rows are buffered in memory and appended by a background thread when the buffer is full or every flush_interval
+seconds (and at exit). Call logger.flush() before reading the CSV. Appends lock the file (fcntl), so several processes
+can log to the same CSV.
 """
 from __future__ import annotations
 
+import atexit
+import contextvars
 import csv
+import io
 import os
+import threading
+import weakref
 from datetime import datetime
 from typing import Optional
 
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within one process
+    fcntl = None
+
+
+HEADER = ['datetimestamp', 'max_fix_attempts (k)', 'problem_ID', 'generation_type', 'model', 'temperature', 'top_p', 'seed', 'statement_block', 'fix_attempt_count', 'correct_syntax']
+
+# Number of buffered rows that triggers a flush, and the maximum time rows stay in the buffer
+BUFFER_SIZE = 256
+FLUSH_INTERVAL = 1.0
+
+# The run of the current thread or task (see Metrics_Run.__enter__); copied into executors with contextvars.copy_context
+_current_run: contextvars.ContextVar = contextvars.ContextVar('metrics_run', default=None)
+
+# Loggers flushed at exit
+_loggers = weakref.WeakSet()
+
+
+def _to_int(value, default=None):
+    try:
+        return int(value) if value is not None else default
+    except Exception:
+        return default
+
+
+def _to_float(value):
+    try:
+        return float(value) if value is not None else None
+    except Exception:
+        return None
+
+
+class Metrics_Run():
+    """
+    Context of one run (one problem with one set of settings): its metadata, time stamp and statement_block counter.
+    Entering the run makes it the target of logger.log() in the current thread and in work submitted to executors
+    with a copy of the current context.
+    """
+
+    def __init__(self, metrics_logger, problem_ID, max_fix_attempts=0, model=None, temperature=None, top_p=None, seed=None):
+        self.logger = metrics_logger
+        self.problem_ID = problem_ID
+        self.time_stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.max_fix_attempts = _to_int(max_fix_attempts, default=0)
+        self.model = str(model) if model is not None else None
+        self.temperature = _to_float(temperature)
+        self.top_p = _to_float(top_p)
+        self.seed = _to_int(seed)
+        self.statement_block = 1
+        self._lock = threading.Lock()
+        self._tokens = []
 
-# Module state
-_folder: Optional[str] = None
-_filename: Optional[str] = None
-_filepath: Optional[str] = None
-_problem_ID: Optional[str] = None
-_time_stamp: Optional[str] = None
-_max_fix_attempts: int = 0
-_statement_block: int = 1
+    def __enter__(self):
+        self._tokens.append(_current_run.set(self))
+        return self
 
+    def __exit__(self, *exc):
+        _current_run.reset(self._tokens.pop())
 
-def _ensure_header():
-    """Ensure the CSV exists and has the expected header. This does not attempt migration.
-    If the file exists but has a different header, it will be left as-is and rows will be appended.
+    def row(self, generation_type, fix_attempt_count, correct_syntax):
+        """Return the next CSV row of this run (and advance the statement_block counter)."""
+        with self._lock:
+            statement_block = self.statement_block
+            self.statement_block += 1
+        # None is written as an empty string for CSV cleanliness
+        return [self.time_stamp, self.max_fix_attempts, self.problem_ID, generation_type if generation_type is not None else '',
+                self.model if self.model is not None else '', self.temperature if self.temperature is not None else '',
+                self.top_p if self.top_p is not None else '', self.seed if self.seed is not None else '',
+                statement_block, fix_attempt_count, 1 if correct_syntax else 0]
+
+    def log(self, generation_type: str, fix_attempt_count: int = 0, correct_syntax: bool = False) -> None:
+        self.logger.append(self.row(generation_type, fix_attempt_count, correct_syntax))
+
+
+class Metrics_Logger():
+    """
+    Buffered CSV logger for one metrics file, shared by any number of runs and threads.
+
+    Args:
+        filename (str): Path of the CSV file (parent folders are created), or None to only write to the store.
+        buffer_size (int, optional): Number of buffered rows that triggers a flush. Defaults to BUFFER_SIZE.
+        flush_interval (float, optional): Seconds between flushes of the background thread. Defaults to FLUSH_INTERVAL.
+        store (str or Metrics_Store, optional): SQLite metrics store (or its path) the rows are also written to.
     """
-    if _filepath is None:
-        return
-    
-    expected_header = ['datetimestamp', 'max_fix_attempts (k)', 'problem_ID', 'generation_type', 'model', 'temperature', 'top_p', 'seed', 'statement_block', 'fix_attempt_count', 'correct_syntax']
-    if not os.path.exists(_filepath) or os.path.getsize(_filepath) == 0:
-        parent = os.path.dirname(_filepath)
-        if parent:
-            os.makedirs(parent, exist_ok=True)
-        with open(_filepath, 'w', newline='', encoding='utf-8') as fh:
-            writer = csv.writer(fh)
-            writer.writerow(expected_header)
 
+    def __init__(self, filename: str | None, buffer_size: int = BUFFER_SIZE, flush_interval: float = FLUSH_INTERVAL, store=None):
+        if filename is None and store is None:
+            raise ValueError('A metrics logger needs a filename, a store or both')
+        self.filepath = os.path.abspath(filename) if filename is not None else None
+        if isinstance(store, (str, os.PathLike)):
+            from utils.metrics_store import Metrics_Store
+            store = Metrics_Store(store)
+        self.store = store
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._rows = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._flusher = None
+        self._pid = os.getpid()
+        self.closed = False
 
-def init_logger(filename: str, problem_ID: str, max_fix_attempts: int = 0, *, model: str | None = None, temperature: float | None = None, top_p: float | None = None, seed: int | None = None) -> None:
-    """Initialize module-level logger state.
+        if self.filepath is not None:
+            parent = os.path.dirname(self.filepath)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            self._write([])
+        _loggers.add(self)
+
+    def run(self, problem_ID: str, max_fix_attempts: int = 0, *, model: str | None = None, temperature: float | None = None, top_p: float | None = None, seed: int | None = None) -> Metrics_Run:
+        """Create the context of a new run logging to this file."""
+        return Metrics_Run(self, problem_ID, max_fix_attempts, model=model, temperature=temperature, top_p=top_p, seed=seed)
+
+    def append(self, row: list) -> None:
+        """Buffer one row; the background thread appends it to the CSV."""
+        if os.getpid() != self._pid:
+            self._after_fork()
+        with self._lock:
+            self._rows.append(row)
+            full = len(self._rows) >= self.buffer_size
+            if self._flusher is None and not self.closed:
+                self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flusher', daemon=True)
+                self._flusher.start()
+        if full:
+            self._wakeup.set()
+        if self.closed:
+            self.flush()
+
+    def flush(self) -> None:
+        """Append all buffered rows to the CSV."""
+        with self._write_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+            if rows:
+                if self.filepath is not None:
+                    self._write(rows)
+                if self.store is not None:
+                    self.store.insert_rows(rows)
+
+    def close(self) -> None:
+        """Stop the background thread and flush the remaining rows."""
+        with self._lock:
+            self.closed = True
+            flusher, self._flusher = self._flusher, None
+        self._wakeup.set()
+        if flusher is not None and flusher is not threading.current_thread():
+            flusher.join()
+        self.flush()
+
+    def _flush_loop(self):
+        while not self.closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _after_fork(self):
+        # The buffer belongs to the parent process (which flushes it), and the flusher thread did not survive the fork
+        with self._lock:
+            self._pid = os.getpid()
+            self._rows = []
+            self._flusher = None
+
+    def _write(self, rows):
+        """Append rows (and the header, if the file is empty) while holding a lock on the file."""
+        with open(self.filepath, 'a', newline='', encoding='utf-8') as fh:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                text = io.StringIO()
+                writer = csv.writer(text)
+                # Check the size under the lock, so only one process writes the header
+                if fh.seek(0, os.SEEK_END) == 0:
+                    writer.writerow(HEADER)
+                writer.writerows(rows)
+                fh.write(text.getvalue())
+                fh.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+@atexit.register
+def _flush_all():
+    for metrics_logger in list(_loggers):
+        metrics_logger.close()
+
+
+# Module state of the convenience API
+_default_logger: Optional[Metrics_Logger] = None
+_default_run: Optional[Metrics_Run] = None
+_lock = threading.Lock()
+
+
+def get_logger(filename: str | None = None, store: str | None = None) -> Optional[Metrics_Logger]:
+    """Return the logger of the convenience API (for a new filename or store, the previous logger is flushed and replaced)."""
+    global _default_logger
+    with _lock:
+        if filename is None and store is None:
+            return _default_logger
+        filepath = os.path.abspath(filename) if filename is not None else None
+        store_path = os.path.abspath(store) if store is not None else None
+        current_store_path = _default_logger.store.path if _default_logger is not None and _default_logger.store is not None else None
+        if _default_logger is None or _default_logger.filepath != filepath or current_store_path != store_path:
+            if _default_logger is not None:
+                _default_logger.close()
+            _default_logger = Metrics_Logger(filename, store=store)
+        return _default_logger
+
+
+def init_logger(filename: str | None, problem_ID: str, max_fix_attempts: int = 0, *, model: str | None = None, temperature: float | None = None, top_p: float | None = None, seed: int | None = None, store: str | None = None) -> None:
+    """Initialize the default run of the convenience API.
 
     - filename: path to the CSV file (can include directories). Parent folder will be created automatically.
+      None to only write to the store.
     - problem_ID: identifier for the problem
     - max_fix_attempts: integer k (default 0)
+    - store: optional path of a SQLite metrics store the rows are also written to (see utils.metrics_store)
     """
-    global _folder, _filename, _filepath, _problem_ID, _time_stamp, _max_fix_attempts, _statement_block
-    # New optional module-level metadata
-    global _model, _temperature, _top_p, _seed
-
-    _filename = filename
-    # compute absolute path for clarity
-    _filepath = os.path.abspath(_filename)
-    _folder = os.path.dirname(_filepath)
-    _problem_ID = problem_ID
-    _time_stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    try:
-        _max_fix_attempts = int(max_fix_attempts)
-    except Exception:
-        _max_fix_attempts = 0
+    global _default_run
+    _default_run = get_logger(filename, store=store).run(problem_ID, max_fix_attempts, model=model, temperature=temperature, top_p=top_p, seed=seed)
 
-    _statement_block = 1
 
-    # store optional metadata for inclusion in each row
-    _model = str(model) if model is not None else None
-    try:
-        _temperature = float(temperature) if temperature is not None else None
-    except Exception:
-        _temperature = None
-    try:
-        _top_p = float(top_p) if top_p is not None else None
-    except Exception:
-        _top_p = None
-    try:
-        _seed = int(seed) if seed is not None else None
-    except Exception:
-        _seed = None
+def start_run(problem_ID: str, max_fix_attempts: int = 0, *, filename: str | None = None, model: str | None = None, temperature: float | None = None, top_p: float | None = None, seed: int | None = None, store: str | None = None) -> Metrics_Run:
+    """Create a run to use as a context manager, logging to filename and/or store (default: those of init_logger)."""
+    metrics_logger = get_logger(filename, store=store)
+    if metrics_logger is None:
+        raise RuntimeError('start_run needs a filename when init_logger has not been called')
+    return metrics_logger.run(problem_ID, max_fix_attempts, model=model, temperature=temperature, top_p=top_p, seed=seed)
 
-    _ensure_header()
+
+def current_run() -> Optional[Metrics_Run]:
+    """The run logged to by log(): the entered run of this context, otherwise the run of init_logger."""
+    return _current_run.get() or _default_run
 
 
 def time_stamp() -> Optional[str]:
-    return _time_stamp
+    run = current_run()
+    return run.time_stamp if run is not None else None
 
 
 def log(generation_type: str, fix_attempt_count: int = 0, correct_syntax: bool = False) -> None:
-    """Append a single CSV row using the module-level logger state.
+    """Log a single CSV row to the current run.
 
     If the logger hasn't been initialized, prints a message and does nothing.
     """
-    global _statement_block
-    if _filepath is None or _problem_ID is None or _time_stamp is None:
+    run = current_run()
+    if run is None:
         print("PLEASE FIRST CALL init_logger(folder, filename, problem_ID). The logger must be initialized before logging.")
         return
+    run.log(generation_type, fix_attempt_count=fix_attempt_count, correct_syntax=correct_syntax)
 
-    correct_val = 1 if correct_syntax else 0
-    # Use stored metadata values; if None, write empty string for CSV cleanliness
-    model_val = _model if '_model' in globals() and _model is not None else ''
-    temp_val = _temperature if '_temperature' in globals() and _temperature is not None else ''
-    top_p_val = _top_p if '_top_p' in globals() and _top_p is not None else ''
-    seed_val = _seed if '_seed' in globals() and _seed is not None else ''
-    # generation_type is mandatory (string). Use empty string only if somehow None provided.
-    gen_val = generation_type if generation_type is not None else ''
-
-    # Ordering with generation_type after problem_ID (per request)
-    # datetimestamp, max_fix_attempts (k), problem_ID, generation_type, model, temperature, top_p, seed, statement_block, fix_attempt_count, correct_syntax
-    row = [_time_stamp, _max_fix_attempts, _problem_ID, gen_val, model_val, temp_val, top_p_val, seed_val, _statement_block, fix_attempt_count, correct_val]
-
-    with open(_filepath, 'a', newline='', encoding='utf-8') as fh:
-        writer = csv.writer(fh)
-        writer.writerow(row)
 
-    _statement_block += 1
+def flush() -> None:
+    """Append all buffered rows to their CSV files."""
+    for metrics_logger in list(_loggers):
+        metrics_logger.flush()
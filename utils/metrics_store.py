@@ -0,0 +1,280 @@
+"""SQLite store of the statement block metrics, with incrementally maintained aggregates.
+
+Every row of the metrics CSV (see utils.logger) is stored in the metrics table, indexed on problem_ID, model, k and the
+time stamp of the run. In the same transaction, the rows are added to two small aggregate tables per (problem_ID,
+model, k, generation_type): the number of blocks, correct blocks and fix attempts, and the number of blocks per fix
+attempt count. The aggregate queries only read those tables, so they stay fast on millions of rows.
+
+A row is identified by its run (time stamp, problem_ID, model, k, temperature, top_p, seed), generation_type and
+statement_block. Rows that are already stored are skipped (and not counted in the aggregates again), so a CSV can be
+imported more than once, also when its rows were already logged with store=.
+
+The store is safe to use from several threads (one connection per thread) and several processes (SQLite WAL mode with
+a busy timeout).
+
+Usage:
+    from utils import logger
+    logger.init_logger('metrics/metrics.csv', problem_ID='prob1', max_fix_attempts=3, store='metrics/metrics.sqlite')
+
+    from utils.metrics_store import Metrics_Store
+    store = Metrics_Store('metrics/metrics.sqlite')
+    store.syntax_correct_rate(by=('problem_ID', 'model', 'k'))
+    store.mean_fix_attempts(by=('model',), problem_ID='nurse_scheduling')
+    store.fix_attempt_distribution(by=('model', 'k'))
+
+    # Import an existing CSV (from the repository root)
+    python -m utils.metrics_store metrics/metrics.sqlite --import metrics/metrics.csv
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import threading
+from collections import Counter
+
+# Columns of the metrics CSV (see utils.logger.HEADER) and of the metrics table
+COLUMNS = ['datetimestamp', 'k', 'problem_ID', 'generation_type', 'model', 'temperature', 'top_p', 'seed', 'statement_block', 'fix_attempt_count', 'correct_syntax']
+
+# Columns the aggregates can be grouped and filtered by
+GROUP_COLUMNS = ('problem_ID', 'model', 'k', 'generation_type')
+
+# Columns identifying a row (unique in the metrics table). Empty values are compared as equal.
+KEY_COLUMNS = ('datetimestamp', 'problem_ID', 'model', 'k', 'generation_type', 'temperature', 'top_p', 'seed', 'statement_block')
+
+
+def _none_if_empty(value, cast):
+    if value is None or value == '':
+        return None
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_row(row):
+    """Convert a CSV row (a list in the order of COLUMNS, values may be strings) to the types of the metrics table."""
+    datetimestamp, k, problem_ID, generation_type, model, temperature, top_p, seed, statement_block, fix_attempt_count, correct_syntax = row
+    return (str(datetimestamp), _none_if_empty(k, int) or 0, str(problem_ID), str(generation_type or ''), str(model or ''),
+            _none_if_empty(temperature, float), _none_if_empty(top_p, float), _none_if_empty(seed, int),
+            _none_if_empty(statement_block, int), _none_if_empty(fix_attempt_count, int) or 0,
+            1 if str(correct_syntax) in ('1', 'True', 'true') else 0)
+
+
+# Statement block metrics in SQLite, with aggregates per (problem_ID, model, k, generation_type) maintained on insert
+class Metrics_Store():
+    def __init__(self, path='metrics/metrics.sqlite'):
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+
+        connection = self._connection()
+        with connection:
+            connection.execute('''CREATE TABLE IF NOT EXISTS metrics (
+                id INTEGER PRIMARY KEY,
+                datetimestamp TEXT NOT NULL,
+                k INTEGER NOT NULL,
+                problem_ID TEXT NOT NULL,
+                generation_type TEXT NOT NULL,
+                model TEXT NOT NULL,
+                temperature REAL,
+                top_p REAL,
+                seed INTEGER,
+                statement_block INTEGER,
+                fix_attempt_count INTEGER NOT NULL,
+                correct_syntax INTEGER NOT NULL
+            )''')
+            for column in ('problem_ID', 'model', 'k', 'datetimestamp'):
+                connection.execute(f'CREATE INDEX IF NOT EXISTS metrics_{column} ON metrics ({column})')
+            connection.execute('CREATE INDEX IF NOT EXISTS metrics_problem_model_k ON metrics (problem_ID, model, k)')
+
+            # Stores created before rows were unique can hold duplicates, which are removed before adding the index
+            key = ', '.join(f"IFNULL({column}, '')" for column in KEY_COLUMNS)
+            duplicates = 0
+            if connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'metrics_key'").fetchone() is None:
+                duplicates = connection.execute(f'DELETE FROM metrics WHERE id NOT IN (SELECT MIN(id) FROM metrics GROUP BY {key})').rowcount
+                connection.execute(f'CREATE UNIQUE INDEX metrics_key ON metrics ({key})')
+
+            # Aggregates, updated with every insert
+            connection.execute('''CREATE TABLE IF NOT EXISTS metrics_summary (
+                problem_ID TEXT NOT NULL,
+                model TEXT NOT NULL,
+                k INTEGER NOT NULL,
+                generation_type TEXT NOT NULL,
+                blocks INTEGER NOT NULL,
+                correct INTEGER NOT NULL,
+                fix_attempts INTEGER NOT NULL,
+                PRIMARY KEY (problem_ID, model, k, generation_type)
+            )''')
+            connection.execute('''CREATE TABLE IF NOT EXISTS fix_attempt_histogram (
+                problem_ID TEXT NOT NULL,
+                model TEXT NOT NULL,
+                k INTEGER NOT NULL,
+                generation_type TEXT NOT NULL,
+                fix_attempt_count INTEGER NOT NULL,
+                correct_syntax INTEGER NOT NULL,
+                blocks INTEGER NOT NULL,
+                PRIMARY KEY (problem_ID, model, k, generation_type, fix_attempt_count, correct_syntax)
+            )''')
+        if duplicates:
+            self.rebuild_aggregates()
+
+    # Each thread gets its own connection, as SQLite connections can not be shared between threads
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def insert_rows(self, rows):
+        """
+        Store metrics rows (lists in the order of COLUMNS, as written to the CSV) and update the aggregates.
+
+        Rows that are already stored (see KEY_COLUMNS) are skipped. Returns the number of stored rows.
+        """
+        rows = [normalize_row(row) for row in rows]
+        if not rows:
+            return 0
+
+        connection = self._connection()
+        with connection:
+            insert = f'INSERT OR IGNORE INTO metrics ({", ".join(COLUMNS)}) VALUES ({", ".join("?" * len(COLUMNS))})'
+            inserted = [row for row in rows if connection.execute(insert, row).rowcount]
+
+            # Aggregate the inserted rows first, so every group is updated once per insert
+            summary = {}
+            histogram = Counter()
+            for _, k, problem_ID, generation_type, model, _, _, _, _, fix_attempt_count, correct_syntax in inserted:
+                group = (problem_ID, model, k, generation_type)
+                totals = summary.setdefault(group, [0, 0, 0])
+                totals[0] += 1
+                totals[1] += correct_syntax
+                totals[2] += fix_attempt_count
+                histogram[group + (fix_attempt_count, correct_syntax)] += 1
+
+            connection.executemany('''INSERT INTO metrics_summary (problem_ID, model, k, generation_type, blocks, correct, fix_attempts)
+                                      VALUES (?, ?, ?, ?, ?, ?, ?)
+                                      ON CONFLICT (problem_ID, model, k, generation_type) DO UPDATE SET
+                                          blocks = blocks + excluded.blocks,
+                                          correct = correct + excluded.correct,
+                                          fix_attempts = fix_attempts + excluded.fix_attempts''',
+                                   [group + tuple(totals) for group, totals in summary.items()])
+            connection.executemany('''INSERT INTO fix_attempt_histogram (problem_ID, model, k, generation_type, fix_attempt_count, correct_syntax, blocks)
+                                      VALUES (?, ?, ?, ?, ?, ?, ?)
+                                      ON CONFLICT (problem_ID, model, k, generation_type, fix_attempt_count, correct_syntax) DO UPDATE SET
+                                          blocks = blocks + excluded.blocks''',
+                                   [key + (count,) for key, count in histogram.items()])
+        return len(inserted)
+
+    def import_csv(self, path):
+        """Store the rows of a metrics CSV that are not stored yet. Returns the number of rows in the CSV and the number of stored rows."""
+        with open(path, newline='', encoding='utf-8') as file:
+            reader = csv.reader(file)
+            next(reader, None)
+            rows = [row for row in reader if len(row) == len(COLUMNS)]
+        return len(rows), self.insert_rows(rows)
+
+    def rebuild_aggregates(self):
+        """Recompute the aggregate tables from the metrics table (e.g. after deleting rows)."""
+        connection = self._connection()
+        with connection:
+            connection.execute('DELETE FROM metrics_summary')
+            connection.execute('DELETE FROM fix_attempt_histogram')
+            connection.execute('''INSERT INTO metrics_summary
+                                  SELECT problem_ID, model, k, generation_type, COUNT(*), SUM(correct_syntax), SUM(fix_attempt_count)
+                                  FROM metrics GROUP BY problem_ID, model, k, generation_type''')
+            connection.execute('''INSERT INTO fix_attempt_histogram
+                                  SELECT problem_ID, model, k, generation_type, fix_attempt_count, correct_syntax, COUNT(*)
+                                  FROM metrics GROUP BY problem_ID, model, k, generation_type, fix_attempt_count, correct_syntax''')
+
+    def _group_query(self, table, select, by, filters, extra_by=(), filter_columns=GROUP_COLUMNS):
+        by = tuple(by)
+        for column in by:
+            if column not in GROUP_COLUMNS:
+                raise ValueError(f'Can only group by {", ".join(GROUP_COLUMNS)}, not {column}')
+        for column in filters:
+            if column not in filter_columns:
+                raise ValueError(f'Can only filter by {", ".join(filter_columns)}, not {column}')
+        where = ' AND '.join(f'{column} = ?' for column in filters)
+        group_by = ', '.join(by + tuple(extra_by))
+        query = f'SELECT {", ".join(by + tuple(extra_by) + (select,))} FROM {table}'
+        if where:
+            query += f' WHERE {where}'
+        if group_by:
+            query += f' GROUP BY {group_by} ORDER BY {group_by}'
+        return self._connection().execute(query, tuple(filters.values())).fetchall()
+
+    def syntax_correct_rate(self, by=('problem_ID', 'model', 'k'), **filters):
+        """
+        Fraction of statement blocks with correct syntax (after repairs) per group.
+
+        Args:
+            by (tuple, optional): Columns to group by (problem_ID, model, k and/or generation_type).
+            **filters: Only count blocks with these values, e.g. model='Qwen2.5-7B-Instruct'.
+
+        Returns:
+            list: One dict per group with the group columns, blocks, correct and correct_rate.
+        """
+        rows = self._group_query('metrics_summary', 'SUM(blocks), SUM(correct)', by, filters)
+        return [dict(zip(by, row[:len(by)]), blocks=row[-2], correct=row[-1], correct_rate=row[-1] / row[-2] if row[-2] else 0.0)
+                for row in rows if row[-2]]
+
+    def mean_fix_attempts(self, by=('problem_ID', 'model', 'k'), **filters):
+        """Mean number of fix attempts per statement block per group (see syntax_correct_rate for the arguments)."""
+        rows = self._group_query('metrics_summary', 'SUM(blocks), SUM(fix_attempts)', by, filters)
+        return [dict(zip(by, row[:len(by)]), blocks=row[-2], fix_attempts=row[-1], mean_fix_attempts=row[-1] / row[-2] if row[-2] else 0.0)
+                for row in rows if row[-2]]
+
+    def fix_attempt_distribution(self, by=('problem_ID', 'model', 'k'), correct_syntax=None, **filters):
+        """
+        Number of statement blocks per fix attempt count per group.
+
+        Args:
+            correct_syntax (bool, optional): Only count blocks that did (True) or did not (False) end up correct.
+
+        Returns:
+            list: One dict per group with the group columns and distribution ({fix_attempt_count: blocks}).
+        """
+        by = tuple(by)
+        if correct_syntax is not None:
+            filters['correct_syntax'] = 1 if correct_syntax else 0
+        rows = self._group_query('fix_attempt_histogram', 'SUM(blocks)', by, filters, extra_by=('fix_attempt_count',),
+                                 filter_columns=GROUP_COLUMNS + ('correct_syntax',))
+
+        groups = {}
+        for row in rows:
+            groups.setdefault(row[:len(by)], {})[row[len(by)]] = row[-1]
+        return [dict(zip(by, group), distribution=distribution) for group, distribution in groups.items()]
+
+    def count(self):
+        """Number of stored statement block rows."""
+        return self._connection().execute('SELECT COUNT(*) FROM metrics').fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import metrics CSVs into a metrics store and print the aggregates.')
+    parser.add_argument('path', help='SQLite file of the store')
+    parser.add_argument('--import', dest='imports', nargs='*', default=[], help='metrics CSVs to import first')
+    parser.add_argument('--by', nargs='+', default=['problem_ID', 'model', 'k'], choices=GROUP_COLUMNS, help='columns to group by')
+    args = parser.parse_args()
+
+    store = Metrics_Store(args.path)
+    for path in args.imports:
+        rows, stored = store.import_csv(path)
+        print(f'Imported {stored} of {rows} rows from {path} ({rows - stored} already stored)')
+
+    rates = store.syntax_correct_rate(by=args.by)
+    attempts = {tuple(row[column] for column in args.by): row['mean_fix_attempts'] for row in store.mean_fix_attempts(by=args.by)}
+    print(f'{" / ".join(args.by):<60} {"blocks":>8} {"correct":>8} {"fix attempts":>13}')
+    for row in rates:
+        group = tuple(row[column] for column in args.by)
+        print(f'{" / ".join(str(value) for value in group):<60} {row["blocks"]:>8} {row["correct_rate"]:>8.1%} {attempts[group]:>13.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Stress test of concurrent syntax checks.
+
+Runs hundreds of check_syntax calls in parallel from threads and from processes. Every program has its own predicate
+names and its syntax error on its own line, so any cross-talk between checks (like two runs sharing one temporary
+file) shows up as a wrong line, code or message.
+
+Usage (from the repository root):
+    python -m utils.stress_check_syntax [--checks 500] [--threads 32] [--processes 8]
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import utils.utils as utils
+
+
+def make_program(i):
+    """Return a program (as lines) with one syntax error, and the line number of that error."""
+    lines = [f'% Program {i}']
+    lines += [f'p{i}({n}).' for n in range(i % 40)]
+    lines.append(f'q{i}(X) :- r{i}(X),.')
+    lines += [f's{i}(X) :- p{i}(X).' for _ in range(i % 7)]
+    return lines, 2 + i % 40
+
+
+def check(i):
+    """Check program i and return a description of what went wrong (None if the result is correct)."""
+    lines, error_line = make_program(i)
+
+    errors = utils.check_syntax(lines, filename=f'program_{i}.lp')
+    if len(errors) != 1:
+        return f'program {i}: expected 1 error, got {len(errors)}'
+    error = errors[0]
+    if error['line_number'] != error_line or error['code'] != f'q{i}(X) :- r{i}(X),.':
+        return f'program {i}: error reported for line {error["line_number"]} ({error["code"]!r})'
+    if not error['message'].startswith(f'program_{i}.lp:{error_line}:'):
+        return f'program {i}: unexpected message {error["message"]!r}'
+
+    # The valid part of the program must not report errors
+    if utils.check_syntax(lines[:error_line - 1] + lines[error_line:]):
+        return f'program {i}: errors reported for the valid program'
+    if not utils.check_syntax_of_one_string(lines[error_line - 1]):
+        return f'program {i}: check_syntax_of_one_string missed the error'
+    return None
+
+
+def run(executor_class, workers, checks):
+    start = time.perf_counter()
+    with executor_class(max_workers=workers) as executor:
+        failures = [failure for failure in executor.map(check, range(checks)) if failure is not None]
+    return failures, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--checks', type=int, default=500, help='number of programs checked per executor')
+    parser.add_argument('--threads', type=int, default=32, help='number of threads')
+    parser.add_argument('--processes', type=int, default=8, help='number of processes')
+    args = parser.parse_args()
+
+    ok = True
+    for name, executor_class, workers in [('threads', ThreadPoolExecutor, args.threads), ('processes', ProcessPoolExecutor, args.processes)]:
+        failures, seconds = run(executor_class, workers, args.checks)
+        print(f'{name:<10}: {args.checks} checks with {workers} workers in {seconds:.2f} s, {len(failures)} failures')
+        for failure in failures[:10]:
+            print(f'  {failure}')
+        ok = ok and not failures
+
+    print('Stress test: OK' if ok else 'Stress test: FAILED')
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
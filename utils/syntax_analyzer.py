@@ -0,0 +1,299 @@
+"""Bulk syntax analysis of generated ASP programs.
+
+Walks directories of generated programs (e.g. Results/), checks every file with utils.check_syntax in a pool of worker
+processes (see utils.syntax_workers), streams one JSON record per file and aggregates an error taxonomy: the number of
+errors per message class, problem, model and k. The problem, model and k are read from the file name, as written by the
+scheduler notebooks ("<problem>_<model>_k=<k>_<date>_<time>.lp"), or from the names of the original results
+("CTLlama8B", "ETBaselineDeepseek", ...).
+
+A state file remembers the size, modification time and hash of every checked file, so files that did not change since
+the last scan are not checked again (their previous results are still counted in the taxonomy).
+
+Usage (from the repository root):
+    python -m utils.syntax_analyzer Results [--pattern '*.lp' --pattern '*'] [--output errors.jsonl] [--taxonomy taxonomy.csv]
+"""
+import argparse
+import csv
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils import auto_fixer
+from utils import syntax_workers
+
+# Version of the records in the state file; records of other versions are checked again
+STATE_VERSION = 1
+STATE_FILENAME = '.syntax_analysis_state.json'
+
+# "<problem>_<model>_k=<k>_<date>_<time>.lp"; problems may contain underscores, model names do not
+RESULT_FILENAME = re.compile(r'^(?P<problem>.+)_(?P<model>[^_]+)_k=(?P<k>\d+)(?:_(?P<timestamp>\d{8}_\d{6}))?$')
+
+# Problem codes of the original results ("CTLlama8B", "ETBaselineDeepseek", ...)
+LEGACY_PROBLEMS = {
+    'CT': 'curriculum_based_course_timetabling',
+    'ET': 'examination_timetabling',
+    'NS': 'nurse_scheduling',
+    'SS': 'sports scheduling',
+}
+
+# Separator lines in the original results, which are not part of the program
+SEPARATOR_LINE = 'FULL PROGRAM'
+
+LOCATION = re.compile(r'^.*?:\d+:\d+(?:-\d+(?::\d+)?)?:\s*')
+
+
+def parse_result_filename(path: str) -> dict:
+    """
+    Read the problem, model and k of a generated program from its file name.
+
+    Args:
+        path (str): Path of the program.
+
+    Returns:
+        dict: problem, model and k (an int, or None if unknown). Unknown problems and models are None.
+    """
+    name = os.path.basename(path)
+    stem = name[:-3] if name.endswith('.lp') else name
+
+    match = RESULT_FILENAME.match(stem)
+    if match:
+        return {'problem': match.group('problem'), 'model': match.group('model'), 'k': int(match.group('k'))}
+    if stem[:2] in LEGACY_PROBLEMS and len(stem) > 2:
+        return {'problem': LEGACY_PROBLEMS[stem[:2]], 'model': stem[2:], 'k': None}
+    return {'problem': None, 'model': None, 'k': None}
+
+
+def error_class(message: str) -> str:
+    """
+    Class of a Clingo error message for the taxonomy, e.g. "syntax error, unexpected =". The location and the
+    (varying) list of expected tokens are left out.
+    """
+    info = auto_fixer.classify_syntax_error(message)
+    if info['kind'] in ('syntax', 'lexer'):
+        if info['unexpected']:
+            return f"{info['kind']} error, unexpected {info['unexpected']}"
+        return f"{info['kind']} error"
+
+    first_line = message.strip().splitlines()[0] if message.strip() else ''
+    return LOCATION.sub('', first_line) or 'unknown error'
+
+
+def iter_program_files(paths, patterns=('*.lp',)):
+    """Yield the files in the given paths (files or directories, searched recursively) matching one of the patterns."""
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(directory for directory in dirs if not directory.startswith('.'))
+            for name in sorted(files):
+                if name.startswith('.'):
+                    continue
+                if any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+                    yield os.path.join(root, name)
+
+
+class Scan_State():
+    """
+    Size, modification time, hash and record of every checked file, stored as JSON.
+
+    A file is unchanged if its size and modification time are the same as in the last scan, or if only its
+    modification time changed but its content has the same hash.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.files = {}
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as file:
+                    state = json.load(file)
+                if state.get('version') == STATE_VERSION:
+                    self.files = state.get('files', {})
+            except (OSError, ValueError):
+                self.files = {}
+        self.seen = set()
+
+    def lookup(self, key, stat, digest=None):
+        """Return the record of an unchanged file, or None."""
+        entry = self.files.get(key)
+        if entry is None or entry['size'] != stat.st_size:
+            return None
+        if entry['mtime_ns'] == stat.st_mtime_ns or (digest is not None and entry['sha256'] == digest):
+            return entry['record']
+        return None
+
+    def needs_hash(self, key, stat):
+        """Whether only the content hash can tell if the file changed."""
+        entry = self.files.get(key)
+        return entry is not None and entry['size'] == stat.st_size and entry['mtime_ns'] != stat.st_mtime_ns
+
+    def update(self, key, stat, digest, record):
+        self.files[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest, 'record': record}
+
+    def save(self):
+        """Write the state atomically, dropping files that no longer exist."""
+        if self.path is None:
+            return
+        files = {key: entry for key, entry in self.files.items() if key in self.seen or os.path.exists(key)}
+        temporary_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as file:
+            json.dump({'version': STATE_VERSION, 'files': files}, file)
+        os.replace(temporary_path, self.path)
+
+
+def read_program(path):
+    """Read a program and return its lines and the sha256 of its content. Separator lines are blanked."""
+    with open(path, 'rb') as file:
+        content = file.read()
+    lines = content.decode('utf-8', errors='replace').split('\n')
+    return ['' if SEPARATOR_LINE in line else line for line in lines], hashlib.sha256(content).hexdigest()
+
+
+def make_record(path, lines, errors, digest, seconds):
+    """The JSON record of one checked file."""
+    record = {'path': path, **parse_result_filename(path), 'lines': len(lines), 'sha256': digest,
+              'seconds': round(seconds, 4), 'error_count': len(errors), 'errors': []}
+    for error in errors:
+        record['errors'].append({'line_number': error['line_number'], 'type': error['type'],
+                                 'class': error_class(error['message']), 'message': error['message'],
+                                 'code': error['code']})
+    return record
+
+
+def analyze(paths, patterns=('*.lp',), state=None, pool=None, timeout=None):
+    """
+    Check all matching files in the given paths in parallel.
+
+    Args:
+        paths (list): Files and directories to check.
+        patterns (tuple, optional): File name patterns of the programs in the directories. Defaults to ('*.lp',).
+        state (Scan_State, optional): State of the previous scan; unchanged files are not checked again.
+        pool (Syntax_Checker_Pool, optional): Pool used for the checks. Defaults to a new pool with one worker per CPU.
+        timeout (float, optional): Seconds a file may take to check. Defaults to the timeout of the pool.
+
+    Yields:
+        tuple: (record, unchanged) per file, in the order the checks finish.
+    """
+    state = state or Scan_State()
+    own_pool = pool is None
+    pool = pool or syntax_workers.Syntax_Checker_Pool()
+
+    def check(path, key, stat, lines, digest):
+        start = time.perf_counter()
+        errors = pool.check_program(lines, filename=path, timeout=timeout)
+        return key, stat, digest, make_record(path, lines, errors, digest, time.perf_counter() - start)
+
+    try:
+        with ThreadPoolExecutor(max_workers=pool.size) as executor:
+            futures = []
+            for path in iter_program_files(paths, patterns):
+                key = os.path.abspath(path)
+                stat = os.stat(path)
+                state.seen.add(key)
+
+                record = state.lookup(key, stat)
+                if record is not None:
+                    yield record, True
+                    continue
+
+                lines, digest = read_program(path)
+                if state.needs_hash(key, stat):
+                    record = state.lookup(key, stat, digest)
+                    if record is not None:
+                        state.update(key, stat, digest, record)
+                        yield record, True
+                        continue
+                futures.append(executor.submit(check, path, key, stat, lines, digest))
+
+            for future in as_completed(futures):
+                key, stat, digest, record = future.result()
+                # Timeouts may not happen again, so those files are checked again in the next scan
+                if not any(error['type'] == 'Timeout' for error in record['errors']):
+                    state.update(key, stat, digest, record)
+                yield record, False
+    finally:
+        if own_pool:
+            pool.close()
+
+
+def build_taxonomy(records):
+    """Count the errors per (message class, problem, model, k)."""
+    taxonomy = Counter()
+    for record in records:
+        for error in record['errors']:
+            taxonomy[(error['class'], record['problem'], record['model'], record['k'])] += 1
+    return taxonomy
+
+
+def write_taxonomy(taxonomy, path):
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['class', 'problem', 'model', 'k', 'errors'])
+        for (message_class, problem, model, k), count in sorted(taxonomy.items(), key=lambda item: (-item[1], str(item[0]))):
+            writer.writerow([message_class, problem, model, k, count])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='*', default=['Results'], help='files and directories to check (default: Results)')
+    parser.add_argument('--pattern', action='append', default=None,
+                        help="file name pattern of the programs, may be repeated (default: '*.lp'; use '*' to include the original results)")
+    parser.add_argument('--output', default=None, help='JSON Lines file for the records (default: stdout)')
+    parser.add_argument('--taxonomy', default=None, help='CSV file for the error taxonomy')
+    parser.add_argument('--state', default=None, help=f'state file of the incremental scan (default: {STATE_FILENAME} in the first directory)')
+    parser.add_argument('--no-state', action='store_true', help='check all files and do not write a state file')
+    parser.add_argument('--emit-unchanged', action='store_true', help='also write the records of unchanged files')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('--timeout', type=float, default=30.0, help='seconds a file may take to check')
+    parser.add_argument('--memory-limit-mb', type=int, default=2048, help='memory limit of each worker process')
+    args = parser.parse_args()
+
+    state_path = None
+    if not args.no_state:
+        state_path = args.state
+        if state_path is None:
+            directory = next((path for path in args.paths if os.path.isdir(path)), '.')
+            state_path = os.path.join(directory, STATE_FILENAME)
+    state = Scan_State(state_path)
+
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    records = []
+    checked = 0
+    start = time.perf_counter()
+    try:
+        with syntax_workers.Syntax_Checker_Pool(workers=args.workers, timeout=args.timeout, memory_limit_mb=args.memory_limit_mb) as pool:
+            for record, unchanged in analyze(args.paths, tuple(args.pattern or ['*.lp']), state=state, pool=pool):
+                records.append(record)
+                checked += not unchanged
+                if not unchanged or args.emit_unchanged:
+                    output.write(json.dumps(record) + '\n')
+                    output.flush()
+    finally:
+        state.save()
+        if output is not sys.stdout:
+            output.close()
+
+    taxonomy = build_taxonomy(records)
+    if args.taxonomy:
+        write_taxonomy(taxonomy, args.taxonomy)
+
+    # The summary goes to stderr, so stdout stays valid JSON Lines
+    with_errors = sum(1 for record in records if record['error_count'])
+    print(f'{len(records)} files ({checked} checked, {len(records) - checked} unchanged) in {time.perf_counter() - start:.2f} s, '
+          f'{with_errors} with syntax errors, {sum(taxonomy.values())} errors', file=sys.stderr)
+    classes = Counter()
+    for (message_class, _, _, _), count in taxonomy.items():
+        classes[message_class] += count
+    for message_class, count in classes.most_common(10):
+        print(f'  {count:>6}  {message_class}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+"""Pool of long-lived syntax checker processes.
+
+Clingo parses in the calling process: it holds the GIL while calling back into Python, and a pathological input (e.g.
+a term nested a million levels deep) crashes the whole process. The Syntax_Checker_Pool runs the checks in persistent
+worker processes instead. Every worker imports clingo once and then checks batches of statement blocks or whole
+programs. A job that runs longer than the timeout, exceeds the memory limit or crashes its worker returns a structured
+error instead, and the worker is restarted.
+
+Usage:
+    from utils import syntax_workers
+    with syntax_workers.Syntax_Checker_Pool(workers=8) as pool:
+        errors = pool.check_program(lines)              # like utils.check_syntax
+        messages = pool.check_statement_blocks(blocks)  # like utils.check_syntax_of_statement_blocks
+
+    # Or let the scheduler (and the auto fixer) check all their statement blocks in the pool
+    syntax_workers.enable_syntax_worker_pool(workers=8)
+"""
+import atexit
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import utils.utils as utils
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; the memory limit is not enforced there
+    resource = None
+
+# Settings of the pool used by check_statement_blocks (see enable_syntax_worker_pool)
+SYNTAX_WORKER_POOL_ENABLED = False
+SYNTAX_WORKER_POOL_SETTINGS = {}
+
+# Start of the messages of failed jobs (Clingo's own messages start with '<string>:<line>:')
+JOB_ERROR_PREFIX = '<string>: error: '
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _worker_main(connection, memory_limit_mb):
+    """Main loop of a worker process: check jobs until the pool sends None."""
+    if memory_limit_mb and resource is not None:
+        limit = int(memory_limit_mb * 1024 * 1024)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+
+        kind, payload = job
+        try:
+            if kind == 'program':
+                program, filename = payload
+                result = utils.check_syntax(program, filename=filename)
+            elif kind == 'blocks':
+                result = utils.check_syntax_of_statement_blocks(payload)
+            else:
+                raise ValueError(f'Unknown job kind: {kind}')
+            connection.send(('ok', result))
+        except MemoryError:
+            connection.send(('error', 'MemoryError', f'memory limit of {memory_limit_mb} MB exceeded'))
+        except Exception as e:
+            connection.send(('error', type(e).__name__, str(e)))
+
+
+# Class representing one worker process and the parent's end of its pipe
+class Syntax_Worker():
+    def __init__(self, context, memory_limit_mb):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_connection, memory_limit_mb), daemon=True)
+        self.process.start()
+        child_connection.close()
+        self.jobs = 0
+
+    def stop(self, kill=False):
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+
+class Syntax_Checker_Pool():
+    """
+    Pool of persistent syntax checker processes. Safe to use from several threads: every job takes an idle worker,
+    so up to `workers` jobs run in parallel.
+
+    Args:
+        workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+        timeout (float, optional): Seconds a job may take before its worker is killed. Defaults to 30.
+        memory_limit_mb (int, optional): Address space limit of each worker in MB (None for no limit). Defaults to 2048.
+        start_method (str, optional): Multiprocessing start method. Defaults to 'spawn', so workers do not inherit the
+                                      threads and state of the parent.
+    """
+
+    def __init__(self, workers=None, timeout=30.0, memory_limit_mb=2048, start_method='spawn'):
+        self.size = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.context = multiprocessing.get_context(start_method)
+        self.idle = queue.Queue()
+        self.workers = []
+        self.lock = threading.Lock()
+        self.closed = False
+        self.counts = {'jobs': 0, 'timeouts': 0, 'crashes': 0, 'errors': 0, 'restarts': 0}
+
+        for _ in range(self.size):
+            worker = Syntax_Worker(self.context, self.memory_limit_mb)
+            self.workers.append(worker)
+            self.idle.put(worker)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Stop all workers."""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            workers = list(self.workers)
+        for worker in workers:
+            worker.stop()
+
+    def stats(self):
+        """Return the number of jobs, timeouts, crashes, job errors and worker restarts."""
+        with self.lock:
+            return dict(self.counts, workers=self.size)
+
+    def _count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def _replace(self, worker):
+        """Kill a worker and start a new one in its place."""
+        worker.stop(kill=True)
+        new_worker = Syntax_Worker(self.context, self.memory_limit_mb)
+        with self.lock:
+            self.workers[self.workers.index(worker)] = new_worker
+            self.counts['restarts'] += 1
+        return new_worker
+
+    def run(self, kind, payload, timeout=None):
+        """
+        Run one job on an idle worker.
+
+        Returns:
+            tuple: ('ok', result) or ('error', error_type, message), where error_type is 'Timeout', 'WorkerCrash',
+                   'MemoryError' or the name of the exception raised in the worker.
+        """
+        if self.closed:
+            raise RuntimeError('The syntax checker pool is closed')
+        timeout = self.timeout if timeout is None else timeout
+
+        worker = self.idle.get()
+        try:
+            self._count('jobs')
+            try:
+                worker.connection.send((kind, payload))
+                if not worker.connection.poll(timeout):
+                    self._count('timeouts')
+                    worker = self._replace(worker)
+                    return ('error', 'Timeout', f'syntax check did not finish within {timeout} seconds')
+                reply = worker.connection.recv()
+            except (EOFError, BrokenPipeError, ConnectionResetError, OSError):
+                worker.process.join(timeout=1)
+                exit_code = worker.process.exitcode
+                self._count('crashes')
+                worker = self._replace(worker)
+                return ('error', 'WorkerCrash', f'syntax checker process crashed (exit code {exit_code})')
+
+            if reply[0] == 'error':
+                self._count('errors')
+                if reply[1] == 'MemoryError':
+                    # A worker that ran out of memory may be left in a bad state
+                    worker = self._replace(worker)
+            worker.jobs += 1
+            return reply
+        finally:
+            self.idle.put(worker)
+
+    def check_program(self, program, filename='<string>', timeout=None):
+        """
+        Check a whole program in a worker, like utils.check_syntax.
+
+        Returns:
+            List[Dict]: The syntax errors. A failed job returns one error with the type 'Timeout', 'WorkerCrash',
+                        'MemoryError' (or the exception raised in the worker) and line_number None.
+        """
+        reply = self.run('program', (list(program), filename), timeout=timeout)
+        if reply[0] == 'ok':
+            return reply[1]
+        return [{'type': reply[1], 'message': f'{filename}: error: {reply[2]}', 'line_number': None, 'code': ''}]
+
+    def check_statement_blocks(self, blocks, timeout=None):
+        """
+        Check a list of statement blocks in a worker, like utils.check_syntax_of_statement_blocks.
+
+        Returns:
+            List[str]: One error message per block (empty if valid). If the job fails, the batch is bisected and the
+                       halves are checked again, so only the blocks that make a job fail on their own get its error
+                       (and no block is mistaken for valid).
+        """
+        blocks = list(blocks)
+        reply = self.run('blocks', blocks, timeout=timeout)
+        if reply[0] == 'ok':
+            return reply[1]
+
+        statements = [idx for idx, block in enumerate(blocks) if utils.check_if_block_is_program_statement(block)]
+        if len(statements) > 1:
+            # Split between the program statements, so both halves contain at least one
+            middle = statements[len(statements) // 2]
+            return self.check_statement_blocks(blocks[:middle], timeout=timeout) + self.check_statement_blocks(blocks[middle:], timeout=timeout)
+        message = f'{JOB_ERROR_PREFIX}{reply[1]}: {reply[2]}'
+        return [message if idx in statements else '' for idx in range(len(blocks))]
+
+    def map_programs(self, programs, timeout=None):
+        """Check many programs in parallel on all workers. Returns the lists of errors in the same order."""
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            return list(executor.map(lambda program: self.check_program(program, timeout=timeout), programs))
+
+    def map_statement_blocks(self, batches, timeout=None):
+        """Check many lists of statement blocks in parallel on all workers. Returns the results in the same order."""
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            return list(executor.map(lambda blocks: self.check_statement_blocks(blocks, timeout=timeout), batches))
+
+
+def enable_syntax_worker_pool(workers=None, timeout=30.0, memory_limit_mb=2048):
+    """Check the statement blocks of the scheduler in a Syntax_Checker_Pool (started on first use)."""
+    global SYNTAX_WORKER_POOL_ENABLED, SYNTAX_WORKER_POOL_SETTINGS
+    shutdown_syntax_worker_pool()
+    SYNTAX_WORKER_POOL_SETTINGS = dict(workers=workers, timeout=timeout, memory_limit_mb=memory_limit_mb)
+    SYNTAX_WORKER_POOL_ENABLED = True
+
+
+def disable_syntax_worker_pool():
+    """Check statement blocks in-process again and stop the pool."""
+    global SYNTAX_WORKER_POOL_ENABLED
+    SYNTAX_WORKER_POOL_ENABLED = False
+    shutdown_syntax_worker_pool()
+
+
+def get_syntax_worker_pool():
+    """Return the shared pool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = Syntax_Checker_Pool(**SYNTAX_WORKER_POOL_SETTINGS)
+        return _pool
+
+
+def shutdown_syntax_worker_pool():
+    """Stop the shared pool, if it was started."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+
+atexit.register(shutdown_syntax_worker_pool)
+
+
+def check_statement_blocks(blocks):
+    """
+    Check statement blocks in the shared pool if it is enabled (see enable_syntax_worker_pool), otherwise in-process.
+    Blocks found in the local syntax cache are not sent to the workers.
+
+    Returns:
+        List[str]: One error message per block (empty if valid), like utils.check_syntax_of_statement_blocks.
+    """
+    if not SYNTAX_WORKER_POOL_ENABLED:
+        return utils.check_syntax_of_statement_blocks(blocks)
+
+    errors = [utils.syntax_cache.get(block) for block in blocks]
+    missing = [idx for idx, error in enumerate(errors) if error is None]
+    if missing:
+        results = get_syntax_worker_pool().check_statement_blocks([blocks[idx] for idx in missing])
+        for idx, error in zip(missing, results):
+            errors[idx] = error
+            # Failed jobs (timeouts, crashes) are not cached
+            if not error.startswith(JOB_ERROR_PREFIX):
+                utils.syntax_cache.put(blocks[idx], error)
+    return errors
+
+
+def check_statement_block(block):
+    """
+    Check one statement block in the shared pool if it is enabled (see enable_syntax_worker_pool), otherwise
+    in-process. Used for the re-checks of repaired and auto-fixed blocks, so a block that crashes Clingo never reaches
+    the parser of the calling process.
+
+    Returns:
+        str: The error message (empty if valid), like utils.check_syntax_of_one_string.
+    """
+    if not SYNTAX_WORKER_POOL_ENABLED:
+        return utils.check_syntax_of_one_string(block)
+    return check_statement_blocks([block])[0]
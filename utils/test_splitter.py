@@ -9,6 +9,10 @@ testcases = [
     (['x.\ny.'], ['x.', 'y.']),
     (['x.\n\ny.'], ['x.', '', 'y.']),
     (['% Instance Template\nevent(_).\n\nroom(Room, Capacity).\n'], ['% Instance Template', 'event(_).', '', 'room(Room, Capacity).']),
+    (['p("a.b%c"). q.'], ['p("a.b%c").', 'q.']),
+    (['w(1.5). q.'], ['w(1.5).', 'q.']),
+    (['%* a.\nb. *%\nc.'], ['%* a.\nb. *%', 'c.']),
+    (['%* note *% a. b.'], ['%* note *% a.', 'b.']),
 ]
 
 correct = total = 0
@@ -0,0 +1,60 @@
+"""
+Regression test of the whitespace normalization of the syntax cache (run from the repository root):
+    python -m utils.test_syntax_cache
+
+A cached result must equal a fresh parse. Valid statements are cached under their normalized text, so a statement
+that only differs from a cached one in whitespace the Clingo lexer rejects must not be reported as valid.
+"""
+import utils.utils as utils
+
+CACHED = ['a :- b.', 'p(X) :- q(X),   r(X).', '% comment\nc.']
+
+# (statement, whether it is normalized to the same text as one of CACHED)
+testcases = [
+    ('a :-  b.', True),
+    ('a :-\tb.', True),
+    ('  a :- b.  \n\n', True),
+    ('p(X)   :- q(X), r(X).', True),
+    ('% comment\n\nc.', True),
+    ('a :-\x0bb.', False),
+    ('a :-\x0cb.', False),
+    ('a :-\x1cb.', False),
+    ('a :- b.\x0b', False),
+    ('\x0ca :- b.', False),
+]
+
+
+def main():
+    correct = total = 0
+
+    # Unicode whitespace is not parsed here: Clingo crashes while decoding its error message
+    for character in [' ', ' ', '　']:
+        ok = utils.normalize_statement(f'a :-{character}b.') != utils.normalize_statement('a :- b.')
+        print(f'U+{ord(character):04X} is kept by normalize_statement: {"OK" if ok else "FAILED"}')
+        correct += ok
+        total += 1
+
+    for statement, normalized_like_cached in testcases:
+        utils.configure_syntax_cache(maxsize=0)
+        fresh = utils.check_syntax_of_one_string(statement)
+
+        utils.configure_syntax_cache(maxsize=4096)
+        for cached in CACHED:
+            utils.check_syntax_of_one_string(cached)
+        result = utils.check_syntax_of_one_string(statement)
+        hit = utils.syntax_cache_stats()['statements']['hits'] > 0
+
+        ok = result == fresh and hit == normalized_like_cached
+        print(f'{statement!r}: fresh {fresh[:40]!r}, cached {result[:40]!r}, cache hit {hit}: {"OK" if ok else "FAILED"}')
+        correct += ok
+        total += 1
+
+    utils.configure_syntax_cache(maxsize=utils.SYNTAX_CACHE_SIZE)
+
+    print()
+    print(f'Test syntax cache: {correct}/{total} correct.')
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Regression test of the crash isolation of the syntax worker pool (run from the repository root):
+    python -m utils.test_syntax_workers
+
+A statement block with a term nested a million levels deep crashes Clingo. With the pool enabled, neither the batch check
+nor the re-checks of the repair loop and the auto fixer may parse it in this process, and only the crashing block may
+get the error of the failed job.
+"""
+import os
+import tempfile
+
+from ASP_Scheduler import scheduler
+from utils import logger, syntax_workers
+
+CRASHING_BLOCK = 'p(' * 1000000 + 'a' + ')' * 1000000 + '.'
+
+
+# Repair bot that always answers with the same (valid) statement
+class Fixed_Response_Bot():
+    def __init__(self, response):
+        self.response = response
+        self.prompts = 0
+
+    def fork(self):
+        return self
+
+    def prompt(self, content):
+        self.prompts += 1
+        return self.response
+
+
+def main():
+    correct = total = 0
+
+    def check(name, ok):
+        nonlocal correct, total
+        print(f'{name}: {"OK" if ok else "FAILED"}')
+        correct += bool(ok)
+        total += 1
+
+    with syntax_workers.Syntax_Checker_Pool(workers=2) as pool:
+        errors = pool.check_statement_blocks(['a.', CRASHING_BLOCK, 'b :- a.', '% comment', 'c :- d(.'])
+        check('valid blocks next to a crashing block stay valid', errors[0] == '' and errors[2] == '' and errors[3] == '')
+        check('the crashing block gets the job error', errors[1].startswith(syntax_workers.JOB_ERROR_PREFIX + 'WorkerCrash'))
+        check('syntax errors of other blocks are kept', bool(errors[4]) and not errors[4].startswith(syntax_workers.JOB_ERROR_PREFIX))
+
+    syntax_workers.enable_syntax_worker_pool(workers=2)
+    try:
+        check('single block checks go through the pool', syntax_workers.check_statement_block(CRASHING_BLOCK).startswith(syntax_workers.JOB_ERROR_PREFIX))
+
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            metrics_logger = logger.Metrics_Logger(os.path.join(metrics_dir, 'metrics.csv'))
+            with metrics_logger.run('crash_test', 1):
+                bot = Fixed_Response_Bot('q(1).')
+                blocks, total_errors = scheduler.check_and_repair_statement_blocks(['a.', CRASHING_BLOCK], 'q holds for 1', bot, k=1, generation_type='hard constraints', auto_fix=True)
+                check('crash then repair: the block is repaired in this process', blocks == ['a.', 'q(1).'] and total_errors == 0 and bot.prompts == 1)
+
+                blocks, total_errors = scheduler.check_and_repair_statement_blocks([CRASHING_BLOCK], 'p holds', Fixed_Response_Bot(CRASHING_BLOCK), k=1, generation_type='hard constraints', auto_fix=True)
+                check('crash then a crashing repair: the block stays invalid', total_errors == 1)
+            metrics_logger.close()
+
+        stats = syntax_workers.get_syntax_worker_pool().stats()
+        check('the crashed workers were restarted', stats['crashes'] >= 2 and stats['restarts'] == stats['crashes'])
+    finally:
+        syntax_workers.disable_syntax_worker_pool()
+
+    print()
+    print(f'Test syntax workers: {correct}/{total} correct.')
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+"""Span-based timing instrumentation of program generation.
+
+A span measures the wall time of one step: full_ASP_program, get_partial_program, every bot.prompt (with prompt and
+completion tokens, time to first token and provider), every syntax_check, auto_fix and repair_attempt, and the sleeps
+between remote requests. Spans nest (every span records its parent) and are tagged with the metrics run they belong
+to (see utils.logger), so one process can trace several runs at once.
+
+Tracing is disabled by default and then costs one check per instrumented call.
+
+Usage:
+    from utils import tracing
+    tracing.enable_tracing()
+    scheduler.full_ASP_program(...)
+    tracing.export_chrome_trace('trace.json')      # open in chrome://tracing or https://ui.perfetto.dev
+    tracing.write_summary_csv('trace_summary.csv')  # one row per metrics run: LLM, clingo, repair and sleep time
+"""
+import contextvars
+import csv
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from utils import logger
+
+TRACING_ENABLED = False
+
+SUMMARY_COLUMNS = ['problem_ID', 'time_stamp', 'model', 'max_fix_attempts (k)', 'wall_seconds', 'llm_calls', 'llm_seconds',
+                   'cached_llm_calls', 'estimated_prompt_tokens', 'estimated_completion_tokens', 'mean_time_to_first_token', 'syntax_checks',
+                   'syntax_check_seconds', 'auto_fix_seconds', 'repair_attempts', 'repair_seconds', 'sleep_seconds']
+
+_current_span = contextvars.ContextVar('trace_span', default=None)
+_span_ids = itertools.count(1)
+
+
+class Span():
+    """
+    One timed step. Use it as a context manager to make it the parent of the spans started inside it, or call
+    start() and finish() where the step does not fit in one block (e.g. a generator streaming a response).
+    """
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.id = next(_span_ids)
+        parent = _current_span.get()
+        self.parent_id = parent.id if parent is not None else None
+        self.run = logger.current_run()
+        self.pid = os.getpid()
+        self.thread_id = threading.get_ident()
+        self.start_time = None
+        self.end_time = None
+        self._token = None
+
+    def set(self, **attributes):
+        """Add attributes (e.g. token counts) to the span."""
+        self.attributes.update(attributes)
+        return self
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def finish(self, error=None):
+        self.end_time = time.perf_counter()
+        if error is not None:
+            self.attributes['error'] = error
+        self.tracer.record(self)
+
+    @property
+    def seconds(self):
+        return (self.end_time if self.end_time is not None else time.perf_counter()) - self.start_time
+
+    def __enter__(self):
+        self.start()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        self.finish(error=exc_type.__name__ if exc_type is not None else None)
+
+
+class _Null_Span():
+    """Span used while tracing is disabled; all methods do nothing."""
+
+    def set(self, **attributes):
+        return self
+
+    def start(self):
+        return self
+
+    def finish(self, error=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+NULL_SPAN = _Null_Span()
+
+
+class Tracer():
+    """Collects finished spans (thread-safe) and exports them."""
+
+    def __init__(self):
+        self.spans = []
+        self.lock = threading.Lock()
+        self.epoch = time.perf_counter()
+
+    def span(self, name, **attributes):
+        return Span(self, name, attributes)
+
+    def record(self, span):
+        with self.lock:
+            self.spans.append(span)
+
+    def clear(self):
+        with self.lock:
+            self.spans = []
+            self.epoch = time.perf_counter()
+
+    def finished_spans(self):
+        with self.lock:
+            return list(self.spans)
+
+    def chrome_trace(self):
+        """Return the spans as Chrome trace events (complete events, times in microseconds)."""
+        events = []
+        for span in self.finished_spans():
+            args = dict(span.attributes, span_id=span.id, parent_id=span.parent_id)
+            if span.run is not None:
+                args.update(problem_ID=span.run.problem_ID, run=span.run.time_stamp)
+            events.append({
+                'name': span.name,
+                'cat': span.name.split('.')[0],
+                'ph': 'X',
+                'ts': round((span.start_time - self.epoch) * 1e6, 1),
+                'dur': round((span.end_time - span.start_time) * 1e6, 1),
+                'pid': span.pid,
+                'tid': span.thread_id,
+                'args': args,
+            })
+        events.sort(key=lambda event: event['ts'])
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome_trace(self, path):
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.chrome_trace(), file)
+
+    def summary(self):
+        """
+        Summarize the spans per metrics run.
+
+        Returns:
+            list: One dict per run with the columns of SUMMARY_COLUMNS. Times of nested spans overlap: llm_seconds
+                  includes the prompts of repair attempts, which are also part of repair_seconds.
+        """
+        runs = defaultdict(list)
+        for span in self.finished_spans():
+            runs[span.run].append(span)
+
+        rows = []
+        for run, spans in runs.items():
+            def total(name):
+                return sum(span.seconds for span in spans if span.name == name)
+
+            prompts = [span for span in spans if span.name == 'bot.prompt']
+            first_tokens = [span.attributes['time_to_first_token'] for span in prompts if span.attributes.get('time_to_first_token') is not None]
+            rows.append({
+                'problem_ID': run.problem_ID if run is not None else '',
+                'time_stamp': run.time_stamp if run is not None else '',
+                'model': run.model if run is not None and run.model is not None else '',
+                'max_fix_attempts (k)': run.max_fix_attempts if run is not None else '',
+                'wall_seconds': round(max(span.end_time for span in spans) - min(span.start_time for span in spans), 6),
+                'llm_calls': len(prompts),
+                'llm_seconds': round(total('bot.prompt'), 6),
+                'cached_llm_calls': sum(1 for span in prompts if span.attributes.get('cached')),
+                'estimated_prompt_tokens': sum(span.attributes.get('estimated_prompt_tokens', 0) for span in prompts),
+                'estimated_completion_tokens': sum(span.attributes.get('estimated_completion_tokens', 0) for span in prompts),
+                'mean_time_to_first_token': round(sum(first_tokens) / len(first_tokens), 6) if first_tokens else '',
+                'syntax_checks': sum(1 for span in spans if span.name == 'syntax_check'),
+                'syntax_check_seconds': round(total('syntax_check'), 6),
+                'auto_fix_seconds': round(total('auto_fix'), 6),
+                'repair_attempts': sum(1 for span in spans if span.name == 'repair_attempt'),
+                'repair_seconds': round(total('repair_attempt'), 6),
+                'sleep_seconds': round(total('sleep'), 6),
+            })
+        return rows
+
+    def write_summary_csv(self, path):
+        """Append the summary rows to a CSV (the header is written if the file is new)."""
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        with open(path, 'a', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=SUMMARY_COLUMNS)
+            if new_file:
+                writer.writeheader()
+            writer.writerows(self.summary())
+
+
+_tracer = Tracer()
+
+
+def enable_tracing(clear=True):
+    """Start recording spans (and drop the spans of earlier traces)."""
+    global TRACING_ENABLED
+    if clear:
+        _tracer.clear()
+    TRACING_ENABLED = True
+
+
+def disable_tracing():
+    """Stop recording spans. Spans recorded so far can still be exported."""
+    global TRACING_ENABLED
+    TRACING_ENABLED = False
+
+
+def get_tracer():
+    return _tracer
+
+
+def span(name, **attributes):
+    """Return a new span (use as a context manager), or a span that does nothing while tracing is disabled."""
+    if not TRACING_ENABLED:
+        return NULL_SPAN
+    return _tracer.span(name, **attributes)
+
+
+def current_span():
+    """The innermost entered span of the current context (a span that does nothing if there is none)."""
+    if not TRACING_ENABLED:
+        return NULL_SPAN
+    return _current_span.get() or NULL_SPAN
+
+
+def traced(name):
+    """Decorator tracing every call of a function as a span with the given name."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not TRACING_ENABLED:
+                return function(*args, **kwargs)
+            with _tracer.span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def export_chrome_trace(path):
+    _tracer.export_chrome_trace(path)
+
+
+def trace_summary():
+    return _tracer.summary()
+
+
+def write_summary_csv(path):
+    _tracer.write_summary_csv(path)
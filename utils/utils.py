@@ -1,8 +1,22 @@
 import re
 import json
-from clingo.ast import parse_files, parse_string
-import os
-import time
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from clingo.ast import parse_string
+
+# A complete ASP string literal (strings can not span lines)
+STRING_LITERAL = re.compile(r'"(?:[^"\\\n]|\\.)*"')
+LINE_COMMENT = re.compile(r'%[^\n]*')
+# Tokens the statement block splitter has to look at: strings (possibly unclosed), comments and runs of dots
+SPLITTER_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"?|%\*?|\.+')
+
+# Minimum number of statement blocks parsed at once by check_syntax_of_statement_blocks after an error
+MIN_SYNTAX_CHECK_WINDOW = 8
+
+# Number of statements and of whole programs whose syntax check results are memoized (see Syntax_Cache)
+SYNTAX_CACHE_SIZE = 4096
+PROGRAM_SYNTAX_CACHE_SIZE = 64
 
 def extract_json(string):
     # Regular expression to match JSON objects
@@ -69,23 +83,29 @@ def extract_line_number_from_error(msg): # FINN: When error on end of line, it g
     
     return None
 
-def check_syntax(program: list):
+def check_syntax(program: list, filename: str = "<string>"):
     """
     Parse an entire ASP/Clingo program and collect all syntax errors using Clingo's logger.
     Returns a list of error dictionaries (empty if syntax is correct).
 
+    The program is parsed in memory (no temporary file), so it is safe to call concurrently from threads and processes.
+
     Args:
-        program (list): The ASP/Clingo program to be checked as a list of strings.
+        program (list): The ASP/Clingo program to be checked as a list of strings (lines, with or without a line break).
+        filename (str, optional): Name used for the program in the error messages. Defaults to "<string>".
 
     Returns:
         List[Dict]: A list of dictionaries, each containing details about a syntax error.
     """
+    # Elements of the program may end with a line break (e.g. from readlines) or contain several lines
+    text = '\n'.join(line[:-1] if line.endswith('\n') else line for line in program)
+    lines = text.split('\n')
 
-    # Save the program to a temporary file
-    # FINN: This is a bit hacky, but Clingo's parse_files function requires a file. Would parse_string be better? @George
-    with open("temp.lp", "w", encoding="utf-8") as f:
-        for line in program:
-            f.write(line + "\n")
+    # Results are memoized on the exact program text (see Syntax_Cache)
+    cache_key = f'{filename}\n{text}'
+    cached = program_syntax_cache.get(cache_key)
+    if cached is not None:
+        return [dict(error) for error in cached]
 
     errors = []
     def collector(_stmt):
@@ -93,39 +113,27 @@ def check_syntax(program: list):
         pass
 
     def logger(code, msg):
+        message = str(msg).strip()
+        line_number = extract_line_number_from_error(message)
+        if filename != "<string>" and message.startswith("<string>:"):
+            message = filename + message[len("<string>"):]
 
-        line_number = extract_line_number_from_error(msg)
-        code_line = program[line_number - 1].strip()
+        # Errors at the end of the program are reported on the line after the last one
+        code_line = lines[line_number - 1].strip() if line_number is not None and 0 < line_number <= len(lines) else ''
 
         errors.append({
             "type": str(code).strip(),
-            "message": str(msg).strip(),
+            "message": message,
             "line_number": line_number,
             "code": code_line
         })
 
     try:
-        parse_files(["temp.lp"], collector, logger=logger)
+        parse_string(text + '\n', collector, logger=logger)
     except RuntimeError as e:
         pass # This error is always generated if an error is found, but not very useful to log "on top".
-        # errors.append({"type": "RuntimeError", "message": str(e), "line": None, "col": None})
-
-    # Remove the temporary file (including a timeout in case of file locks)
-    timeout = 5.0
-    deadline = time.time() + timeout
-    removed = False
-    while time.time() < deadline:
-        try:
-            os.remove("temp.lp")
-            removed = True
-            break
-        except OSError:
-            time.sleep(0.1)
-
-    if not removed:
-        print("Could not remove temp.lp within 5 seconds.")
-        return errors
 
+    program_syntax_cache.put(cache_key, tuple(dict(error) for error in errors))
     return errors
 
 def check_syntax_string(program: str):
@@ -144,62 +152,108 @@ def check_syntax_string(program: str):
     # Use Clingo parse_string to check syntax
     #error = 
 
-def split_ASP_code_into_statement_blocks(code: list):
+class Statement_Block_Splitter():
     """
-    Splits ASP code into individual 'statement blocks' based on the presence of a period (.) at the end of each statement.
-    Handles multi-line statements and keeps comments. 
+    Incrementally splits ASP code into 'statement blocks', one physical line at a time (see
+    split_ASP_code_into_statement_blocks). A block is returned as soon as the line that completes it is added, so the
+    blocks of a streamed LLM response can be checked while the rest is still being generated.
 
-    Args:
-        code (List[str]): The ASP code as a list of strings (lines).
-
-    Returns:
-        List[str]: A list of individual ASP statement blocks (potentially including line breaks in a
-                   block, if they syntactically belong together).
+    Each line is scanned once with a regex lexer (SPLITTER_TOKEN), so splitting is linear in the size of the code. A
+    '.' only ends a statement outside of strings and comments, when it is not part of a range ('..') and not between
+    two digits (a decimal like 1.5). Block comments (%* ... *%) may span several lines.
     """
-    statements = []
-    current_parts = []  # collects lines for a multi-line statement
 
-    # Normalize the input: elements in `code` may already contain newlines.
-    # Split them into physical lines so we handle each logical line separately
-    all_lines = []
-    for raw in code:
-        if raw is None:
-            continue
-        parts = raw.split('\n')
-        for p in parts:
-            all_lines.append(p)
+    def __init__(self):
+        self.current_parts = []  # collects lines for a multi-line statement
+        self.pending_code = False  # whether current_parts contains code (and not only comments)
+        self.in_block_comment = False  # whether the previous line ended inside a %* ... *% comment
+
+    def _scan(self, line: str):
+        """
+        Find the statement terminators and the start of the line comment of one line.
+
+        Returns:
+            tuple: (terminators, comment_start, last_code) - the positions after each terminating '.', the position of
+                   the '%' starting a line comment (or None) and the position after the last code character (0 if none).
+        """
+        terminators = []
+        comment_start = None
+        last_code = 0
+        pos = 0
+        n = len(line)
+
+        if self.in_block_comment:
+            end = line.find('*%')
+            if end < 0:
+                return terminators, comment_start, last_code
+            self.in_block_comment = False
+            pos = end + 2
+
+        while pos < n:
+            match = SPLITTER_TOKEN.search(line, pos)
+            if match is None:
+                if line[pos:].strip():
+                    last_code = len(line[pos:].rstrip()) + pos
+                break
+
+            start = match.start()
+            if line[pos:start].strip():
+                last_code = len(line[pos:start].rstrip()) + pos
+            token = match.group()
+            pos = match.end()
+
+            if token == '%*':
+                end = line.find('*%', pos)
+                if end < 0:
+                    self.in_block_comment = True
+                    break
+                pos = end + 2
+            elif token == '%':
+                comment_start = start
+                break
+            else:
+                last_code = pos
+                # A single '.' ends a statement, unless it is a decimal point between two digits
+                if token == '.' and not (0 < start and line[start - 1].isdigit() and pos < n and line[pos].isdigit()):
+                    terminators.append(pos)
+
+        return terminators, comment_start, last_code
+
+    def add_line(self, raw_line: str):
+        """
+        Add one physical line (without line break) and return the statement blocks it completes.
+
+        Args:
+            raw_line (str): The line to add.
+
+        Returns:
+            List[str]: The statement blocks completed by this line (possibly empty).
+        """
+        statements = []
 
-    for raw_line in all_lines:
         # Preserve empty physical lines as '' (they are meaningful for tests)
         line = raw_line.rstrip()
+        continues_block_comment = self.in_block_comment
 
-        # Split off the first comment ("%" starts a comment in ASP)
-        code_part, sep, comment_part = line.partition('%')
-        comment_text = (sep + comment_part).strip() if sep else ''
-
-        # Work on the code portion (may contain multiple dot-terminated statements)
-        code_before = code_part
+        # Find the terminating dots and split off the line comment ("%" starts a comment in ASP)
+        terminators, comment_start, last_code = self._scan(line)
+        code_part = line if comment_start is None else line[:comment_start]
+        comment_text = line[comment_start:].strip() if comment_start is not None else ''
 
-        # Split into segments by single '.' terminators, but ignore any '.' that is adjacent
-        # to another '.' (so '..' or '...' sequences are not considered terminators).
+        # Split the code portion into its dot-terminated segments
         segments = []
-        buf = []
-        i = 0
-        n = len(code_before)
-        while i < n:
-            ch = code_before[i]
-            buf.append(ch)
-            if ch == '.':
-                prev_is_dot = (i - 1 >= 0 and code_before[i - 1] == '.')
-                next_is_dot = (i + 1 < n and code_before[i + 1] == '.')
-                # Only treat '.' as terminator when it's not part of a multi-dot sequence
-                if not prev_is_dot and not next_is_dot:
-                    segments.append(''.join(buf))
-                    buf = []
-                # otherwise it's part of '..' or '...'; do not terminate here
-            i += 1
-
-        tail = ''.join(buf).strip()
+        previous = 0
+        for end in terminators:
+            segments.append(code_part[previous:end])
+            previous = end
+
+        tail = code_part[previous:].strip()
+        tail_has_code = last_code > previous
+
+        # A tail that only holds a closed block comment is a comment (unless it continues a statement or comment)
+        if tail and not tail_has_code and not self.current_parts and not self.in_block_comment and not continues_block_comment:
+            comment_text = (tail + ' ' + comment_text).strip()
+            tail = ''
 
         # Process complete dot-terminated segments
         for j, seg in enumerate(segments):
@@ -216,10 +270,11 @@ def split_ASP_code_into_statement_blocks(code: list):
                 seg_with_comment = seg_with_comment + comment_text
 
             # If we are currently collecting a multi-line statement, append this segment and finish the block
-            if current_parts:
-                current_parts.append(seg_with_comment)
-                statements.append('\n'.join(current_parts).strip())
-                current_parts = []
+            if self.current_parts:
+                self.current_parts.append(seg_with_comment)
+                statements.append('\n'.join(self.current_parts).strip())
+                self.current_parts = []
+                self.pending_code = False
             else:
                 # standalone segment from this line
                 statements.append(seg_with_comment)
@@ -227,62 +282,302 @@ def split_ASP_code_into_statement_blocks(code: list):
         # If there is a trailing (non-terminated) piece, it continues onto the next lines
         if tail:
             tail_piece = tail
-            # If there was no dot-terminated segment that consumed the line, attach the inline comment to this tail
-            if not segments and comment_text:
-                if not tail_piece.endswith(' '):
-                    tail_piece = tail_piece + ' '
-                tail_piece = tail_piece + comment_text
-            # If there were dot-terminated segments and the tail exists, the comment should be attached to the tail
-            if segments and comment_text and not tail_piece.endswith(comment_text):
+            # The inline comment is attached to the tail
+            if comment_text:
                 if not tail_piece.endswith(' '):
                     tail_piece = tail_piece + ' '
                 tail_piece = tail_piece + comment_text
 
             # Start or continue collecting a multi-line statement
-            if current_parts:
-                current_parts.append(tail_piece)
-            else:
-                current_parts = [tail_piece]
+            self.current_parts.append(tail_piece)
+            self.pending_code = self.pending_code or tail_has_code
 
         # If there were no segments and no tail (i.e., the line was just a comment), attach comment to current_parts
         if not segments and not tail and comment_text:
-            if current_parts:
+            if self.current_parts:
                 # append comment line to the current statement
-                current_parts.append(comment_text)
+                self.current_parts.append(comment_text)
             else:
                 # standalone comment-only line -> treat as its own small statement
                 statements.append(comment_text)
 
         # If the physical line is completely empty (''), preserve it as an empty statement block
         if not segments and not tail and not comment_text and line == '':
-            if current_parts:
-                current_parts.append('')
+            if self.current_parts:
+                self.current_parts.append('')
             else:
                 statements.append('')
 
-    # If anything remains un-terminated, add as a final statement block
-    if current_parts:
-        statements.append('\n'.join(current_parts).strip())
-
-    # If the input ended with a trailing newline we may have produced an extra
-    # empty-string statement at the end. Remove a single trailing '' if present
-    # and if it's the only reason the length increased (keeps intentional blank
-    # lines in the middle).
-    if statements and statements[-1] == '':
-        # Only drop it if the original input ended with a newline (common case)
-        # Detect by checking if the last element of the provided `code` ends with '\n'
-        try:
-            last_raw = code[-1]
-            if isinstance(last_raw, str) and last_raw.endswith('\n'):
-                statements.pop()
-        except Exception:
-            # If we can't determine, be conservative and keep it
-            pass
+        # A multi-line block comment without code is its own statement block once it is closed
+        if self.current_parts and not self.pending_code and not self.in_block_comment:
+            statements.append('\n'.join(self.current_parts).strip())
+            self.current_parts = []
+
+        return statements
 
+    def finish(self):
+        """
+        Return the remaining (un-terminated) statement block, if any, as a list.
+        """
+        statements = []
+        # If anything remains un-terminated, add as a final statement block
+        if self.current_parts:
+            statements.append('\n'.join(self.current_parts).strip())
+            self.current_parts = []
+        self.pending_code = False
+        self.in_block_comment = False
+        return statements
+
+
+def iter_ASP_statement_blocks(code):
+    """
+    Generator version of split_ASP_code_into_statement_blocks: yields the statement blocks as soon as they are complete.
+
+    Args:
+        code (Iterable[str]): The ASP code as an iterable of strings (lines, possibly containing line breaks), or one
+                              string.
+
+    Yields:
+        str: The statement blocks.
+    """
+    if isinstance(code, str):
+        code = [code]
+
+    splitter = Statement_Block_Splitter()
+    held_back = None  # a trailing '' block is dropped if the input ends with a line break
+    last_raw = None
+
+    def emit(blocks):
+        nonlocal held_back
+        for block in blocks:
+            if held_back is not None:
+                yield held_back
+                held_back = None
+            if block == '':
+                held_back = block
+            else:
+                yield block
+
+    # Normalize the input: elements in `code` may already contain newlines.
+    # Split them into physical lines so we handle each logical line separately
+    for raw in code:
+        if raw is None:
+            continue
+        last_raw = raw
+        for p in raw.split('\n'):
+            yield from emit(splitter.add_line(p))
+
+    yield from emit(splitter.finish())
+
+    # If the input ended with a trailing newline we may have produced an extra empty-string statement at the end.
+    # Only a single trailing '' is dropped (keeps intentional blank lines in the middle).
+    if held_back is not None and not (isinstance(last_raw, str) and last_raw.endswith('\n')):
+        yield held_back
+
+
+def split_ASP_code_into_statement_blocks(code: list):
+    """
+    Splits ASP code into individual 'statement blocks' based on the presence of a period (.) at the end of each statement.
+    Handles multi-line statements and keeps comments. 
+
+    Args:
+        code (List[str]): The ASP code as a list of strings (lines).
+
+    Returns:
+        List[str]: A list of individual ASP statement blocks (potentially including line breaks in a
+                   block, if they syntactically belong together).
+    """
     # TODO: Minor improvement could be to merge empty lines (\n) with the block before or after.
     # Not very urgent, as the functionality works correctly even with separate empty lines.
 
-    return statements
+    return list(iter_ASP_statement_blocks(code))
+
+def looks_like_prose(line: str) -> bool:
+    """
+    Heuristically decide whether a line of LLM output is natural language rather than ASP code,
+    e.g. "Here is the corrected code:" or "This rule ensures that every exam is scheduled.".
+
+    Args:
+        line (str): One line of LLM output.
+
+    Returns:
+        bool: True if the line looks like prose, False otherwise.
+    """
+    stripped = line.strip()
+    if not stripped or stripped.startswith('%'):
+        return False
+
+    # Lines with rule syntax are code
+    if re.search(r'\(|:-|:~|\{|#', stripped):
+        return False
+
+    # Several words without any rule syntax, or an introduction ending with a colon
+    words = re.findall(r"[A-Za-z][A-Za-z']+", stripped)
+    return len(words) >= 3 or (stripped.endswith(':') and len(words) >= 1)
+
+class Streaming_Statement_Splitter():
+    """
+    Splits a streamed LLM response into statement blocks while it is being generated.
+
+    Text chunks are fed in as they arrive. Code-fence lines (```) are dropped, like remove_backtick_lines does.
+    Once code has started, a closing code fence or a line of prose marks the end of the program: the splitter then
+    sets `stop_reason`, ignores everything after it, and the caller can stop the generation.
+    """
+
+    def __init__(self):
+        self.splitter = Statement_Block_Splitter()
+        self.buffer = ''
+        self.lines = []  # the kept lines of the response (without code fences and trailing prose)
+        self.code_started = False
+        self.stop_reason = None
+
+    def feed(self, text: str):
+        """
+        Feed a chunk of streamed text and return the statement blocks completed by it.
+        """
+        if self.stop_reason is not None:
+            return []
+
+        self.buffer += text
+        *complete_lines, self.buffer = self.buffer.split('\n')
+
+        statements = []
+        for line in complete_lines:
+            statements.extend(self._add_line(line))
+            if self.stop_reason is not None:
+                self.buffer = ''
+                break
+        return statements
+
+    def close(self):
+        """
+        Process the rest of the response and return the remaining statement blocks.
+        """
+        statements = []
+        if self.stop_reason is None and self.buffer:
+            statements.extend(self._add_line(self.buffer))
+        self.buffer = ''
+        statements.extend(self.splitter.finish())
+        return statements
+
+    def _add_line(self, line: str):
+        if line.lstrip().startswith('```'):
+            if self.code_started:
+                self.stop_reason = 'closing code fence'
+            return []
+
+        if self.code_started and looks_like_prose(line):
+            self.stop_reason = 'prose'
+            return []
+
+        if line.strip() and not line.strip().startswith('%'):
+            self.code_started = True
+
+        self.lines.append(line)
+        return self.splitter.add_line(line)
+
+# Runs of whitespace collapsed by normalize_statement
+SPACES_AND_TABS = re.compile(r'[ \t]+')
+
+def normalize_statement(code: str) -> str:
+    """
+    Normalize the whitespace of a statement: runs of spaces and tabs become one space, lines are stripped of spaces and
+    tabs and empty lines are removed. Line breaks are kept, as they end line comments. Other whitespace characters
+    (vertical tab, form feed, Unicode spaces, ...) are kept as they are, as the Clingo lexer rejects them. Normalizing
+    does not change whether a statement is syntactically valid (but it does change the positions in error messages).
+    """
+    lines = (SPACES_AND_TABS.sub(' ', line).strip(' \t') for line in code.split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+class Syntax_Cache():
+    """
+    Thread-safe LRU memo of syntax check results, so identical statements (instance templates, generator rules,
+    repeated repair attempts, ...) are only parsed once.
+
+    Valid results are stored under the whitespace-normalized text (see normalize_statement), so reformatted copies of a
+    valid statement are hits too. Error messages contain line and column numbers, so they are stored under the exact
+    text. With normalize=False, all results are stored under the exact text.
+    """
+
+    def __init__(self, maxsize: int = 4096, normalize: bool = True):
+        self.maxsize = maxsize
+        self.normalize = normalize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key):
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def get(self, code: str):
+        """Return the cached result for a statement (None if it is not cached)."""
+        if self.maxsize <= 0:
+            return None
+        normalized = normalize_statement(code) if self.normalize else None
+        with self.lock:
+            value = self._lookup(('exact', code))
+            if value is None and normalized is not None:
+                value = self._lookup(('valid', normalized))
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, code: str, value):
+        """Store the result for a statement ('' or an error message for statements)."""
+        if self.maxsize <= 0:
+            return
+        key = ('valid', normalize_statement(code)) if self.normalize and value == '' else ('exact', code)
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0,
+                    'size': len(self.entries), 'maxsize': self.maxsize}
+
+# Memo of check_syntax_of_one_string (and the statement blocks of check_syntax_of_statement_blocks)
+syntax_cache = Syntax_Cache(SYNTAX_CACHE_SIZE)
+# Memo of check_syntax, keyed on the exact program text
+program_syntax_cache = Syntax_Cache(PROGRAM_SYNTAX_CACHE_SIZE, normalize=False)
+
+def configure_syntax_cache(maxsize: int = None, program_maxsize: int = None):
+    """
+    Change the sizes of the syntax caches (0 disables a cache). Clears both caches.
+    """
+    if maxsize is not None:
+        syntax_cache.maxsize = maxsize
+    if program_maxsize is not None:
+        program_syntax_cache.maxsize = program_maxsize
+    clear_syntax_cache()
+
+def clear_syntax_cache():
+    """
+    Remove all entries from the syntax caches and reset their counters.
+    """
+    syntax_cache.clear()
+    program_syntax_cache.clear()
+
+def syntax_cache_stats() -> dict:
+    """
+    Return the hits, misses and sizes of the statement and whole-program syntax caches.
+    """
+    return {'statements': syntax_cache.stats(), 'programs': program_syntax_cache.stats()}
 
 def check_syntax_of_one_string(code: str):
     """
@@ -296,6 +591,10 @@ def check_syntax_of_one_string(code: str):
     Returns:
         str: An error message if a syntax error is found, otherwise an empty string.
     """
+    # Results are memoized (see Syntax_Cache)
+    cached = syntax_cache.get(code)
+    if cached is not None:
+        return cached
 
     error_message = ""
 
@@ -313,8 +612,170 @@ def check_syntax_of_one_string(code: str):
     except RuntimeError as e:
         pass # This error is always generated if an error is found, but not very useful to log "on top".
 
+    syntax_cache.put(code, error_message)
     return error_message
 
+def first_syntax_error(program: str):
+    """
+    Return the first error message Clingo reports for a program (empty if the syntax is correct).
+    """
+    messages = []
+
+    def collector(_stmt):
+        # Not needed here, but required by Clingo API
+        pass
+
+    def logger(code, msg):
+        messages.append(str(msg).strip())
+
+    try:
+        parse_string(program, collector, logger=logger, message_limit=1)
+    except RuntimeError:
+        pass  # This error is always generated if an error is found
+
+    return messages[0] if messages else ''
+
+def ends_at_statement_boundary(block: str) -> bool:
+    """
+    Cheap lexical check whether a statement block leaves the parser at the start of a new statement: its code ends
+    with a terminating '.' outside of brackets, strings and comments (or it only contains comments). Such a block parses
+    the same on its own as in the middle of a program, as long as the code before it does.
+
+    Args:
+        block (str): The statement block.
+
+    Returns:
+        bool: True if the block ends at a statement boundary.
+    """
+    # Weak constraints (:~ body. [weight@level]) continue after their '.'
+    if ':~' in block:
+        return False
+
+    if '%*' not in block and ('"' not in block or '%' not in block):
+        # Fast path without block comments, and without strings or comments that could contain each other
+        if '"' in block:
+            code = STRING_LITERAL.sub('', block)
+            if '"' in code:
+                return False  # unclosed string
+        else:
+            code = LINE_COMMENT.sub('', block) if '%' in block else block
+        if code.count('(') + code.count('{') + code.count('[') != code.count(')') + code.count('}') + code.count(']'):
+            return False
+        code = code.rstrip()
+        return not code or (code.endswith('.') and not code.endswith('..'))
+
+    depth = 0
+    last = ''  # last two code characters outside strings and comments
+    i = 0
+    n = len(block)
+    while i < n:
+        ch = block[i]
+        if ch == '%':
+            if block.startswith('%*', i):
+                end = block.find('*%', i + 2)
+                if end < 0:
+                    return False  # unclosed block comment
+                i = end + 2
+            else:
+                end = block.find('\n', i)
+                i = n if end < 0 else end + 1
+            continue
+        if ch == '"':
+            match = STRING_LITERAL.match(block, i)
+            if match is None:
+                return False  # unclosed string
+            last = (last + '"')[-2:]
+            i = match.end()
+            continue
+        if ch in '({[':
+            depth += 1
+        elif ch in ')}]':
+            depth -= 1
+        if not ch.isspace():
+            last = (last + ch)[-2:]
+        i += 1
+
+    if depth != 0:
+        return False
+    return last == '' or (last.endswith('.') and last != '..')
+
+def check_syntax_of_statement_blocks(blocks: list):
+    """
+    Check the syntax of a list of statement blocks by parsing the joined text, instead of calling
+    check_syntax_of_one_string for every block. The line of a reported error is mapped back to the block that contains
+    it, using a table of the first line of each block.
+
+    Blocks already in the syntax cache are not parsed again. Blocks that do not end at a statement boundary (see
+    ends_at_statement_boundary) are checked on their own; all other blocks are parsed as one program. Only the first
+    error of such a parse is used, as Clingo's error recovery can skip over the following statements: the faulty block
+    is re-checked on its own (for its block-local error message) and parsing resumes after it. A program without errors
+    costs one parse. The results are the same as those of check_syntax_of_one_string for each block.
+
+    Args:
+        blocks (List[str]): The statement blocks, e.g. from split_ASP_code_into_statement_blocks.
+
+    Returns:
+        List[str]: One error message per block (empty if the syntax of the block is correct).
+    """
+    errors = [syntax_cache.get(block) for block in blocks]
+
+    # Indices of the blocks left to check that end at a statement boundary. Any of them can be joined, as every one
+    # leaves the parser at the start of a new statement.
+    pending = []
+    for idx, block in enumerate(blocks):
+        if errors[idx] is not None:
+            continue
+        if ends_at_statement_boundary(block):
+            pending.append(idx)
+        else:
+            errors[idx] = check_syntax_of_one_string(block)
+
+    # First line (1-based) of each pending block in the joined program
+    first_lines = []
+    line_number = 1
+    for idx in pending:
+        first_lines.append(line_number)
+        line_number += blocks[idx].count('\n') + 1
+
+    def mark_valid(start, stop):
+        for idx in pending[start:stop]:
+            errors[idx] = ''
+            syntax_cache.put(blocks[idx], '')
+
+    # The pending blocks are parsed in windows. The window adapts to the distance between errors, so the blocks after
+    # an error are not parsed again for every error.
+    start = 0
+    end = len(pending)
+    window = end
+    while start < end:
+        stop = min(start + window, end)
+        error = first_syntax_error('\n'.join(blocks[idx] for idx in pending[start:stop]))
+        if not error:
+            mark_valid(start, stop)
+            start = stop
+            window *= 2
+            continue
+
+        line_number = extract_line_number_from_error(error)
+        position = None
+        if line_number is not None:
+            # Map the line in the joined window back to the position of its block
+            position = min(max(bisect_right(first_lines, line_number + first_lines[start] - 1) - 1, start), stop - 1)
+            errors[pending[position]] = check_syntax_of_one_string(blocks[pending[position]])
+
+        if position is None or not errors[pending[position]]:
+            # The error can not be attributed to a block: check the rest of the window block by block
+            for idx in pending[start:stop]:
+                errors[idx] = check_syntax_of_one_string(blocks[idx])
+            start = stop
+            continue
+
+        mark_valid(start, position)
+        window = max(2 * (position + 1 - start), MIN_SYNTAX_CHECK_WINDOW)
+        start = position + 1
+
+    return errors
+
 def check_if_block_is_program_statement(block: str) -> bool:
     """
     Return True if the given block is a program statement.